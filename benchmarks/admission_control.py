@@ -0,0 +1,78 @@
+"""
+Overload the server with a mix of reads (book list and detail) and writes
+(leases of a few hot books) with and without admission control, and compare
+the latency of the served requests and the number shed with 503.
+
+    python benchmarks/admission_control.py --concurrency 200 500
+    python benchmarks/admission_control.py --queue-timeout 0.5 --write-limit 2
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter
+
+from common import hammer, serve, temporary_database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--hot-books", type=int, default=20)
+    parser.add_argument("--write-share", type=float, default=0.2)
+    parser.add_argument("--read-limit", type=int, default=32)
+    parser.add_argument("--write-limit", type=int, default=4)
+    parser.add_argument("--queue-timeout", type=float, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    every_write = max(1, round(1 / args.write_share)) if args.write_share else 0
+    served: list[float] = []
+    statuses: Counter = Counter()
+
+    async def request(client, i):
+        started = time.perf_counter()
+        if every_write and i % every_write == 0:
+            response = await client.put(
+                f"/books/{i % args.hot_books + 1}/leases/",
+                json={},
+                headers={"user-id": str(i % 4 + 1)},
+            )
+        elif i % 2:
+            response = await client.get(f"/books/{i % args.books + 1}")
+        else:
+            response = await client.get("/books/", params={"limit": 50})
+        statuses[response.status_code] += 1
+        if response.status_code != 503:
+            served.append(time.perf_counter() - started)
+        return response
+
+    admission = {
+        "CT_LIBRARY_ADMISSION__READ_LIMIT": str(args.read_limit),
+        "CT_LIBRARY_ADMISSION__WRITE_LIMIT": str(args.write_limit),
+        "CT_LIBRARY_ADMISSION__QUEUE_TIMEOUT": str(args.queue_timeout),
+    }
+    with temporary_database(books=args.books) as workdir:
+        for enabled in ("false", "true"):
+            env = {**admission, "CT_LIBRARY_ADMISSION__ENABLED": enabled}
+            with serve(workdir, args.port, env) as url:
+                for concurrency in args.concurrency:
+                    served.clear()
+                    statuses.clear()
+                    result = hammer(url, request, concurrency, args.requests)
+                    quantiles = statistics.quantiles(served, n=100)
+                    label = f"admission={enabled} c={concurrency}"
+                    print(
+                        f"{label:<28} {len(served) / result.elapsed:>9.1f} served/s  "
+                        f"p50 {quantiles[49] * 1000:>8.1f} ms  "
+                        f"p99 {quantiles[98] * 1000:>8.1f} ms  "
+                        f"shed {statuses[503]}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
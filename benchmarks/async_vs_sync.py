@@ -0,0 +1,35 @@
+"""
+Compare the sync (thread pool) and the native async stack under concurrent
+load on the book list and book detail endpoints.
+
+    python benchmarks/async_vs_sync.py --concurrency 50 100 250 500
+"""
+
+import argparse
+
+from common import hammer, serve, temporary_database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    async def request(client, i):
+        if i % 2:
+            return await client.get(f"/books/{i % args.books + 1}")
+        return await client.get("/books/", params={"limit": 50})
+
+    with temporary_database(books=args.books) as workdir:
+        for mode in ("sync", "async"):
+            with serve(workdir, args.port, {"CT_LIBRARY_MODE": mode}) as url:
+                for concurrency in args.concurrency:
+                    result = hammer(url, request, concurrency, args.requests)
+                    print(result.row(f"{mode} c={concurrency}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Compare three ways of finding books by the words of their title or author on
+a 100k book catalogue: every book fetched and filtered in Python, as a client
+of the list endpoint has to, a `LIKE '%word%'` scan and the FTS5 index
+behind `GET /books/search`.
+
+    python benchmarks/book_search.py --books 100000 --repeat 20
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import common  # noqa: F401, puts the repository on the path
+from sqlalchemy import create_engine, insert, select
+
+from ct_library.container import Container
+from ct_library.models import Author, Book, create_database
+from ct_library.repositories import BOOK_LIST_COLUMNS, match_expression
+from ct_library.settings import load_settings
+
+SYLLABLES = ("ka", "ro", "mi", "te", "lu", "va", "no", "si", "pe", "dra", "gor")
+
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed_catalogue(db_path: Path, authors: int, books: int, seed: int) -> list[str]:
+    """
+    Catalogue of titles made of 2 to 5 words, the FTS index is filled by the
+    triggers as the books are inserted.
+    :return: The words the titles are made of.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(5_000, rng)
+    engine = create_engine(f"sqlite:///{db_path}")
+    create_database(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Author),
+            [{"name": " ".join(rng.sample(words, 2))} for _ in range(authors)],
+        )
+        conn.execute(
+            insert(Book),
+            [
+                {
+                    "title": " ".join(rng.sample(words, rng.randint(2, 5))),
+                    "author_id": i % authors + 1,
+                }
+                for i in range(books)
+            ],
+        )
+    engine.dispose()
+    return words
+
+
+def measure(label: str, run: Callable[[str], int], queries: list[str]) -> None:
+    timings, found = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        found += run(query)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"{label:<12} median {statistics.median(timings) * 1000:>8.2f} ms  "
+        f"p99 {statistics.quantiles(timings, n=100)[98] * 1000:>8.2f} ms  "
+        f"{found / len(queries):>6.1f} books/query"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = Path(workdir) / "database.db"
+        words = seed_catalogue(db_path, args.authors, args.books, args.seed)
+        rng = random.Random(args.seed + 1)
+        queries = [
+            (
+                " ".join(
+                    word[: rng.randint(3, len(word))] for word in rng.sample(words, 2)
+                )
+                if i % 2
+                else rng.choice(words)
+            )
+            for i in range(args.repeat)
+        ]
+
+        settings = load_settings("bench")
+        settings.db.url = f"sqlite:///{db_path}"
+        container = Container()
+        container.config.from_dict(settings.model_dump(mode="json"))
+        unit_of_work = container.unit_of_work()
+        book_repository = container.book_repository()
+        list_query = select(*BOOK_LIST_COLUMNS, Author.name).join(Author)
+
+        def client_side(query: str) -> int:
+            terms = query.lower().split()
+            with unit_of_work() as session:
+                rows = session.execute(list_query).all()
+            matches = [
+                row
+                for row in rows
+                if all(
+                    any(
+                        word.startswith(term)
+                        for word in f"{row.title} {row.name}".split()
+                    )
+                    for term in terms
+                )
+            ]
+            return len(matches[: args.limit])
+
+        def like(query: str) -> int:
+            conditions = [
+                Book.title.like(f"%{term}%") | Author.name.like(f"%{term}%")
+                for term in query.lower().split()
+            ]
+            with unit_of_work() as session:
+                rows = session.execute(
+                    list_query.where(*conditions).limit(args.limit)
+                ).all()
+            return len(rows)
+
+        def fts(query: str) -> int:
+            match = match_expression(query)
+            return len(book_repository.search(match, limit=args.limit))
+
+        print(f"{args.books} books, {len(queries)} queries, limit {args.limit}")
+        measure("client-side", client_side, queries)
+        measure("like", like, queries)
+        measure("fts5", fts, queries)
+        container.db_engine().dispose()
+        container.db_read_engine().dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Shared helpers for the benchmark scripts: seeding a throw-away database,
+serving the app with uvicorn and generating concurrent HTTP load.
+"""
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+import httpx
+from sqlalchemy import create_engine, func, insert, select
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ct_library.models import Author, AuthorStats, Book, create_database  # noqa: E402
+
+
+def seed_database(db_path: Path, authors: int = 100, books: int = 1000) -> None:
+    """
+    Create the schema and fill it with `authors` authors and `books` books.
+    """
+    engine = create_engine(f"sqlite:///{db_path}")
+    create_database(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Author), [{"name": f"Author {i:06d}"} for i in range(authors)]
+        )
+        conn.execute(
+            insert(Book),
+            [
+                {"title": f"Title {i:07d}", "author_id": i % authors + 1}
+                for i in range(books)
+            ],
+        )
+        conn.execute(
+            insert(AuthorStats).from_select(
+                ["author_id", "book_count"],
+                select(Book.author_id, func.count()).group_by(Book.author_id),
+            )
+        )
+    engine.dispose()
+
+
+@contextmanager
+def temporary_database(**seed) -> Iterator[Path]:
+    """
+    Seeded database in a temporary directory, yields the directory.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_database(Path(workdir) / "database.db", **seed)
+        yield Path(workdir)
+
+
+@contextmanager
+def serve(
+    workdir: Path, port: int, env: dict[str, str] | None = None, *args: str
+) -> Iterator[str]:
+    """
+    Run the app with uvicorn in a subprocess, yields its base URL. The app
+    runs with the bench profile unless `env` selects another one.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "ct_library.main:app_factory",
+            "--factory",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+            *args,
+        ],
+        cwd=workdir,
+        env={
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "CT_LIBRARY_PROFILE": "bench",
+            **(env or {}),
+        },
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(base_url + "/")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("Server did not start")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@dataclass
+class LoadResult:
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: list[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed
+
+    def percentile(self, p: float) -> float:
+        return statistics.quantiles(self.latencies, n=100)[int(p) - 1] * 1000
+
+    def row(self, label: str) -> str:
+        return (
+            f"{label:<24} {self.throughput:>9.1f} req/s  "
+            f"p50 {self.percentile(50):>8.1f} ms  p99 {self.percentile(99):>8.1f} ms  "
+            f"errors {self.errors}"
+        )
+
+
+async def _hammer(
+    base_url: str,
+    request: Callable[[httpx.AsyncClient, int], "asyncio.Future"],
+    concurrency: int,
+    total: int,
+) -> LoadResult:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=120
+    ) as client:
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await request(client, i)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return LoadResult(total, errors, elapsed, latencies)
+
+
+def hammer(
+    base_url: str,
+    request: Callable[[httpx.AsyncClient, int], "asyncio.Future"],
+    concurrency: int,
+    total: int,
+) -> LoadResult:
+    """
+    Issue `total` requests with `concurrency` concurrent clients.
+    :param request: Coroutine function sending the i-th request.
+    """
+    return asyncio.run(_hammer(base_url, request, concurrency, total))
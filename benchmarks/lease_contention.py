@@ -0,0 +1,157 @@
+"""
+Stress the lease/return path: a pool of workers leases and returns a handful
+of hot books as fast as it can, then the final state is checked for
+consistency (at most one open lease per book, `book.current_lease_id` pointing
+at it, every successful operation recorded exactly once).
+
+    python benchmarks/lease_contention.py --workers 16 --pool process
+    python benchmarks/lease_contention.py --begin deferred
+
+`--begin deferred` runs the writes in plain `BEGIN` transactions for
+comparison, concurrent read-modify-write cycles then fail with
+"database is locked" instead of waiting for the write lock.
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from common import temporary_database
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from ct_library.container import Container
+from ct_library.exceptions import Forbidden
+from ct_library.serializers import BookLeaseLogInSerializer
+from ct_library.settings import load_settings
+
+_container: Container | None = None
+
+
+def container(db_path: Path) -> Container:
+    """
+    One container per process, shared by the threads of the process.
+    """
+    global _container
+    if _container is None:
+        settings = load_settings("bench")
+        settings.db.url = f"sqlite:///{db_path}"
+        _container = Container()
+        _container.config.from_dict(settings.model_dump(mode="json"))
+    return _container
+
+
+def worker(
+    db_path: Path, seed: int, operations: int, hot_books: int, users: int, write: bool
+) -> Counter:
+    di = container(db_path)
+    unit_of_work = di.unit_of_work()
+    service = di.book_lease_log_service()
+    rnd = random.Random(seed)
+    outcomes = Counter()
+    for _ in range(operations):
+        book_id = rnd.randint(1, hot_books)
+        user_id = rnd.randint(1, users)
+        try:
+            with unit_of_work.scope(write=write):
+                lease = service.lease_or_return_book(
+                    book_id, user_id, BookLeaseLogInSerializer()
+                )
+            outcomes["leased" if lease.returned_at is None else "returned"] += 1
+        except Forbidden:
+            outcomes["forbidden"] += 1
+        except (OperationalError, IntegrityError):
+            outcomes["conflicts"] += 1
+    return outcomes
+
+
+def check(db_path: Path, outcomes: Counter) -> list[str]:
+    """
+    :return: Descriptions of the inconsistencies found, empty when there are none.
+    """
+    engine = create_engine(f"sqlite:///{db_path}")
+    problems = []
+    with engine.connect() as conn:
+        for book_id, open_leases in conn.execute(
+            text(
+                "SELECT book_id, count(*) FROM book_lease_log "
+                "WHERE returned_at IS NULL GROUP BY book_id HAVING count(*) > 1"
+            )
+        ):
+            problems.append(f"book {book_id} has {open_leases} open leases")
+        for book_id, current, open_lease in conn.execute(
+            text(
+                "SELECT b.id, b.current_lease_id, l.id FROM book b "
+                "LEFT JOIN book_lease_log l "
+                "ON l.book_id = b.id AND l.returned_at IS NULL "
+                "WHERE b.current_lease_id IS NOT l.id"
+            )
+        ):
+            problems.append(
+                f"book {book_id} points at lease {current}, open lease is {open_lease}"
+            )
+        leases, returns = conn.execute(
+            text("SELECT count(*), count(returned_at) FROM book_lease_log")
+        ).one()
+    engine.dispose()
+    if leases != outcomes["leased"]:
+        problems.append(f"{leases} leases recorded, {outcomes['leased']} succeeded")
+    if returns != outcomes["returned"]:
+        problems.append(f"{returns} returns recorded, {outcomes['returned']} succeeded")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=4000)
+    parser.add_argument("--hot-books", type=int, default=8)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--pool", choices=("thread", "process"), default="thread")
+    parser.add_argument(
+        "--begin", choices=("immediate", "deferred"), default="immediate"
+    )
+    args = parser.parse_args()
+
+    per_worker = args.operations // args.workers
+    pool: type[Executor] = (
+        ThreadPoolExecutor if args.pool == "thread" else ProcessPoolExecutor
+    )
+    with temporary_database(authors=10, books=max(args.hot_books, 100)) as workdir:
+        db_path = workdir / "database.db"
+        with pool(max_workers=args.workers) as executor:
+            started = time.perf_counter()
+            futures = [
+                executor.submit(
+                    worker,
+                    db_path,
+                    seed,
+                    per_worker,
+                    args.hot_books,
+                    args.users,
+                    args.begin == "immediate",
+                )
+                for seed in range(args.workers)
+            ]
+            outcomes = sum((future.result() for future in futures), Counter())
+            elapsed = time.perf_counter() - started
+        problems = check(db_path, outcomes)
+
+    succeeded = outcomes["leased"] + outcomes["returned"]
+    print(
+        f"{args.pool} x{args.workers} begin={args.begin}: "
+        f"{succeeded / elapsed:.1f} leases+returns/s, "
+        f"{outcomes['forbidden']} forbidden, {outcomes['conflicts']} conflicts"
+    )
+    print("final state:", "consistent" if not problems else "INCONSISTENT")
+    for problem in problems:
+        print("  " + problem)
+
+
+if __name__ == "__main__":
+    main()
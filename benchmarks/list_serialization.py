@@ -0,0 +1,79 @@
+"""
+Compare the list serialization paths on a 10k book list: ORM entities
+validated row by row and then re-validated and encoded as FastAPI does for a
+`List[BookOutSerializer]` return annotation, against the column projection
+encoded at once by `BOOK_LIST`.
+
+    python benchmarks/list_serialization.py --books 10000 --repeat 20
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Callable
+
+from common import temporary_database
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from ct_library.container import Container
+from ct_library.models import Book
+from ct_library.serializers import BOOK_LIST, BookOutSerializer, dump_list
+from ct_library.settings import load_settings
+
+
+def measure(label: str, run: Callable[[], bytes], repeat: int, rows: int) -> bytes:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = run()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(
+        f"{label:<10} median {median * 1000:>7.1f} ms  "
+        f"best {min(timings) * 1000:>7.1f} ms  {rows / median:>9.0f} rows/s"
+    )
+    return body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with temporary_database(books=args.books) as workdir:
+        settings = load_settings("bench")
+        settings.db.url = f"sqlite:///{workdir / 'database.db'}"
+        container = Container()
+        container.config.from_dict(settings.model_dump(mode="json"))
+        unit_of_work = container.unit_of_work()
+        book_repository = container.book_repository()
+        response_adapter = TypeAdapter(list[BookOutSerializer])
+
+        def before() -> bytes:
+            with unit_of_work() as session:
+                books = session.scalars(
+                    select(Book).order_by(Book.title, Book.id).limit(args.books)
+                ).all()
+                content = [BookOutSerializer.model_validate(book) for book in books]
+            value = response_adapter.validate_python(content, from_attributes=True)
+            data = response_adapter.dump_python(value, mode="json")
+            return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+        def after() -> bytes:
+            rows = book_repository.get_all(limit=args.books)[: args.books]
+            return dump_list(BOOK_LIST, rows)
+
+        old = measure("before", before, args.repeat, args.books)
+        new = measure("after", after, args.repeat, args.books)
+        container.db_engine().dispose()
+
+    assert json.loads(old) == json.loads(new), "The paths serialize differently"
+
+
+if __name__ == "__main__":
+    main()
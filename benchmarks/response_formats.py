@@ -0,0 +1,134 @@
+"""
+Compare the response formats of the book list and the lease history: JSON and
+MessagePack, each sent as is, gzip or zstd compressed with the levels of the
+compression settings. Reports the bytes on the wire and the encode time
+(serialization plus compression) per page.
+
+    python benchmarks/response_formats.py --rows 100 1000 --repeat 200
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import statistics
+import time
+from typing import Callable
+
+import msgpack
+from common import temporary_database
+from sqlalchemy import create_engine, insert, select
+
+from ct_library.compression import zstandard
+from ct_library.container import Container
+from ct_library.models import BookLeaseLog
+from ct_library.serializers import (
+    BOOK_LEASE_LOG_LIST,
+    BOOK_LIST,
+    dump_list,
+    pack_list,
+)
+from ct_library.settings import load_settings
+
+
+def seed_leases(db_path, leases: int, books: int) -> None:
+    """
+    Returned leases spread over the books, one per hour.
+    """
+    start = datetime.datetime(2024, 1, 1)
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as conn:
+        conn.execute(
+            insert(BookLeaseLog),
+            [
+                {
+                    "book_id": i % books + 1,
+                    "user_id": i % 50 + 1,
+                    "created_at": start + datetime.timedelta(hours=i),
+                    "returned_at": start + datetime.timedelta(hours=i, minutes=30),
+                }
+                for i in range(leases)
+            ],
+        )
+    engine.dispose()
+
+
+def measure(run: Callable[[], bytes], repeat: int) -> tuple[float, int]:
+    """
+    :return: The median time in ms and the size of the encoded body.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = max(args.rows)
+    settings = load_settings("bench")
+    compression = settings.compression
+    encodings: dict[str, Callable[[bytes], bytes]] = {
+        "identity": lambda body: body,
+        "gzip": lambda body: gzip.compress(body, compresslevel=compression.gzip_level),
+    }
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=compression.zstd_level)
+        encodings["zstd"] = compressor.compress
+    else:
+        print("zstandard is not installed, zstd skipped")
+
+    with temporary_database(books=rows) as workdir:
+        db_path = workdir / "database.db"
+        seed_leases(db_path, rows, rows)
+        settings.db.url = f"sqlite:///{db_path}"
+        container = Container()
+        container.config.from_dict(settings.model_dump(mode="json"))
+        with container.unit_of_work()() as session:
+            lists = {
+                "books": (
+                    BOOK_LIST,
+                    container.book_repository().get_all(limit=rows)[:rows],
+                ),
+                "leases": (
+                    BOOK_LEASE_LOG_LIST,
+                    session.scalars(
+                        select(BookLeaseLog).order_by(BookLeaseLog.id).limit(rows)
+                    ).all(),
+                ),
+            }
+            for name, (adapter, items) in lists.items():
+                for count in args.rows:
+                    page = items[:count]
+                    json_body = dump_list(adapter, page)
+                    decoded = msgpack.unpackb(pack_list(adapter, page), timestamp=3)
+                    assert [row.keys() for row in decoded] == [
+                        row.keys() for row in json.loads(json_body)
+                    ], "The formats have different fields"
+                    print(f"{name}, {count} rows")
+                    for media_type, encode in (
+                        ("json", dump_list),
+                        ("msgpack", pack_list),
+                    ):
+                        for encoding, compress in encodings.items():
+                            elapsed, size = measure(
+                                lambda: compress(encode(adapter, page)), args.repeat
+                            )
+                            print(
+                                f"  {media_type + '+' + encoding:<18} "
+                                f"{size:>10,} bytes  {size / count:>7.1f} B/row  "
+                                f"encode {elapsed:>7.2f} ms"
+                            )
+        container.db_engine().dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Throughput of the book list and lease endpoints served by 1 to N uvicorn
+worker processes. The load is generated by several client processes so the
+client does not become the bottleneck.
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 8 --mode sync async
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from common import LoadResult, hammer, serve, temporary_database
+
+
+async def list_request(client, i):
+    return await client.get("/books/", params={"limit": 50, "available": i % 2 == 0})
+
+
+async def lease_request(books: int, users: int, client, i):
+    return await client.put(
+        f"/books/{i * 7919 % books + 1}/leases/",
+        json={},
+        headers={"user-id": str(i % users + 1)},
+    )
+
+
+def load(url: str, endpoint: str, books: int, concurrency: int, total: int):
+    request = list_request if endpoint == "list" else partial(lease_request, books, 50)
+    return hammer(url, request, concurrency, total)
+
+
+def run(url: str, endpoint: str, args) -> LoadResult:
+    """
+    Split the requests and the concurrency among the client processes.
+    """
+    per_client = args.requests // args.clients
+    with ProcessPoolExecutor(args.clients) as executor:
+        started = [
+            executor.submit(
+                load,
+                url,
+                endpoint,
+                args.books,
+                args.concurrency // args.clients,
+                per_client,
+            )
+            for _ in range(args.clients)
+        ]
+        results = [future.result() for future in started]
+    return LoadResult(
+        requests=sum(result.requests for result in results),
+        errors=sum(result.errors for result in results),
+        elapsed=max(result.elapsed for result in results),
+        latencies=[latency for result in results for latency in result.latencies],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1]
+    )
+    parser.add_argument("--mode", nargs="+", default=["sync"])
+    parser.add_argument("--endpoint", nargs="+", default=["list", "lease"])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    with temporary_database(books=args.books) as workdir:
+        for mode in args.mode:
+            for workers in args.workers:
+                env = {"CT_LIBRARY_MODE": mode}
+                with serve(workdir, args.port, env, "--workers", str(workers)) as url:
+                    for endpoint in args.endpoint:
+                        result = run(url, endpoint, args)
+                        print(result.row(f"{mode} {endpoint} x{workers}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Admission control: bounded concurrency per kind of request with a bounded
+wait queue, so an overloaded worker answers a fast 503 instead of queueing
+requests until they time out.
+
+Reads and writes have separate budgets. SQLite serializes the writers, so a
+few writing requests are enough to keep it busy, while the reads scale with
+the threads. A request waits in the queue of its budget for at most the queue
+timeout; when the queue is full or the wait times out it is rejected with
+503 Service Unavailable and a `Retry-After` header.
+
+Every worker process has its own budgets.
+"""
+
+import asyncio
+import json
+from collections import Counter
+
+from ct_library.metrics import Metrics
+from ct_library.settings import AdmissionSettings
+from ct_library.unit_of_work import READ_METHODS
+
+# Paths which are never limited, the metrics have to be readable under load
+EXEMPT_PATHS = frozenset({"/metrics"})
+
+
+class Overloaded(Exception):
+    """
+    The request was not admitted.
+    :param reason: `queue_full` or `timeout`.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Budget:
+    """
+    At most `limit` requests run at once, at most `queue_size` wait for their
+    turn and none of them longer than `queue_timeout` seconds.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected: Counter[str] = Counter()
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> None:
+        """
+        Wait for a slot of the budget.
+        :raises Overloaded: The queue is full or the wait timed out.
+        """
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected["queue_full"] += 1
+                raise Overloaded("queue_full")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except TimeoutError:
+                self.rejected["timeout"] += 1
+                raise Overloaded("timeout")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware running every HTTP request within the budget of its
+    method, reads (GET, HEAD, OPTIONS) or writes. The budgets are registered
+    in the metrics.
+    """
+
+    def __init__(self, app, settings: AdmissionSettings, metrics: Metrics):
+        self.app = app
+        self.budgets = {
+            "read": Budget(
+                "read",
+                settings.read_limit,
+                settings.read_queue_size,
+                settings.queue_timeout,
+            ),
+            "write": Budget(
+                "write",
+                settings.write_limit,
+                settings.write_queue_size,
+                settings.queue_timeout,
+            ),
+        }
+        self.retry_after = settings.retry_after
+        metrics.budgets.update(self.budgets)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.budgets["read" if scope["method"] in READ_METHODS else "write"]
+        try:
+            await budget.acquire()
+        except Overloaded as exc:
+            await self._reject(send, budget, exc.reason)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release()
+
+    async def _reject(self, send, budget: Budget, reason: str) -> None:
+        body = json.dumps(
+            {"detail": f"Server overloaded ({budget.name} {reason}), retry later"}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
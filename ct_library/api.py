@@ -1,22 +1,67 @@
-from typing import Annotated, List
+from typing import Annotated, AsyncIterator, List
 
 from dependency_injector.wiring import Provide, inject
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.exceptions import HTTPException
 from fastapi.params import Header
-from fastapi.responses import Response
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 
+from ct_library.bulk import NDJSON_OPENAPI, import_ndjson, importer
+from ct_library.concurrency import call
+from ct_library.export import export_response, export_stream
+from ct_library.metrics import PROMETHEUS_MEDIA_TYPE
 from ct_library.serializers import (
+    AUTHOR_STATS_LIST,
+    BOOK_STATS_LIST,
+    MSGPACK_OPENAPI,
     AuthorInSerializer,
+    AuthorListParams,
     AuthorOutSerializer,
+    AuthorStatsOutSerializer,
+    BookBatchLeaseInSerializer,
+    BookBulkInSerializer,
     BookFilterParams,
     BookInSerializer,
     BookLeaseLogInSerializer,
     BookLeaseLogOutSerializer,
+    BookLeaseResult,
     BookOutSerializer,
+    BookSearchParams,
+    BookStatsOutSerializer,
+    BulkImportParams,
+    BulkImportResult,
+    ExportParams,
+    FieldsParams,
+    JSONBytesResponse,
+    LeaseAnalyticsOutSerializer,
+    LeaseAnalyticsParams,
+    LeaseHistoryParams,
+    PaginationParams,
+    TopBooksParams,
+    dump_item,
+    dump_list,
+    list_adapter,
+    loaded_fields,
+    negotiate_media_type,
+    page_response,
+    sparse_serializer,
 )
+from ct_library.unit_of_work import READ_METHODS
 
-router = APIRouter()
+
+async def unit_of_work_scope(request: Request) -> AsyncIterator[None]:
+    """
+    Run the request in one unit of work: repositories share a session and the
+    transaction is committed once before the response is sent. Requests which
+    write take the write lock up front.
+    """
+    write = request.method not in READ_METHODS
+    unit_of_work = request.app.container.request_unit_of_work()
+    async with unit_of_work.request_scope(write=write):
+        yield
+
+
+router = APIRouter(dependencies=[Depends(unit_of_work_scope)])
 
 
 @router.get("/")
@@ -27,30 +72,129 @@ async def root(request: Request):
     return {"books": "books"}
 
 
-@router.get("/books/")
+@router.get("/metrics", response_class=PlainTextResponse)
+@inject
+async def metrics_get(metrics=Depends(Provide["metrics"])) -> PlainTextResponse:
+    """
+    Request, query, pool and cache metrics of this worker in the Prometheus
+    text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@router.get(
+    "/stats/authors",
+    response_model=List[AuthorStatsOutSerializer],
+    response_class=JSONBytesResponse,
+    responses=MSGPACK_OPENAPI,
+)
+@inject
+async def stats_authors(
+    request: Request,
+    pagination: Annotated[PaginationParams, Query()],
+    stats_service=Depends(Provide["stats_service"]),
+    list_cache=Depends(Provide["list_response_cache"]),
+) -> Response:
+    """
+    Retrieves a page of the book counts of the authors, ordered by author name.
+    The cursor of the next page is returned in the X-Next-Cursor header.
+    """
+    key = await call(list_cache.key, request, "author", "book")
+    if (cached := list_cache.lookup(request, key)) is not None:
+        return cached
+    page = await call(stats_service.get_author_stats, pagination)
+    return list_cache.store(
+        request,
+        key,
+        page_response(AUTHOR_STATS_LIST, page, negotiate_media_type(request)),
+    )
+
+
+@router.get(
+    "/stats/books/top",
+    response_model=List[BookStatsOutSerializer],
+    response_class=JSONBytesResponse,
+)
+@inject
+async def stats_top_books(
+    request: Request,
+    params: Annotated[TopBooksParams, Query()],
+    stats_service=Depends(Provide["stats_service"]),
+    list_cache=Depends(Provide["list_response_cache"]),
+) -> Response:
+    """
+    Retrieves the most leased books with their lease counts, most leases first.
+    """
+    key = await call(list_cache.key, request, "book", "book_lease_log")
+    if (cached := list_cache.lookup(request, key)) is not None:
+        return cached
+    books = await call(stats_service.get_top_books, params)
+    return list_cache.store(
+        request, key, JSONBytesResponse(dump_list(BOOK_STATS_LIST, books))
+    )
+
+
+@router.get(
+    "/analytics/leases",
+    response_model=LeaseAnalyticsOutSerializer,
+    response_class=JSONBytesResponse,
+)
+@inject
+async def leases_analytics(
+    params: Annotated[LeaseAnalyticsParams, Query()],
+    book_lease_service=Depends(Provide["book_lease_log_service"]),
+) -> Response:
+    """
+    Lease durations (p50/p90/p99, mean, max in seconds), ages of the open
+    leases and the number of leases created per day. `since` and `until`
+    limit the creation times of the leases, `author_id` limits them to the
+    author's books. Archived leases are included. Not cached, the ages of
+    the open leases change with the time of the request.
+    """
+    analytics = LeaseAnalyticsOutSerializer.model_validate(
+        await call(book_lease_service.analytics, params)
+    )
+    return JSONBytesResponse(analytics.model_dump_json().encode())
+
+
+@router.get(
+    "/books/",
+    response_model=List[BookOutSerializer],
+    response_class=JSONBytesResponse,
+    responses=MSGPACK_OPENAPI,
+)
 @inject
-def books_list(
+async def books_list(
+    request: Request,
     filter_params: Annotated[BookFilterParams, Query()],
     book_service=Depends(Provide["book_service"]),
-) -> List[BookOutSerializer]:
+    list_cache=Depends(Provide["list_response_cache"]),
+) -> Response:
     """
-    Retrieves a list of all books.
+    Retrieves a page of books. The cursor of the next page is returned in
+    the X-Next-Cursor header. Pages are cached until books change, a client
+    sending the ETag of its copy in If-None-Match gets 304 Not Modified.
+    Sent as MessagePack to clients accepting `application/msgpack`.
+    `fields`, e.g. `id,title,available`, limits the response and the columns
+    selected to the given fields.
     """
-    # for o in book_service.get_all(filter_params):
-    #     print(type(o))
-    #     print(o)
-    #
-    # return []
-    #
-    return [
-        BookOutSerializer.model_validate(book)
-        for book in book_service.get_all(filter_params)
-    ]
+    serializer = sparse_serializer(BookOutSerializer, filter_params.fields)
+    key = await call(list_cache.key, request, "book")
+    if (cached := list_cache.lookup(request, key)) is not None:
+        return cached
+    page = await call(
+        book_service.get_all, filter_params, fields=loaded_fields(serializer)
+    )
+    return list_cache.store(
+        request,
+        key,
+        page_response(list_adapter(serializer), page, negotiate_media_type(request)),
+    )
 
 
 @router.post("/authors/{author_id}/books/")
 @inject
-def create_book(
+async def create_book(
     author_id: int,
     book: BookInSerializer,
     book_service=Depends(Provide["book_service"]),
@@ -58,87 +202,235 @@ def create_book(
     """
     Creates a new book entry.
     """
-    book = book_service.create(book, author_id)
+    book = await call(book_service.create, book, author_id)
     return BookOutSerializer.model_validate(book)
 
 
 @router.get("/authors/{author_id}/books/")
 @inject
-def books_list_by_author(
+async def books_list_by_author(
     author_id: int, book_service=Depends(Provide["book_service"])
 ) -> List[BookOutSerializer]:
     """
     Retrieves a list of books by a specific author.
     """
-    books = book_service.get_by_author_id(author_id)
+    books = await call(book_service.get_by_author_id, author_id)
     return [BookOutSerializer.model_validate(book) for book in books]
 
 
-@router.get("/books/{book_id}")
+@router.get(
+    "/books/search",
+    response_model=List[BookOutSerializer],
+    response_class=JSONBytesResponse,
+    responses=MSGPACK_OPENAPI,
+)
 @inject
-def book_get(
-    book_id: int, book_service=Depends(Provide["book_service"])
-) -> BookOutSerializer:
+async def books_search(
+    request: Request,
+    search_params: Annotated[BookSearchParams, Query()],
+    book_service=Depends(Provide["book_service"]),
+    list_cache=Depends(Provide["list_response_cache"]),
+) -> Response:
     """
-    Retrive book detail
+    Searches books by title and author name, best match first. Every word of
+    `q` matches as a prefix, e.g. `harr pot` finds "Harry Potter". Combines
+    with the `available` filter, the cursor of the next page is returned in
+    the X-Next-Cursor header. The relevance depends on all the books, a cursor
+    only continues the listing while no book or author changes and the pages
+    read across a change may skip or repeat books.
     """
-    book = book_service.get_by_id(book_id)
-    return BookOutSerializer.model_validate(book)
+    serializer = sparse_serializer(BookOutSerializer, search_params.fields)
+    key = await call(list_cache.key, request, "book", "author")
+    if (cached := list_cache.lookup(request, key)) is not None:
+        return cached
+    page = await call(
+        book_service.search, search_params, fields=loaded_fields(serializer)
+    )
+    return list_cache.store(
+        request,
+        key,
+        page_response(list_adapter(serializer), page, negotiate_media_type(request)),
+    )
+
+
+@router.get("/books/export", response_class=StreamingResponse)
+@inject
+async def books_export(
+    params: Annotated[ExportParams, Query()],
+    book_service=Depends(Provide["book_service"]),
+) -> StreamingResponse:
+    """
+    Export all books, or only those created or updated since the given time,
+    as NDJSON or CSV. The export is streamed straight from the database cursor.
+    """
+    chunks = book_service.export(params.since)
+    return export_response(
+        export_stream(chunks, BookOutSerializer, params.format), params.format, "books"
+    )
 
 
-@router.get("/authors/")
+@router.get("/leases/export", response_class=StreamingResponse)
 @inject
-def authors_list(
+async def leases_export(
+    params: Annotated[ExportParams, Query()],
+    book_lease_service=Depends(Provide["book_lease_log_service"]),
+) -> StreamingResponse:
+    """
+    Export the lease history of all books, or only the leases created or
+    returned since the given time, as NDJSON or CSV.
+    """
+    chunks = book_lease_service.export(params.since)
+    return export_response(
+        export_stream(chunks, BookLeaseLogOutSerializer, params.format),
+        params.format,
+        "leases",
+    )
+
+
+@router.get(
+    "/books/{book_id}",
+    response_model=BookOutSerializer,
+    response_class=JSONBytesResponse,
+)
+@inject
+async def book_get(
+    book_id: int,
+    params: Annotated[FieldsParams, Query()],
+    book_service=Depends(Provide["book_service"]),
+) -> Response:
+    """
+    Retrive book detail, only the columns of the requested `fields` are read
+    unless the book is cached.
+    """
+    serializer = sparse_serializer(BookOutSerializer, params.fields)
+    book = await call(book_service.get_by_id, book_id, fields=loaded_fields(serializer))
+    return JSONBytesResponse(dump_item(serializer, book))
+
+
+@router.get(
+    "/authors/",
+    response_model=List[AuthorOutSerializer],
+    response_class=JSONBytesResponse,
+    responses=MSGPACK_OPENAPI,
+)
+@inject
+async def authors_list(
+    request: Request,
+    pagination: Annotated[AuthorListParams, Query()],
     author_service=Depends(Provide["author_service"]),
-) -> List[AuthorOutSerializer]:
+    list_cache=Depends(Provide["list_response_cache"]),
+) -> Response:
     """
-    Retrieves a list of authors.
+    Retrieves a page of authors. The cursor of the next page is returned in
+    the X-Next-Cursor header. Pages are cached until authors change, a client
+    sending the ETag of its copy in If-None-Match gets 304 Not Modified.
+    `fields` limits the response and the columns selected.
     """
-    authors = author_service.get_all()
-    return [AuthorOutSerializer.model_validate(author) for author in authors]
+    serializer = sparse_serializer(AuthorOutSerializer, pagination.fields)
+    key = await call(list_cache.key, request, "author")
+    if (cached := list_cache.lookup(request, key)) is not None:
+        return cached
+    page = await call(
+        author_service.get_all, pagination, fields=loaded_fields(serializer)
+    )
+    return list_cache.store(
+        request,
+        key,
+        page_response(list_adapter(serializer), page, negotiate_media_type(request)),
+    )
 
 
 @router.post("/authors/", status_code=201)
 @inject
-def authors_create(
+async def authors_create(
     author_serializer: AuthorInSerializer,
     author_service=Depends(Provide["author_service"]),
 ) -> AuthorOutSerializer:
     """
     Creates a new author entry.
     """
-    author = author_service.create(author_serializer)
+    author = await call(author_service.create, author_serializer)
 
     return AuthorOutSerializer.model_validate(author)
 
 
-@router.get("/authors/{author_id}")
+@router.post("/authors/bulk", openapi_extra=NDJSON_OPENAPI)
 @inject
-def authors_get(
-    author_id: int,
+async def authors_bulk_import(
+    request: Request,
+    params: Annotated[BulkImportParams, Query()],
     author_service=Depends(Provide["author_service"]),
-) -> AuthorOutSerializer:
+    unit_of_work=Depends(Provide["request_unit_of_work"]),
+) -> BulkImportResult:
     """
-    Retrieves a specific author by ID.
+    Imports authors from an NDJSON body with one `{"name": ...}` object per
+    line. Lines are inserted in batches of `batch_size`, each batch in its own
+    transaction, and invalid lines are reported with their line numbers.
     """
-    author = author_service.get_by_id(author_id)
+    return await import_ndjson(
+        request.stream(),
+        params.batch_size,
+        AuthorInSerializer,
+        importer(unit_of_work, author_service.bulk_create),
+    )
 
-    return AuthorOutSerializer.model_validate(author)
+
+@router.post("/books/bulk", openapi_extra=NDJSON_OPENAPI)
+@inject
+async def books_bulk_import(
+    request: Request,
+    params: Annotated[BulkImportParams, Query()],
+    book_service=Depends(Provide["book_service"]),
+    unit_of_work=Depends(Provide["request_unit_of_work"]),
+) -> BulkImportResult:
+    """
+    Imports books from an NDJSON body with one `{"title": ..., "author_id": ...}`
+    object per line. Lines are inserted in batches of `batch_size`, each batch
+    in its own transaction, and invalid lines or unknown authors are reported
+    with their line numbers.
+    """
+    return await import_ndjson(
+        request.stream(),
+        params.batch_size,
+        BookBulkInSerializer,
+        importer(unit_of_work, book_service.bulk_create),
+    )
+
+
+@router.get(
+    "/authors/{author_id}",
+    response_model=AuthorOutSerializer,
+    response_class=JSONBytesResponse,
+)
+@inject
+async def authors_get(
+    author_id: int,
+    params: Annotated[FieldsParams, Query()],
+    author_service=Depends(Provide["author_service"]),
+) -> Response:
+    """
+    Retrieves a specific author by ID, with the requested `fields` only.
+    """
+    serializer = sparse_serializer(AuthorOutSerializer, params.fields)
+    author = await call(
+        author_service.get_by_id, author_id, fields=loaded_fields(serializer)
+    )
+    return JSONBytesResponse(dump_item(serializer, author))
 
 
 @router.delete("/authors/{author_id}", status_code=204)
 @inject
-def authors_delete(
+async def authors_delete(
     author_id: int,
     author_service=Depends(Provide["author_service"]),
 ) -> None:
     """
     Deletes an author by ID.
     """
-    author = author_service.get_by_id(author_id)
+    author = await call(author_service.get_by_id, author_id)
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
-    author_service.delete_by_id(author_id)
+    await call(author_service.delete_by_id, author_id)
 
 
 @router.put(
@@ -150,7 +442,7 @@ def authors_delete(
     },
 )
 @inject
-def put_book_lend(
+async def put_book_lend(
     book_id: int,
     book_lease_log: BookLeaseLogInSerializer,
     user_id: Annotated[str | None, Header()] = None,
@@ -165,8 +457,11 @@ def put_book_lend(
         raise HTTPException(
             status_code=400, detail="Either user-id or x-user-id header is required"
         )
-    book_lease = book_lease_service.lease_or_return_book(
-        book_id=book_id, user_id=user_id or x_user_id, book_lease_log=book_lease_log
+    book_lease = await call(
+        book_lease_service.lease_or_return_book,
+        book_id=book_id,
+        user_id=user_id or x_user_id,
+        book_lease_log=book_lease_log,
     )
 
     status_code = 200 if book_lease.returned_at else 201
@@ -177,19 +472,56 @@ def put_book_lend(
     )
 
 
-@router.get("/books/{book_id}/leases/")
+@router.post("/leases/batch")
 @inject
-def get_book_leases(
+async def batch_book_lend(
+    batch: BookBatchLeaseInSerializer,
+    user_id: Annotated[str | None, Header()] = None,
+    x_user_id: Annotated[str | None, Header()] = None,
+    book_lease_service=Depends(Provide["book_lease_log_service"]),
+) -> List[BookLeaseResult]:
+    """
+    Lease or return several books for one user in one transaction. Every book
+    gets a result with the status code of the single book endpoint, books
+    which can not be leased or returned do not stop the others.
+    """
+    if not user_id and not x_user_id:
+        raise HTTPException(
+            status_code=400, detail="Either user-id or x-user-id header is required"
+        )
+    return await call(
+        book_lease_service.lease_or_return_books,
+        user_id=user_id or x_user_id,
+        batch=batch,
+    )
+
+
+@router.get(
+    "/books/{book_id}/leases/",
+    response_model=List[BookLeaseLogOutSerializer],
+    response_class=JSONBytesResponse,
+    responses=MSGPACK_OPENAPI,
+)
+@inject
+async def get_book_leases(
+    request: Request,
     book_id: int,
+    pagination: Annotated[LeaseHistoryParams, Query()],
     book_lease_service=Depends(Provide["book_lease_log_service"]),
-) -> List[BookLeaseLogOutSerializer]:
+) -> Response:
     """
     Get the lend status of a book.
     :param book_id: The ID of the book to get the lend status for.
-    :return: The lend status of the book.
+    :return: A page of the lend history of the book, the cursor of the next
+        page is returned in the X-Next-Cursor header. Archived leases are only
+        listed with `full_history=true`. MessagePack for clients accepting
+        `application/msgpack`, `fields` limits it to the given fields.
     """
-    book_leases = book_lease_service.get_by_book_id(book_id)
-    return [
-        BookLeaseLogOutSerializer.model_validate(book_lease)
-        for book_lease in book_leases
-    ]
+    serializer = sparse_serializer(BookLeaseLogOutSerializer, pagination.fields)
+    page = await call(
+        book_lease_service.get_by_book_id,
+        book_id,
+        pagination,
+        fields=loaded_fields(serializer),
+    )
+    return page_response(list_adapter(serializer), page, negotiate_media_type(request))
@@ -0,0 +1,44 @@
+"""
+Archival of the lease history. Returned leases older than the horizon are moved
+from `book_lease_log` to `book_lease_log_archive` in small batches, each in a
+short transaction of its own, so the hot table only holds the recent and the
+open leases. Run it periodically next to the server, e.g. from cron:
+
+    python -m ct_library.archive --older-than-days 365
+
+The defaults come from the `archive` settings of the selected profile.
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from ct_library.container import Container
+from ct_library.settings import load_settings
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = load_settings()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--older-than-days", type=int, default=settings.archive.horizon_days
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.archive.batch_size)
+    parser.add_argument("--pause", type=float, default=settings.archive.pause)
+    args = parser.parse_args(argv)
+
+    # The batches run one after another, the sync stack is enough
+    container = Container()
+    container.config.from_dict(settings.model_dump(mode="json"))
+    container.config.mode.from_value("sync")
+
+    before = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    archived = container.book_lease_log_service().archive(
+        before, batch_size=args.batch_size, pause=args.pause
+    )
+    print(f"Archived {archived} leases returned before {before.isoformat()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+from contextlib import AbstractAsyncContextManager
+from datetime import datetime
+from typing import AsyncIterator, Callable, Collection, Iterable, Sequence
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import delete, insert, select, update
+
+from ct_library.cache import (
+    Cache,
+    NullCache,
+    cached,
+    entity_key,
+    invalidate,
+    remember,
+)
+from ct_library.models import Author, Book, BookLeaseLog
+from ct_library.pagination import DEFAULT_PAGE_LIMIT
+from ct_library.repositories import (
+    ADD_AUTHOR_BOOKS,
+    ADD_BOOK_LEASES,
+    ANALYTICS_CHUNK_SIZE,
+    AUTHOR_LIST_COLUMNS,
+    BOOK_LIST_COLUMNS,
+    CURRENT_LEASE,
+    EXPORT_CHUNK_SIZE,
+    TOP_BOOKS,
+    author_book_counts,
+    author_list_query,
+    author_stats_query,
+    book_export_query,
+    book_lease_counts,
+    book_list_query,
+    book_search_query,
+    books_query,
+    current_leases,
+    existing_authors_query,
+    lease_export_query,
+    lease_history_query,
+    lease_times_query,
+    projection,
+)
+
+
+class AsyncBaseRepository:
+    def __init__(
+        self,
+        session_factory: Callable[..., AbstractAsyncContextManager[AsyncSession]],
+        cache: Cache | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.cache = cache or NullCache()
+
+
+class AsyncAuthorRepository(AsyncBaseRepository):
+    async def get_all(
+        self,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        :param fields: Columns to select, all by default.
+        """
+        async with self.session_factory() as session:
+            return (
+                await session.execute(author_list_query(after, limit, fields))
+            ).all()
+
+    async def get_by_id(
+        self, author_id, fields: Collection[str] | None = None
+    ) -> Author | Row:
+        """
+        The cached author or the author loaded and cached, only the columns of
+        the fields are selected when given and nothing is cached then.
+        """
+        if (author := cached(self.cache, Author, author_id)) is not None:
+            return author
+        async with self.session_factory() as session:
+            if fields is not None:
+                query = select(*projection(AUTHOR_LIST_COLUMNS, fields))
+                return (
+                    await session.execute(query.where(Author.id == author_id))
+                ).one()
+            query = select(Author).where(Author.id == author_id)
+            author = (await session.scalars(query)).one()
+            remember(self.cache, author)
+            return author
+
+    async def create(self, author: Author) -> Author:
+        async with self.session_factory() as session:
+            session.add(author)
+            await session.flush()
+            invalidate(self.cache, session.sync_session, entity_key(Author, author.id))
+            return author
+
+    async def delete_by_id(self, author_id) -> None:
+        async with self.session_factory() as session:
+            await session.execute(delete(Author).where(Author.id == author_id))
+            invalidate(self.cache, session.sync_session, entity_key(Author, author_id))
+
+    async def get_existing_ids(self, author_ids: Iterable[int]) -> set[int]:
+        """
+        IDs of the given authors which exist, in one query.
+        """
+        async with self.session_factory() as session:
+            return set(await session.scalars(existing_authors_query(author_ids)))
+
+    async def bulk_create(self, authors: Sequence[dict]) -> None:
+        """
+        Insert the authors with one executemany.
+        """
+        async with self.session_factory() as session:
+            await session.execute(insert(Author), authors)
+
+
+class AsyncBookRepository(AsyncBaseRepository):
+    async def get_all(
+        self,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        :param fields: Columns to select, all by default.
+        """
+        async with self.session_factory() as session:
+            query = book_list_query(None, after, limit, fields)
+            return (await session.execute(query)).all()
+
+    async def get_by_id(
+        self,
+        book_id,
+        with_history: bool = False,
+        fields: Collection[str] | None = None,
+    ) -> Book | Row:
+        """
+        The cached book or the book loaded and cached, only the columns of the
+        fields are selected when given and nothing is cached then.
+        """
+        if not with_history and (book := cached(self.cache, Book, book_id)) is not None:
+            return book
+        async with self.session_factory() as session:
+            if fields is not None and not with_history:
+                query = select(*projection(BOOK_LIST_COLUMNS, fields))
+                return (await session.execute(query.where(Book.id == book_id))).one()
+            query = books_query(Book.id == book_id, with_history=with_history)
+            book = (await session.scalars(query)).one()
+            remember(self.cache, book)
+            return book
+
+    async def get_with_current_lease(self, book_id) -> tuple[Book, BookLeaseLog | None]:
+        """
+        Get the book together with its open lease, if any, in one query.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(CURRENT_LEASE.where(Book.id == book_id))
+            return result.tuples().one()
+
+    async def get_with_current_leases(
+        self, book_ids: Iterable[int]
+    ) -> Sequence[tuple[Book, BookLeaseLog | None]]:
+        """
+        Get the books together with their open leases in one query, missing
+        books are left out.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(CURRENT_LEASE.where(Book.id.in_(book_ids)))
+            return result.tuples().all()
+
+    async def create(self, book: Book) -> Book:
+        """
+        Insert the book and count it to its author, in one transaction.
+        """
+        async with self.session_factory() as session:
+            session.add(book)
+            await session.flush()
+            await session.execute(
+                ADD_AUTHOR_BOOKS, author_book_counts([book.author_id])
+            )
+            invalidate(self.cache, session.sync_session, entity_key(Book, book.id))
+            return book
+
+    async def delete_by_id(self, book_id) -> None:
+        """
+        Delete the book and discount it from its author, in one transaction.
+        """
+        async with self.session_factory() as session:
+            author_id = await session.scalar(
+                delete(Book).where(Book.id == book_id).returning(Book.author_id)
+            )
+            if author_id is not None:
+                await session.execute(
+                    ADD_AUTHOR_BOOKS, author_book_counts([author_id], -1)
+                )
+            invalidate(self.cache, session.sync_session, entity_key(Book, book_id))
+
+    async def bulk_create(self, books: Sequence[dict]) -> None:
+        """
+        Insert the books with one executemany, their authors are counted with
+        another one.
+        """
+        async with self.session_factory() as session:
+            await session.execute(insert(Book), books)
+            await session.execute(
+                ADD_AUTHOR_BOOKS,
+                author_book_counts(book["author_id"] for book in books),
+            )
+
+    async def stream_all(
+        self, since: datetime | None = None, chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Stream all books created or updated since the given time, ordered by
+        ID, in chunks fetched from the database cursor.
+        """
+        async with self.session_factory() as session:
+            query = book_export_query(since)
+            result = await session.stream(query.execution_options(yield_per=chunk_size))
+            async for rows in result.partitions():
+                yield rows
+
+    async def get_by_author_id(
+        self, author_id, with_history: bool = False
+    ) -> Sequence[Book]:
+        async with self.session_factory() as session:
+            query = books_query(Book.author_id == author_id, with_history=with_history)
+            return (await session.scalars(query)).all()
+
+    async def filter_by_availability(
+        self,
+        available: bool,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        async with self.session_factory() as session:
+            query = book_list_query(available, after, limit, fields)
+            return (await session.execute(query)).all()
+
+    async def search(
+        self,
+        match: str,
+        available: bool | None = None,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        Books matching the full-text query (see `match_expression`), best
+        match first, optionally only the available or the leased ones.
+        """
+        async with self.session_factory() as session:
+            query = book_search_query(match, available, after, limit, fields)
+            return (await session.execute(query)).all()
+
+
+class AsyncBookLendLogRepository(AsyncBaseRepository):
+    async def get_by_id(self, lease_id) -> BookLeaseLog:
+        async with self.session_factory() as session:
+            return (
+                await session.scalars(
+                    select(BookLeaseLog).where(BookLeaseLog.id == lease_id)
+                )
+            ).one()
+
+    async def save(self, book_lease_log: BookLeaseLog) -> BookLeaseLog:
+        """
+        Save the lease log and point the book's current lease at it while it
+        is open, both in one transaction which also counts an opened lease to
+        the book's stats. The cached book is invalidated as its availability
+        changes.
+        """
+        await self.save_all([book_lease_log])
+        return book_lease_log
+
+    async def save_all(self, book_lease_logs: Sequence[BookLeaseLog]) -> None:
+        """
+        `save` for many lease logs at once: the logs are flushed together and
+        the current leases of their books are updated with one executemany.
+        """
+        async with self.session_factory() as session:
+            session.add_all(book_lease_logs)
+            await session.flush()
+            await session.execute(update(Book), current_leases(book_lease_logs))
+            if lease_counts := book_lease_counts(book_lease_logs):
+                await session.execute(ADD_BOOK_LEASES, lease_counts)
+            for log in book_lease_logs:
+                invalidate(
+                    self.cache, session.sync_session, entity_key(Book, log.book_id)
+                )
+
+    async def get_by_book_id(
+        self,
+        book_id,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        full_history: bool = False,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        :param fields: Columns to select, all by default.
+        """
+        async with self.session_factory() as session:
+            query = lease_history_query(book_id, full_history, after, limit, fields)
+            return (await session.execute(query)).all()
+
+    async def stream_lease_times(
+        self,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        author_id: int | None = None,
+        chunk_size: int = ANALYTICS_CHUNK_SIZE,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Stream the `(created, returned)` epoch seconds of the leases, see
+        `lease_times_query`, in chunks fetched from the database cursor.
+        """
+        async with self.session_factory() as session:
+            query = lease_times_query(since, until, author_id)
+            result = await session.stream(query.execution_options(yield_per=chunk_size))
+            async for rows in result.partitions():
+                yield rows
+
+    async def stream_all(
+        self, since: datetime | None = None, chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Stream all lease logs created or returned since the given time,
+        archived leases included, ordered by ID, in chunks fetched from the
+        database cursor.
+        """
+        async with self.session_factory() as session:
+            query = lease_export_query(since)
+            result = await session.stream(query.execution_options(yield_per=chunk_size))
+            async for rows in result.partitions():
+                yield rows
+
+
+class AsyncStatsRepository(AsyncBaseRepository):
+    async def get_author_stats(
+        self, after: tuple | None = None, limit: int = DEFAULT_PAGE_LIMIT
+    ) -> Sequence[Row]:
+        async with self.session_factory() as session:
+            return (await session.execute(author_stats_query(after, limit))).all()
+
+    async def get_top_books(self, limit: int) -> Sequence[Row]:
+        async with self.session_factory() as session:
+            return (await session.execute(TOP_BOOKS.limit(limit))).all()
@@ -0,0 +1,369 @@
+from datetime import datetime, timezone
+from typing import AsyncIterator, Collection, Sequence
+
+from sqlalchemy import Row
+
+from ct_library.analytics import LeaseAnalytics, epoch_seconds
+from ct_library.async_repositories import (
+    AsyncAuthorRepository,
+    AsyncBookLendLogRepository,
+    AsyncBookRepository,
+    AsyncStatsRepository,
+)
+from ct_library.models import Author, Book, BookLeaseLog
+from ct_library.pagination import Page
+from ct_library.repositories import match_expression
+from ct_library.serializers import (
+    AuthorInSerializer,
+    BookBatchLeaseInSerializer,
+    BookBulkInSerializer,
+    BookFilterParams,
+    BookInSerializer,
+    BookLeaseLogInSerializer,
+    BookLeaseResult,
+    BookSearchParams,
+    BulkImportError,
+    LeaseAnalyticsParams,
+    LeaseHistoryParams,
+    PaginationParams,
+    TopBooksParams,
+)
+from ct_library.services import (
+    AUTHOR_ORDER,
+    AUTHOR_STATS_ORDER,
+    BOOK_ORDER,
+    LEASE_ORDER,
+    SEARCH_ORDER,
+    apply_lease_actions,
+    lease_result,
+    split_by_author,
+    toggle_lease,
+)
+from ct_library.versioning import AsyncTableVersions
+
+
+class AsyncAuthorService:
+    """
+    Async service class for author operations.
+    """
+
+    def __init__(
+        self,
+        author_repository: AsyncAuthorRepository,
+        table_versions: AsyncTableVersions,
+    ):
+        self.author_repo = author_repository
+        self.table_versions = table_versions
+
+    async def create(self, author: AuthorInSerializer) -> Author:
+        """
+        Create a new author.
+        :return: The created author.
+        """
+        model = await self.author_repo.create(Author(**author.model_dump()))
+        await self.table_versions.bump("author")
+        return model
+
+    async def bulk_create(
+        self, authors: Sequence[tuple[int, AuthorInSerializer]]
+    ) -> list[BulkImportError]:
+        """
+        Create authors in bulk.
+        :param authors: Authors with the numbers of their lines.
+        :return: Errors of the authors which could not be created.
+        """
+        await self.author_repo.bulk_create(
+            [author.model_dump() for _, author in authors]
+        )
+        await self.table_versions.bump("author")
+        return []
+
+    async def get_all(
+        self, pagination: PaginationParams, fields: Collection[str] | None = None
+    ) -> Page[Row]:
+        """
+        Get a page of authors ordered by name.
+        :param fields: Fields to load, all by default.
+        :return: A page of author rows.
+        """
+        authors = await self.author_repo.get_all(
+            after=AUTHOR_ORDER.after(pagination.cursor),
+            limit=pagination.limit,
+            fields=fields,
+        )
+        return AUTHOR_ORDER.page(authors, pagination.limit)
+
+    async def get_by_id(
+        self, author_id: int, fields: Collection[str] | None = None
+    ) -> Author | Row:
+        """
+        Get an author by ID.
+        :param fields: Fields to load, all by default.
+        :return: The author with the specified ID.
+        """
+        return await self.author_repo.get_by_id(author_id, fields=fields)
+
+    async def delete_by_id(self, author_id: int) -> None:
+        """
+        Delete an author by ID.
+        :return: None
+        """
+        await self.author_repo.delete_by_id(author_id)
+        await self.table_versions.bump("author")
+
+
+class AsyncBookService:
+    """
+    Async service class for book operations.
+    """
+
+    def __init__(
+        self,
+        book_repository: AsyncBookRepository,
+        author_repository: AsyncAuthorRepository,
+        table_versions: AsyncTableVersions,
+    ):
+        self.book_repo = book_repository
+        self.author_repo = author_repository
+        self.table_versions = table_versions
+
+    async def create(self, book: BookInSerializer, author_id: int) -> Book:
+        """
+        Create a new book.
+        :return: The created book.
+        """
+        author = await self.author_repo.get_by_id(author_id)
+
+        model = Book(**book.model_dump())
+        model.author_id = author.id
+        model = await self.book_repo.create(model)
+        await self.table_versions.bump("book")
+        return model
+
+    async def bulk_create(
+        self, books: Sequence[tuple[int, BookBulkInSerializer]]
+    ) -> list[BulkImportError]:
+        """
+        Create books in bulk, the authors of all the books are checked with one
+        query.
+        :param books: Books with the numbers of their lines.
+        :return: Errors of the books whose author does not exist.
+        """
+        existing = await self.author_repo.get_existing_ids(
+            book.author_id for _, book in books
+        )
+        values, errors = split_by_author(books, existing)
+        if values:
+            await self.book_repo.bulk_create(values)
+            await self.table_versions.bump("book")
+        return errors
+
+    async def get_all(
+        self, filter_params: BookFilterParams, fields: Collection[str] | None = None
+    ) -> Page[Row]:
+        """
+        Get a page of books ordered by title.
+        :param fields: Fields to load, all by default.
+        :return: A page of book rows.
+        """
+        after = BOOK_ORDER.after(filter_params.cursor)
+        if isinstance(filter_params.available, bool):
+            books = await self.book_repo.filter_by_availability(
+                available=filter_params.available,
+                after=after,
+                limit=filter_params.limit,
+                fields=fields,
+            )
+        else:
+            books = await self.book_repo.get_all(
+                after=after, limit=filter_params.limit, fields=fields
+            )
+        return BOOK_ORDER.page(books, filter_params.limit)
+
+    def export(self, since: datetime | None = None) -> AsyncIterator[Sequence[Row]]:
+        """
+        Stream all books, or only those created or updated since the given
+        time, in chunks of rows.
+        :return: Chunks of book rows ordered by ID.
+        """
+        return self.book_repo.stream_all(since=since)
+
+    async def search(
+        self, search_params: BookSearchParams, fields: Collection[str] | None = None
+    ) -> Page[Row]:
+        """
+        Full-text search of the books by title and author name, every word of
+        the search matches as a prefix.
+        :param fields: Fields to load, all by default.
+        :return: A page of book rows, best match first.
+        """
+        match = match_expression(search_params.q)
+        if match is None:
+            return Page(items=[])
+        books = await self.book_repo.search(
+            match,
+            available=search_params.available,
+            after=SEARCH_ORDER.after(search_params.cursor),
+            limit=search_params.limit,
+            fields=fields,
+        )
+        return SEARCH_ORDER.page(books, search_params.limit)
+
+    async def get_by_id(
+        self, book_id: int, fields: Collection[str] | None = None
+    ) -> Book | Row:
+        """
+        Get a book by ID.
+        :param fields: Fields to load, all by default.
+        :return: The book with the specified ID.
+        """
+        return await self.book_repo.get_by_id(book_id, fields=fields)
+
+    async def get_by_author_id(self, author_id: int) -> Sequence[Book]:
+        """
+        Get books by author ID.
+        :return: A list of books by the specified author.
+        """
+        return await self.book_repo.get_by_author_id(author_id)
+
+    async def delete_by_id(self, book_id: int) -> None:
+        """
+        Delete a book by ID.
+        :return: None
+        """
+        await self.book_repo.delete_by_id(book_id)
+        await self.table_versions.bump("book")
+
+
+class AsyncBookLeaseService:
+    """
+    Async service class for book lend log operations.
+    """
+
+    def __init__(
+        self,
+        book_lease_log_repository: AsyncBookLendLogRepository,
+        book_repository: AsyncBookRepository,
+        table_versions: AsyncTableVersions,
+    ):
+        self.book_lease_log_repo = book_lease_log_repository
+        self.book_repo = book_repository
+        self.table_versions = table_versions
+
+    async def lease_or_return_book(
+        self, book_id: int, user_id: int, book_lease_log: BookLeaseLogInSerializer
+    ) -> BookLeaseLog:
+        """
+        Lease the book when it is available, return it otherwise.
+        Run it in a writing unit of work, the book is then read under the write
+        lock and concurrent leases of the same book can not interleave.
+        :return: The created or closed book lend log.
+        """
+        book, current_lease = await self.book_repo.get_with_current_lease(book_id)
+        book_lease_obj = toggle_lease(
+            book,
+            current_lease,
+            int(user_id),
+            book_lease_log.returned_at or datetime.now(timezone.utc),
+        )
+        book_lease_obj = await self.book_lease_log_repo.save(book_lease_obj)
+        await self.table_versions.bump("book", "book_lease_log")
+        return book_lease_obj
+
+    async def lease_or_return_books(
+        self, user_id: int, batch: BookBatchLeaseInSerializer
+    ) -> list[BookLeaseResult]:
+        """
+        Lease or return several books for one user. The books and their open
+        leases are read in one query and all lease logs are saved at once, in
+        the transaction of the unit of work which should be a writing one.
+        A book which can not be leased or returned is reported in its result
+        and does not stop the others.
+        :return: One result per distinct book ID, in the requested order.
+        """
+        user_id = int(user_id)
+        book_ids = list(dict.fromkeys(batch.book_ids))
+        outcomes = apply_lease_actions(
+            await self.book_repo.get_with_current_leases(book_ids),
+            user_id,
+            batch.action,
+            batch.returned_at or datetime.now(timezone.utc),
+        )
+        leases = [
+            lease for lease in outcomes.values() if isinstance(lease, BookLeaseLog)
+        ]
+        if leases:
+            await self.book_lease_log_repo.save_all(leases)
+            await self.table_versions.bump("book", "book_lease_log")
+        return [lease_result(book_id, outcomes.get(book_id)) for book_id in book_ids]
+
+    async def analytics(self, params: LeaseAnalyticsParams) -> dict:
+        """
+        Lease durations, ages of the open leases and daily lease volumes of the
+        leases created in the range, optionally of one author's books only.
+        The lease history is folded chunk by chunk, see `ct_library.analytics`.
+        :return: The aggregates, see `LeaseAnalyticsOutSerializer`.
+        """
+        analytics = LeaseAnalytics(now=epoch_seconds(datetime.now(timezone.utc)))
+        chunks = self.book_lease_log_repo.stream_lease_times(
+            since=params.since,
+            until=params.until,
+            author_id=params.author_id,
+        )
+        async for rows in chunks:
+            analytics.add(rows)
+        return analytics.result()
+
+    async def get_by_book_id(
+        self,
+        book_id: int,
+        pagination: LeaseHistoryParams,
+        fields: Collection[str] | None = None,
+    ) -> Page[Row]:
+        """
+        Get a page of the lease history of a book, oldest first, with the
+        archived leases when the full history is requested.
+        :return: A page of book lend log rows with the specified book ID.
+        """
+        book_leases = await self.book_lease_log_repo.get_by_book_id(
+            book_id,
+            after=LEASE_ORDER.after(pagination.cursor),
+            limit=pagination.limit,
+            full_history=pagination.full_history,
+            fields=fields,
+        )
+        return LEASE_ORDER.page(book_leases, pagination.limit)
+
+    def export(self, since: datetime | None = None) -> AsyncIterator[Sequence[Row]]:
+        """
+        Stream the lease history of all books, or only the leases created or
+        returned since the given time, in chunks of rows.
+        :return: Chunks of book lend log rows ordered by ID.
+        """
+        return self.book_lease_log_repo.stream_all(since=since)
+
+
+class AsyncStatsService:
+    """
+    Async counterpart of `StatsService`.
+    """
+
+    def __init__(self, stats_repository: AsyncStatsRepository):
+        self.stats_repo = stats_repository
+
+    async def get_author_stats(self, pagination: PaginationParams) -> Page[Row]:
+        """
+        Get a page of the book counts of the authors, ordered by author name.
+        :return: A page of author stats rows.
+        """
+        authors = await self.stats_repo.get_author_stats(
+            after=AUTHOR_STATS_ORDER.after(pagination.cursor), limit=pagination.limit
+        )
+        return AUTHOR_STATS_ORDER.page(authors, pagination.limit)
+
+    async def get_top_books(self, params: TopBooksParams) -> Sequence[Row]:
+        """
+        Get the most leased books.
+        :return: Book stats rows, most leases first.
+        """
+        return await self.stats_repo.get_top_books(params.limit)
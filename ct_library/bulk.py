@@ -0,0 +1,136 @@
+from typing import AsyncIterator, Awaitable, Callable, Sequence, TypeVar
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
+
+from ct_library.concurrency import call
+from ct_library.serializers import (
+    MAX_REPORTED_IMPORT_ERRORS,
+    BulkImportError,
+    BulkImportResult,
+)
+from ct_library.unit_of_work import AsyncUnitOfWork, UnitOfWork
+
+T = TypeVar("T", bound=BaseModel)
+
+# Validated records of a batch with their line numbers
+Rows = Sequence[tuple[int, T]]
+BatchImporter = Callable[[Rows], Awaitable[list[BulkImportError]]]
+
+
+async def ndjson_batches(
+    chunks: AsyncIterator[bytes], batch_size: int
+) -> AsyncIterator[list[tuple[int, bytes]]]:
+    """
+    Split a streamed NDJSON body into batches of non-empty lines.
+    :param chunks: The request body, e.g. `request.stream()`.
+    :param batch_size: Maximal number of lines of a batch.
+    :return: Batches of (line number, line) tuples.
+    """
+    batch: list[tuple[int, bytes]] = []
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                batch.append((line_number, line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if buffer.strip():
+        batch.append((line_number + 1, buffer))
+    if batch:
+        yield batch
+
+
+def parse_lines(
+    batch: list[tuple[int, bytes]], serializer: type[T]
+) -> tuple[list[tuple[int, T]], list[BulkImportError]]:
+    """
+    Validate every line of the batch with the serializer.
+    :return: The valid records and the errors of the invalid lines.
+    """
+    rows, errors = [], []
+    for line_number, line in batch:
+        try:
+            rows.append((line_number, serializer.model_validate_json(line)))
+        except ValidationError as exc:
+            errors.append(BulkImportError(line=line_number, error=_describe(exc)))
+    return rows, errors
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        (
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+            if error["loc"]
+            else error["msg"]
+        )
+        for error in exc.errors()
+    )
+
+
+def importer(
+    unit_of_work: UnitOfWork | AsyncUnitOfWork,
+    bulk_create: (
+        Callable[[Rows], list[BulkImportError]]
+        | Callable[[Rows], Awaitable[list[BulkImportError]]]
+    ),
+) -> BatchImporter:
+    """
+    Run the service `bulk_create` of either stack, one transaction per batch.
+    """
+
+    async def import_batch(rows: Rows) -> list[BulkImportError]:
+        async with unit_of_work.request_scope(write=True):
+            return await call(bulk_create, rows)
+
+    return import_batch
+
+
+async def import_ndjson(
+    chunks: AsyncIterator[bytes],
+    batch_size: int,
+    serializer: type[T],
+    import_batch: BatchImporter,
+) -> BulkImportResult:
+    """
+    Validate and import a streamed NDJSON body batch by batch. Batches are
+    committed one by one, a batch rejected by the database fails all its lines
+    but does not stop the import.
+    :param chunks: The request body.
+    :param batch_size: Number of lines inserted in one transaction.
+    :param serializer: Serializer of one line.
+    :param import_batch: Inserts the valid records of a batch.
+    :return: Counts of created and failed lines with the first errors.
+    """
+    result = BulkImportResult()
+    async for batch in ndjson_batches(chunks, batch_size):
+        rows, errors = parse_lines(batch, serializer)
+        if rows:
+            try:
+                errors += await import_batch(rows)
+            except IntegrityError as exc:
+                errors += [
+                    BulkImportError(
+                        line=line_number, error=f"Batch rejected: {exc.orig}"
+                    )
+                    for line_number, _ in rows
+                ]
+        result.created += len(batch) - len(errors)
+        result.failed += len(errors)
+        room = MAX_REPORTED_IMPORT_ERRORS - len(result.errors)
+        result.errors += sorted(errors, key=lambda error: error.line)[:room]
+    return result
+
+
+# OpenAPI description of the NDJSON body, the endpoints read it as a stream
+NDJSON_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/x-ndjson": {"schema": {"type": "string"}}},
+    }
+}
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, TypeVar
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+T = TypeVar("T")
+
+_PENDING_INVALIDATIONS = "entity_cache_invalidations"
+
+
+class NullCache:
+    """
+    Cache which stores nothing, used when caching is disabled.
+    """
+
+    hits = 0
+    misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        pass
+
+    def delete(self, key: Hashable) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": 0, "misses": 0, "size": 0}
+
+
+class EntityCache:
+    """
+    In-process LRU cache with a TTL, safe to share between threads.
+
+    :param max_size: Maximal number of entries, the least recently used entry
+        is evicted when it is exceeded.
+    :param ttl: Seconds an entry stays valid.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+# Implementations the repositories accept
+Cache = EntityCache | NullCache
+
+
+def entity_key(model: type, entity_id: Any) -> tuple[str, int]:
+    """
+    Cache key of the entity with the ID.
+    """
+    return model.__tablename__, int(entity_id)
+
+
+def snapshot(entity: Any) -> dict[str, Any]:
+    """
+    Column values of the entity. Entries hold snapshots rather than the
+    entities themselves, so no ORM instance is ever shared between sessions.
+    """
+    return {
+        attr.key: getattr(entity, attr.key)
+        for attr in inspect(entity).mapper.column_attrs
+    }
+
+
+def restore(model: type[T], values: dict[str, Any]) -> T:
+    """
+    Detached entity built from a snapshot, as if it was loaded by a session
+    which has been closed since.
+    """
+    entity = model(**values)
+    make_transient_to_detached(entity)
+    return entity
+
+
+def cached(cache: Cache, model: type[T], entity_id: Any) -> T | None:
+    """
+    The cached entity with the ID, None when it is not cached.
+    """
+    values = cache.get(entity_key(model, entity_id))
+    return None if values is None else restore(model, values)
+
+
+def remember(cache: Cache, entity: Any) -> None:
+    """
+    Cache a snapshot of the loaded entity.
+    """
+    cache.set(entity_key(type(entity), entity.id), snapshot(entity))
+
+
+def invalidate(cache: Cache, session: Session, key: Hashable) -> None:
+    """
+    Drop the entry now and once more when the transaction of the session ends,
+    a concurrent reader could otherwise cache the row as it was before the
+    commit.
+    :param session: The (sync) session doing the write.
+    """
+    cache.delete(key)
+    session.info.setdefault(_PENDING_INVALIDATIONS, []).append((cache, key))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _invalidate_pending(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    for cache, key in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        cache.delete(key)
@@ -0,0 +1,93 @@
+"""
+Response compression negotiated by Accept-Encoding: zstd when the client
+accepts it and the optional `zstandard` package is installed (the `zstd`
+extra), gzip otherwise. Bodies smaller than the threshold are sent as is, the
+framing would outweigh the savings.
+
+Built on the responders of Starlette's `GZipMiddleware`, streamed responses
+(the exports) are compressed chunk by chunk.
+"""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+from ct_library.negotiation import quality_values
+from ct_library.settings import CompressionSettings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class ZstdResponder(IdentityResponder):
+    content_encoding = "zstd"
+
+    def __init__(self, app, minimum_size: int, level: int):
+        super().__init__(app, minimum_size)
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.compress(body) + self.compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        return self.compressor.compress(body) + self.compressor.flush()
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """
+    Codings of the Accept-Encoding header, without those refused with q=0.
+    """
+    return {coding for coding, q in quality_values(accept_encoding).items() if q > 0}
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing the responses of at least `minimum_size`
+    bytes with zstd or gzip. Every response varies by Accept-Encoding. When
+    zstd or gzip is negotiated the response carries a weak ETag, the bytes
+    differ from the identity encoding the tag was computed for; a 304 Not
+    Modified or a response below `minimum_size` carries the same weak tag.
+    """
+
+    def __init__(self, app, settings: CompressionSettings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        minimum_size = self.settings.minimum_size
+        if "zstd" in encodings and zstandard is not None:
+            responder = ZstdResponder(self.app, minimum_size, self.settings.zstd_level)
+        elif "gzip" in encodings:
+            responder = GZipResponder(
+                self.app, minimum_size, compresslevel=self.settings.gzip_level
+            )
+        else:
+            await self.app(scope, receive, _negotiated(send, encoded=False))
+            return
+        await responder(scope, receive, _negotiated(send, encoded=True))
+
+
+def _negotiated(send, encoded: bool):
+    """
+    Add Accept-Encoding to the Vary header of the response, weaken its ETag
+    when an encoding other than identity was negotiated.
+    """
+
+    async def send_negotiated(message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if encoded and etag and not etag.startswith("W/"):
+                headers["etag"] = f"W/{etag}"
+        await send(message)
+
+    return send_negotiated
@@ -0,0 +1,32 @@
+"""
+Calls of the routes into the services of the stack the container runs. The
+coroutines of the async stack are awaited on the event loop, the blocking
+calls of the sync stack run in the thread pool, which sees the unit of work
+scope of the request as the context is copied to the worker threads.
+"""
+
+import inspect
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+
+T = TypeVar("T")
+
+
+async def call(function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Await the coroutine function, or run the blocking one in the thread pool.
+    :return: The result of the function.
+    """
+    if inspect.iscoroutinefunction(function):
+        return await function(*args, **kwargs)
+    return await run_in_threadpool(function, *args, **kwargs)
+
+
+def stream(iterator: Iterator[T] | AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Iterate an async iterator as it is, a blocking one in the thread pool.
+    """
+    if isinstance(iterator, AsyncIterator):
+        return iterator
+    return iterate_in_threadpool(iterator)
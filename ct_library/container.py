@@ -1,51 +1,260 @@
 from dependency_injector import containers, providers
 from fastapi import FastAPI
 
-from ct_library.models import engine_factory, session_factory
+from ct_library.async_repositories import (
+    AsyncAuthorRepository,
+    AsyncBookLendLogRepository,
+    AsyncBookRepository,
+    AsyncStatsRepository,
+)
+from ct_library.async_services import (
+    AsyncAuthorService,
+    AsyncBookLeaseService,
+    AsyncBookService,
+    AsyncStatsService,
+)
+from ct_library.cache import EntityCache, NullCache
+from ct_library.metrics import Metrics
+from ct_library.models import (
+    async_engine_factory,
+    async_read_engine_factory,
+    async_session_factory,
+    async_url,
+    engine_factory,
+    read_engine_factory,
+    session_factory,
+)
 from ct_library.repositories import (
     AuthorRepository,
     BookLendLogRepository,
     BookRepository,
+    StatsRepository,
 )
 from ct_library.services import (
     AuthorService,
     BookLeaseService,
     BookService,
+    StatsService,
+)
+from ct_library.settings import Settings
+from ct_library.unit_of_work import AsyncUnitOfWork, UnitOfWork
+from ct_library.versioning import (
+    AsyncListResponseCache,
+    AsyncTableVersions,
+    ListResponseCache,
+    TableVersions,
 )
 
 
 class Container(containers.DeclarativeContainer):
     """
     This container is used to register the dependencies for the applicatiin.
+
+    `config.mode` selects the sync ("sync") or the native async ("async")
+    stack, services resolve to the implementation of the selected mode.
+    `config.cache.backend` selects the entity cache of the repositories,
+    "memory" for the in-process LRU cache or "none" to disable it; settings
+    with several workers always disable it.
+    `config.db.echo` logs every statement, turn it off in production.
+    Sessions read from a read-only engine (`config.db.read_url`, the SQLite
+    file opened read-only by default) until they write, see `routing`.
+
+    The configuration defaults to the dev profile of `ct_library.settings`,
+    load another one with `config.from_dict(settings.model_dump(mode="json"))`.
     """
 
     wiring_config = containers.WiringConfiguration(
         modules=[".services", ".api", ".repositories"]
     )
-    db_engine = providers.Singleton(engine_factory, db_url="sqlite:///database.db")
-    db_session_factory = providers.Factory(session_factory, engine=db_engine)
+    config = providers.Configuration(default=Settings().model_dump(mode="json"))
+    entity_cache = providers.Selector(
+        config.cache.backend,
+        memory=providers.Singleton(
+            EntityCache,
+            max_size=config.cache.max_size.as_int(),
+            ttl=config.cache.ttl.as_float(),
+        ),
+        none=providers.Singleton(NullCache),
+    )
+    response_cache = providers.Singleton(
+        EntityCache,
+        max_size=config.response_cache.max_size.as_int(),
+        ttl=config.response_cache.ttl.as_float(),
+    )
+    metrics = providers.Singleton(
+        Metrics,
+        caches=providers.Dict(entity=entity_cache, list_response=response_cache),
+    )
+    db_engine = providers.Singleton(
+        engine_factory,
+        db_url=config.db.url,
+        pragmas=config.db.pragmas,
+        pool_size=config.db.pool_size.as_int(),
+        max_overflow=config.db.max_overflow.as_int(),
+        pool_timeout=config.db.pool_timeout.as_float(),
+        echo=config.db.echo,
+        metrics=metrics,
+    )
+    db_read_engine = providers.Singleton(
+        read_engine_factory,
+        db_url=config.db.url,
+        read_url=config.db.read_url,
+        pragmas=config.db.pragmas,
+        pool_size=config.db.pool_size.as_int(),
+        max_overflow=config.db.max_overflow.as_int(),
+        pool_timeout=config.db.pool_timeout.as_float(),
+        echo=config.db.echo,
+        metrics=metrics,
+    )
+    db_session_factory = providers.Factory(
+        session_factory, engine=db_engine, read_engine=db_read_engine
+    )
+    unit_of_work = providers.Singleton(UnitOfWork, session_factory=db_session_factory)
+    # The sync URLs with the async driver unless set explicitly
+    async_db_url = providers.Callable(async_url, config.db.url, config.db.async_url)
+    async_db_read_url = providers.Callable(
+        async_url, config.db.read_url, config.db.async_read_url
+    )
+    async_db_engine = providers.Singleton(
+        async_engine_factory,
+        db_url=async_db_url,
+        pragmas=config.db.pragmas,
+        pool_size=config.db.pool_size.as_int(),
+        max_overflow=config.db.max_overflow.as_int(),
+        pool_timeout=config.db.pool_timeout.as_float(),
+        echo=config.db.echo,
+        metrics=metrics,
+    )
+    async_db_read_engine = providers.Singleton(
+        async_read_engine_factory,
+        db_url=async_db_url,
+        read_url=async_db_read_url,
+        pragmas=config.db.pragmas,
+        pool_size=config.db.pool_size.as_int(),
+        max_overflow=config.db.max_overflow.as_int(),
+        pool_timeout=config.db.pool_timeout.as_float(),
+        echo=config.db.echo,
+        metrics=metrics,
+    )
+    async_db_session_factory = providers.Factory(
+        async_session_factory,
+        engine=async_db_engine,
+        read_engine=async_db_read_engine,
+    )
+    async_unit_of_work = providers.Singleton(
+        AsyncUnitOfWork, session_factory=async_db_session_factory
+    )
+    # Unit of work of the services of the selected mode, the routes open its
+    # `request_scope` around every request
+    request_unit_of_work = providers.Selector(
+        config.mode, sync=unit_of_work, **{"async": async_unit_of_work}
+    )
     app = providers.Singleton(FastAPI)
+    table_versions = providers.Selector(
+        config.mode,
+        sync=providers.Singleton(TableVersions, unit_of_work=unit_of_work),
+        **{
+            "async": providers.Singleton(
+                AsyncTableVersions, unit_of_work=async_unit_of_work
+            )
+        },
+    )
+    list_response_cache = providers.Selector(
+        config.mode,
+        sync=providers.Singleton(
+            ListResponseCache, table_versions=table_versions, cache=response_cache
+        ),
+        **{
+            "async": providers.Singleton(
+                AsyncListResponseCache,
+                table_versions=table_versions,
+                cache=response_cache,
+            )
+        },
+    )
 
     author_repository = providers.Factory(
-        AuthorRepository, session_factory=db_session_factory
+        AuthorRepository, session_factory=unit_of_work, cache=entity_cache
     )
     book_repository = providers.Factory(
-        BookRepository, session_factory=db_session_factory
+        BookRepository, session_factory=unit_of_work, cache=entity_cache
     )
     book_lease_log_repository = providers.Singleton(
-        BookLendLogRepository, session_factory=db_session_factory
+        BookLendLogRepository, session_factory=unit_of_work, cache=entity_cache
     )
+    stats_repository = providers.Factory(StatsRepository, session_factory=unit_of_work)
 
-    book_service = providers.Singleton(
-        BookService,
-        book_repository=book_repository,
-        author_repository=author_repository,
+    async_author_repository = providers.Factory(
+        AsyncAuthorRepository, session_factory=async_unit_of_work, cache=entity_cache
+    )
+    async_book_repository = providers.Factory(
+        AsyncBookRepository, session_factory=async_unit_of_work, cache=entity_cache
+    )
+    async_book_lease_log_repository = providers.Singleton(
+        AsyncBookLendLogRepository,
+        session_factory=async_unit_of_work,
+        cache=entity_cache,
+    )
+    async_stats_repository = providers.Factory(
+        AsyncStatsRepository, session_factory=async_unit_of_work
+    )
+
+    book_service = providers.Selector(
+        config.mode,
+        sync=providers.Singleton(
+            BookService,
+            book_repository=book_repository,
+            author_repository=author_repository,
+            table_versions=table_versions,
+        ),
+        **{
+            "async": providers.Singleton(
+                AsyncBookService,
+                book_repository=async_book_repository,
+                author_repository=async_author_repository,
+                table_versions=table_versions,
+            )
+        },
+    )
+    author_service = providers.Selector(
+        config.mode,
+        sync=providers.Singleton(
+            AuthorService,
+            author_repository=author_repository,
+            table_versions=table_versions,
+        ),
+        **{
+            "async": providers.Singleton(
+                AsyncAuthorService,
+                author_repository=async_author_repository,
+                table_versions=table_versions,
+            )
+        },
     )
-    author_service = providers.Singleton(
-        AuthorService, author_repository=author_repository
+    book_lease_log_service = providers.Selector(
+        config.mode,
+        sync=providers.Singleton(
+            BookLeaseService,
+            book_lease_log_repository=book_lease_log_repository,
+            book_repository=book_repository,
+            table_versions=table_versions,
+            unit_of_work=unit_of_work,
+        ),
+        **{
+            "async": providers.Singleton(
+                AsyncBookLeaseService,
+                book_lease_log_repository=async_book_lease_log_repository,
+                book_repository=async_book_repository,
+                table_versions=table_versions,
+            )
+        },
     )
-    book_lease_log_service = providers.Singleton(
-        BookLeaseService,
-        book_lease_log_repository=book_lease_log_repository,
-        book_repository=book_repository,
+    stats_service = providers.Selector(
+        config.mode,
+        sync=providers.Singleton(StatsService, stats_repository=stats_repository),
+        **{
+            "async": providers.Singleton(
+                AsyncStatsService, stats_repository=async_stats_repository
+            )
+        },
     )
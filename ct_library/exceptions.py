@@ -13,6 +13,18 @@ class Forbidden(AwesomeException):
     pass
 
 
+class Conflict(AwesomeException):
+    pass
+
+
+class InvalidCursor(AwesomeException):
+    pass
+
+
+class InvalidFields(AwesomeException):
+    pass
+
+
 def register_exception_handlers(app: FastAPI) -> None:
     """
     Register exception handlers for the application.
@@ -45,6 +57,40 @@ def register_exception_handlers(app: FastAPI) -> None:
             content={"detail": "Forbidden"},
         )
 
+    @app.exception_handler(Conflict)
+    def conflict_exception_handler(request: Request, exc: Conflict) -> JSONResponse:
+        """
+        Handle Conflict.
+        """
+        return JSONResponse(
+            status_code=409,
+            content={"detail": str(exc)},
+        )
+
+    @app.exception_handler(InvalidCursor)
+    def invalid_cursor_exception_handler(
+        request: Request, exc: InvalidCursor
+    ) -> JSONResponse:
+        """
+        Handle InvalidCursor.
+        """
+        return JSONResponse(
+            status_code=400,
+            content={"detail": "Invalid pagination cursor"},
+        )
+
+    @app.exception_handler(InvalidFields)
+    def invalid_fields_exception_handler(
+        request: Request, exc: InvalidFields
+    ) -> JSONResponse:
+        """
+        Handle InvalidFields.
+        """
+        return JSONResponse(
+            status_code=400,
+            content={"detail": str(exc)},
+        )
+
     @app.exception_handler(IntegrityError)
     def integrity_error_exception_handler(
         request: Request, exc: IntegrityError
@@ -0,0 +1,86 @@
+import csv
+import io
+from typing import AsyncIterator, Iterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Row
+
+from ct_library.concurrency import stream
+from ct_library.serializers import ExportFormat, list_adapter, validate_list
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+class ChunkEncoder:
+    """
+    Encodes chunks of rows with the serializer as NDJSON lines or CSV rows.
+    """
+
+    def __init__(self, serializer: type[BaseModel], export_format: ExportFormat):
+        self.serializer = serializer
+        self.adapter = list_adapter(serializer)
+        self.format = export_format
+
+    def header(self) -> bytes:
+        """
+        The CSV header, nothing for NDJSON.
+        """
+        if self.format is not ExportFormat.csv:
+            return b""
+        return self._csv_rows(
+            [[*self.serializer.model_fields, *self.serializer.model_computed_fields]]
+        )
+
+    def encode(self, rows: Sequence[Row]) -> bytes:
+        values = validate_list(self.adapter, rows)
+        if self.format is ExportFormat.ndjson:
+            return b"".join(
+                value.__pydantic_serializer__.to_json(value) + b"\n" for value in values
+            )
+        return self._csv_rows(
+            value.model_dump(mode="json").values() for value in values
+        )
+
+    @staticmethod
+    def _csv_rows(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+async def export_stream(
+    chunks: Iterator[Sequence[Row]] | AsyncIterator[Sequence[Row]],
+    serializer: type[BaseModel],
+    export_format: ExportFormat,
+) -> AsyncIterator[bytes]:
+    """
+    Encode the chunks of rows one by one, the chunks of the sync stack are
+    fetched in the thread pool.
+    """
+    encoder = ChunkEncoder(serializer, export_format)
+    if header := encoder.header():
+        yield header
+    async for rows in stream(chunks):
+        yield encoder.encode(rows)
+
+
+def export_response(
+    body: AsyncIterator[bytes], export_format: ExportFormat, name: str
+) -> StreamingResponse:
+    """
+    Stream the export as a file download.
+    :param name: File name without the extension.
+    """
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{name}.{export_format.value}"'
+            )
+        },
+    )
@@ -1,29 +1,74 @@
 import os
 import sys
+from functools import partial
 from pathlib import Path
 
 import uvicorn
+from anyio import to_thread
 
 current_folder = Path(__file__).resolve().parent
 sys.path.append(os.path.join(current_folder, "../"))
 
+from ct_library.settings import Settings, load_settings  # noqa: E402
 
-def app_factory():
+
+async def limit_thread_pool(size: int) -> None:
+    """
+    Size the thread pool running the sync endpoints, on startup as the limiter
+    belongs to the event loop.
+    """
+    to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def app_factory(settings: Settings | None = None):
     """
     Factory function to create a FastAPI app instance.
+    :param settings: Settings of the app, loaded from the environment by
+        default (see `ct_library.settings`).
     :return: A FastAPI app instance.
     """
+    from ct_library.admission import AdmissionMiddleware
     from ct_library.api import router
+    from ct_library.compression import CompressionMiddleware
     from ct_library.container import Container  # noqa: F401, F403
     from ct_library.exceptions import register_exception_handlers  # noqa: F401, F403:q
+    from ct_library.metrics import InstrumentationMiddleware
+    from ct_library.workers import warm_up
 
+    settings = settings or load_settings()
     di_container = Container()
+    di_container.config.from_dict(settings.model_dump(mode="json"))
 
     app = di_container.app()
+    app.container = di_container
     app.include_router(router)
+    if settings.compression.enabled:
+        app.add_middleware(CompressionMiddleware, settings=settings.compression)
+    if settings.admission.enabled:
+        # Added before the instrumentation so it runs within it, which records
+        # the rejections too
+        app.add_middleware(
+            AdmissionMiddleware,
+            settings=settings.admission,
+            metrics=di_container.metrics(),
+        )
+    app.add_middleware(InstrumentationMiddleware, metrics=di_container.metrics())
+    app.router.on_startup.append(
+        partial(limit_thread_pool, settings.server.thread_pool_size)
+    )
+    app.router.on_startup.append(partial(warm_up, di_container))
     register_exception_handlers(app)
     return app
 
 
 if __name__ == "__main__":
-    uvicorn.run(app_factory, host="0.0.0.0", port=8000)
+    # Workers import the app factory and build their app, engine included,
+    # after they start; the parent process never connects to the database.
+    server = load_settings().server
+    uvicorn.run(
+        "ct_library.main:app_factory",
+        factory=True,
+        host=server.host,
+        port=server.port,
+        workers=server.workers,
+    )
@@ -0,0 +1,331 @@
+"""
+Request, query, pool and cache instrumentation exposed in the Prometheus text
+format, without a Prometheus client dependency.
+
+`InstrumentationMiddleware` times every request and collects the queries it
+runs, `instrument_engine` hooks an engine into the cursor and pool events.
+The admission budgets (see `ct_library.admission`) report their queues.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Mapping
+
+from sqlalchemy import Engine, event
+
+from ct_library.cache import Cache
+
+if TYPE_CHECKING:
+    from ct_library.admission import Budget
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the request latency histogram in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Reasons of the admission rejections, see `ct_library.admission.Budget`
+REJECT_REASONS = ("queue_full", "timeout")
+
+# Route label of requests which did not match any route
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestStats:
+    """
+    Queries run on behalf of one request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        :return: (upper bound, count of values up to it) pairs including +Inf.
+        """
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        total, pairs = 0, []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+    """
+    Process wide metrics registry, every worker exposes its own.
+    :param caches: Caches whose hit rates are exported, by name.
+    """
+
+    def __init__(self, caches: Mapping[str, Cache] | None = None):
+        self.caches = dict(caches or {})
+        self.engines: dict[str, Engine] = {}
+        self.budgets: dict[str, "Budget"] = {}
+        self._latency: dict[tuple[str, str, str], Histogram] = {}
+        self._queries: defaultdict[str, int] = defaultdict(int)
+        self._db_time: defaultdict[str, float] = defaultdict(float)
+        self._checkouts: defaultdict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe_request(
+        self, method: str, route: str, status: int, duration: float, stats: RequestStats
+    ) -> None:
+        with self._lock:
+            key = (method, route, str(status))
+            if (histogram := self._latency.get(key)) is None:
+                histogram = self._latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(duration)
+            self._queries[route] += stats.queries
+            self._db_time[route] += stats.db_time
+
+    def observe_query(self, duration: float) -> None:
+        """
+        Count a query against the current request, it is added to the route
+        once the request ends. Queries run outside of a request are counted
+        under the `none` route right away.
+        """
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += duration
+            return
+        with self._lock:
+            self._queries["none"] += 1
+            self._db_time["none"] += duration
+
+    def observe_checkout(self, engine: str) -> None:
+        with self._lock:
+            self._checkouts[engine] += 1
+
+    def render(self) -> str:
+        """
+        :return: All metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, route, status), histogram in sorted(self._latency.items()):
+                labels = f'method="{method}",route="{route}",status="{status}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}}'
+                        f" {count}"
+                    )
+                lines.append(
+                    f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum}"
+                )
+                lines.append(
+                    f"http_request_duration_seconds_count{{{labels}}}"
+                    f" {sum(histogram.counts)}"
+                )
+            lines += _counter(
+                "db_queries_total", "Queries run by route.", "route", self._queries
+            )
+            lines += _counter(
+                "db_query_duration_seconds_total",
+                "Time spent in queries by route.",
+                "route",
+                self._db_time,
+            )
+            lines += _counter(
+                "db_pool_checkouts_total",
+                "Connections checked out of the pool.",
+                "engine",
+                self._checkouts,
+            )
+        lines += _gauge(
+            "db_pool_checked_out",
+            "Connections currently checked out of the pool.",
+            "engine",
+            {
+                name: engine.pool.checkedout()
+                for name, engine in self.engines.items()
+                if hasattr(engine.pool, "checkedout")
+            },
+        )
+        lines += self._render_budgets()
+        stats = {name: cache.stats() for name, cache in self.caches.items()}
+        for field in ("hits", "misses"):
+            lines += _counter(
+                f"cache_{field}_total",
+                f"Cache {field}.",
+                "cache",
+                {name: values[field] for name, values in stats.items()},
+            )
+        lines += _gauge(
+            "cache_hit_ratio",
+            "Share of cache lookups which were hits.",
+            "cache",
+            {
+                name: values["hits"] / lookups
+                for name, values in stats.items()
+                if (lookups := values["hits"] + values["misses"])
+            },
+        )
+        lines += _gauge(
+            "cache_entries",
+            "Entries held in the cache.",
+            "cache",
+            {name: values["size"] for name, values in stats.items()},
+        )
+        return "\n".join(lines) + "\n"
+
+    def _render_budgets(self) -> list[str]:
+        budgets = self.budgets.items()
+        lines = _gauge(
+            "admission_active_requests",
+            "Requests running within the admission budget.",
+            "budget",
+            {name: budget.active for name, budget in budgets},
+        )
+        lines += _gauge(
+            "admission_queue_depth",
+            "Requests waiting for the admission budget.",
+            "budget",
+            {name: budget.waiting for name, budget in budgets},
+        )
+        lines += _counter(
+            "admission_admitted_total",
+            "Requests admitted by the budget.",
+            "budget",
+            {name: budget.admitted for name, budget in budgets},
+        )
+        lines += [
+            "# HELP admission_rejected_total Requests rejected with 503 by reason.",
+            "# TYPE admission_rejected_total counter",
+        ]
+        for name, budget in sorted(budgets):
+            for reason in REJECT_REASONS:
+                lines.append(
+                    f'admission_rejected_total{{budget="{name}",reason="{reason}"}}'
+                    f" {budget.rejected[reason]}"
+                )
+        return lines
+
+
+def _number(value: float) -> str:
+    return repr(float(value))
+
+
+def _counter(name: str, help: str, label: str, values: Mapping) -> list[str]:
+    return _series(name, help, "counter", label, values)
+
+
+def _gauge(name: str, help: str, label: str, values: Mapping) -> list[str]:
+    return _series(name, help, "gauge", label, values)
+
+
+def _series(name: str, help: str, kind: str, label: str, values: Mapping) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"] + [
+        f'{name}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())
+    ]
+
+
+def instrument_engine(engine: Engine, metrics: Metrics, name: str) -> None:
+    """
+    Time every statement of the engine and count its pool checkouts.
+    :param engine: The (sync) database engine.
+    :param name: Engine label of the pool metrics.
+    """
+    metrics.engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        metrics.observe_query(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.observe_checkout(name)
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware timing every HTTP request. The queries of the request and
+    the time spent in them are sent in the Server-Timing header and recorded
+    in the metrics under the route template, e.g. `/books/{book_id}`.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+        self._routes: dict | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = (time.perf_counter() - start) * 1000
+                timing = (
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries",'
+                    f" app;dur={total:.2f}"
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", timing.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            self.metrics.observe_request(
+                scope["method"],
+                self._route(scope),
+                status,
+                time.perf_counter() - start,
+                stats,
+            )
+
+    def _route(self, scope) -> str:
+        """
+        Template of the matched route, raw paths would give every book its own
+        series.
+        """
+        if "endpoint" not in scope:
+            return UNMATCHED_ROUTE
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "endpoint", None): route.path
+                for route in scope["app"].routes
+            }
+        return self._routes.get(scope["endpoint"], UNMATCHED_ROUTE)
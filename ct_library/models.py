@@ -1,20 +1,30 @@
 import datetime
-from contextlib import AbstractContextManager
+import os
+import weakref
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
 from typing import Callable
 
 from sqlalchemy import (
+    DDL,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
+    column,
     create_engine,
-    desc,
-    null,
-    select,
+    event,
+    table,
     text,
 )
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -27,25 +37,266 @@ from sqlalchemy.orm import (
     sessionmaker,
 )
 
+from ct_library.metrics import Metrics, instrument_engine
+from ct_library.routing import RoutingSession, read_only_pragmas, read_only_url
+
+# Async drivers of the database backends, see `async_url`
+ASYNC_DRIVERS = {"sqlite": "aiosqlite"}
+
+# Applied to every new pooled connection of SQLite engines
+DEFAULT_SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative value is in KiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    """
+    Run the pragmas on every connection the engine opens. SQLite pragmas are
+    per connection, so setting them once at startup misses pooled connections.
+    :param engine: The (sync) database engine.
+    :param pragmas: Pragma names and values.
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def use_sqlite_transactions(engine: Engine) -> None:
+    """
+    Let SQLAlchemy emit BEGIN itself. The sqlite3 driver would otherwise defer
+    it until the first write, leaving the reads of a unit of work outside of
+    its transaction.
+
+    The `sqlite_begin` execution option selects the transaction type, e.g.
+    `IMMEDIATE` takes the write lock up front so a read-modify-write unit of
+    work can not interleave with another writer.
+    :param engine: The (sync) database engine.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
 
-def engine_factory(db_url: str) -> Engine:
-    engine = create_engine(db_url, echo=True)
-    with engine.connect() as conn:
-        conn.execute(text("PRAGMA foreign_keys=ON"))
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        mode = conn.get_execution_options().get("sqlite_begin")
+        conn.exec_driver_sql(f"BEGIN {mode}" if mode else "BEGIN")
+
+
+def dispose_on_fork(engine: Engine) -> None:
+    """
+    Drop the pooled connections a forked child inherits from its parent. They
+    are left open as they still belong to the parent, the child opens its own
+    on first use.
+    :param engine: The (sync) database engine.
+    """
+    engine_ref = weakref.ref(engine)
+
+    def reset_pool():
+        if (engine := engine_ref()) is not None:
+            engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=reset_pool)
+
+
+def pool_options(
+    db_url: str, pool_size: int, max_overflow: int, pool_timeout: float
+) -> dict:
+    """
+    Queue pool sizing for the URL. In-memory SQLite databases use a single
+    connection pool which takes no sizing.
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+    }
+
+
+def engine_factory(
+    db_url: str,
+    pragmas: dict[str, str | int] | None = None,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    echo: bool = True,
+    metrics: Metrics | None = None,
+    name: str = "sync",
+) -> Engine:
+    """
+    Create the database engine.
+    :param db_url: The database URL.
+    :param pragmas: SQLite pragmas for every connection, defaults to
+        `DEFAULT_SQLITE_PRAGMAS`.
+    :param pool_size: Number of connections kept in the pool.
+    :param max_overflow: Connections allowed above `pool_size`.
+    :param pool_timeout: Seconds to wait for a connection from the pool.
+    :param echo: Log every statement, too slow for production.
+    :param metrics: Record the queries and pool checkouts of the engine.
+    :param name: Label of the engine in the metrics.
+    :return: The database engine.
+    """
+    engine = create_engine(
+        db_url,
+        echo=echo,
+        **pool_options(db_url, pool_size, max_overflow, pool_timeout),
+    )
+    apply_sqlite_pragmas(engine, DEFAULT_SQLITE_PRAGMAS if pragmas is None else pragmas)
+    use_sqlite_transactions(engine)
+    dispose_on_fork(engine)
+    if metrics is not None:
+        instrument_engine(engine, metrics, name)
     return engine
 
 
-def session_factory(engine) -> Callable[..., AbstractContextManager[Session]]:
+def read_engine_factory(
+    db_url: str,
+    read_url: str | None = None,
+    pragmas: dict[str, str | int] | None = None,
+    **options,
+) -> Engine | None:
+    """
+    Create the read-only engine of the database, see `routing.read_only_url`.
+    :param db_url: URL of the primary database.
+    :param read_url: URL of a replica, the primary SQLite file is opened
+        read-only by default.
+    :param options: `engine_factory` options.
+    :return: The engine, None when the reads can not be routed.
+    """
+    url = read_only_url(db_url, read_url)
+    if url is None:
+        return None
+    pragmas = DEFAULT_SQLITE_PRAGMAS if pragmas is None else pragmas
+    return engine_factory(url, read_only_pragmas(pragmas), name="sync_read", **options)
+
+
+def session_factory(
+    engine, read_engine: Engine | None = None
+) -> Callable[..., AbstractContextManager[Session]]:
     """
     Create a session factory for the database.
     :param engine: The database engine.
+    :param read_engine: Engine the sessions read from until they write.
     :return: A session factory.
     """
-    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=engine,
+        class_=RoutingSession,
+        read_bind=read_engine,
+    )
 
     return session
 
 
+def async_url(db_url: str | None, async_db_url: str | None = None) -> str | None:
+    """
+    URL of the async engine: the given one, else the URL of the sync engine
+    with the async driver of its backend, e.g. `sqlite+aiosqlite://` for
+    `sqlite://`.
+    :param db_url: URL of the sync engine.
+    :param async_db_url: URL of the async engine, when set explicitly.
+    :return: None when neither URL is given.
+    """
+    if async_db_url:
+        return async_db_url
+    if not db_url:
+        return None
+    url = make_url(db_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return db_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+
+def async_engine_factory(
+    db_url: str,
+    pragmas: dict[str, str | int] | None = None,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    echo: bool = True,
+    metrics: Metrics | None = None,
+    name: str = "async",
+) -> AsyncEngine:
+    """
+    Create an async engine, e.g. for `sqlite+aiosqlite://` URLs. Takes the
+    same options as `engine_factory`.
+    :param db_url: The database URL.
+    :return: The async database engine.
+    """
+    engine = create_async_engine(
+        db_url,
+        echo=echo,
+        **pool_options(db_url, pool_size, max_overflow, pool_timeout),
+    )
+    apply_sqlite_pragmas(
+        engine.sync_engine, DEFAULT_SQLITE_PRAGMAS if pragmas is None else pragmas
+    )
+    use_sqlite_transactions(engine.sync_engine)
+    dispose_on_fork(engine.sync_engine)
+    if metrics is not None:
+        instrument_engine(engine.sync_engine, metrics, name)
+    return engine
+
+
+def async_read_engine_factory(
+    db_url: str,
+    read_url: str | None = None,
+    pragmas: dict[str, str | int] | None = None,
+    **options,
+) -> AsyncEngine | None:
+    """
+    Async counterpart of `read_engine_factory`.
+    """
+    url = read_only_url(db_url, read_url)
+    if url is None:
+        return None
+    pragmas = DEFAULT_SQLITE_PRAGMAS if pragmas is None else pragmas
+    return async_engine_factory(
+        url, read_only_pragmas(pragmas), name="async_read", **options
+    )
+
+
+def async_session_factory(
+    engine: AsyncEngine, read_engine: AsyncEngine | None = None
+) -> Callable[..., AbstractAsyncContextManager[AsyncSession]]:
+    """
+    Create an async session factory for the database.
+    :param engine: The async database engine.
+    :param read_engine: Engine the sessions read from until they write.
+    :return: An async session factory.
+    """
+    return async_sessionmaker(
+        autoflush=False,
+        expire_on_commit=False,
+        bind=engine,
+        sync_session_class=RoutingSession,
+        read_bind=read_engine.sync_engine if read_engine is not None else None,
+    )
+
+
 def create_database(engine: Engine) -> None:
     """
     Create the database tables. For tests only
@@ -63,6 +314,7 @@ class Base(DeclarativeBase):
 
 class Author(Base):
     __tablename__ = "author"
+    __table_args__ = (Index("ix_author_name", "name"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(200))
@@ -78,6 +330,14 @@ class Author(Base):
 
 class Book(Base):
     __tablename__ = "book"
+    __table_args__ = (
+        Index("ix_book_title", "title"),
+        Index("ix_book_author_id", "author_id"),
+        Index("ix_book_current_lease_id_title", "current_lease_id", "title"),
+        # Incremental exports
+        Index("ix_book_created_at", "created_at"),
+        Index("ix_book_updated_at", "updated_at"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(200))
     author_id: Mapped[int] = mapped_column(
@@ -88,35 +348,57 @@ class Book(Base):
         default=lambda: datetime.datetime.now(datetime.timezone.utc),
         nullable=False,
     )
+    # Set by every update of the book, leases and returns included as they
+    # change its availability
     updated_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=None, nullable=True
+        DateTime,
+        default=None,
+        onupdate=lambda: datetime.datetime.now(datetime.timezone.utc),
+        nullable=True,
+    )
+    # Open lease of the book, maintained together with the lease log so the
+    # availability does not have to be derived from the whole lease history.
+    current_lease_id: Mapped[int | None] = mapped_column(
+        ForeignKey(
+            "book_lease_log.id",
+            ondelete="SET NULL",
+            use_alter=True,
+            name="fk_book_current_lease_id",
+        ),
+        default=None,
+        nullable=True,
+    )
+    # Relationships are never loaded implicitly, repositories opt in to them
+    # with loader options (see `repositories.BOOK_WITH_HISTORY`).
+    lease_logs = relationship(
+        "BookLeaseLog",
+        back_populates="book",
+        foreign_keys="BookLeaseLog.book_id",
+        lazy="raise",
     )
-    lease_logs = relationship("BookLeaseLog", back_populates="book", lazy="immediate")
 
     @hybrid_property
     def available(self):
-        if not self.lease_logs:
-            return True
-        print("Lease logs:", self.lease_logs)
-        latest_log = max(self.lease_logs, key=lambda log: log.created_at)
-        return latest_log.returned_at is not None
+        return self.current_lease_id is None
 
     @available.expression
     def available(cls):
-        subquery = (
-            select(BookLeaseLog.returned_at)
-            .where(BookLeaseLog.book_id == cls.id)
-            .order_by(desc(BookLeaseLog.created_at))
-            .group_by(BookLeaseLog.book_id)
-            .scalar_subquery()
-        ).label("latest_returned_at")  # Give the subquery a label
-        return subquery.isnot(null())
+        return cls.current_lease_id.is_(None)
 
 
 class BookLeaseLog(Base):
     __tablename__ = "book_lease_log"
     __table_args__ = (
         UniqueConstraint("book_id", "returned_at", name="_uq_book_lease_log"),  # type: ignore
+        Index("ix_book_lease_log_book_id_created_at", "book_id", "created_at"),
+        Index(
+            "ix_book_lease_log_open",
+            "book_id",
+            sqlite_where=text("returned_at IS NULL"),
+        ),
+        # Incremental exports and the analytics of a time range
+        Index("ix_book_lease_log_created_at", "created_at"),
+        Index("ix_book_lease_log_returned_at", "returned_at"),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     book_id: Mapped[int] = mapped_column(
@@ -131,7 +413,131 @@ class BookLeaseLog(Base):
     returned_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, default=None, nullable=True
     )
-    book = relationship("Book", back_populates="lease_logs", lazy="immediate")
+    book = relationship(
+        "Book",
+        back_populates="lease_logs",
+        foreign_keys=[book_id],
+        lazy="raise",
+    )
+
+
+class BookLeaseLogArchive(Base):
+    """
+    Returned leases moved out of `book_lease_log` once they are older than the
+    archive horizon (see `BookLendLogRepository.archive`), under their original IDs.
+    """
+
+    __tablename__ = "book_lease_log_archive"
+    __table_args__ = (
+        Index("ix_book_lease_log_archive_book_id_created_at", "book_id", "created_at"),
+        # Incremental exports and the analytics of a time range
+        Index("ix_book_lease_log_archive_created_at", "created_at"),
+        Index("ix_book_lease_log_archive_returned_at", "returned_at"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("book.id", ondelete="RESTRICT", onupdate="CASCADE")
+    )
+    user_id: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    returned_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime,
+        default=lambda: datetime.datetime.now(datetime.timezone.utc),
+        nullable=False,
+    )
+
+
+class AuthorStats(Base):
+    """
+    Number of books of the author, maintained by the repositories in the
+    transaction which creates or deletes the books.
+    """
+
+    __tablename__ = "author_stats"
+    author_id: Mapped[int] = mapped_column(
+        ForeignKey("author.id", ondelete="CASCADE", onupdate="CASCADE"),
+        primary_key=True,
+    )
+    book_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class BookStats(Base):
+    """
+    Number of times the book was leased, maintained by the repositories in the
+    transaction which opens the lease. Archived leases stay counted.
+    """
+
+    __tablename__ = "book_stats"
+    __table_args__ = (Index("ix_book_stats_lease_count", "lease_count", "book_id"),)
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("book.id", ondelete="CASCADE", onupdate="CASCADE"),
+        primary_key=True,
+    )
+    lease_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
 
+class TableVersion(Base):
+    """
+    Version of a table, bumped in the transaction of every write to the table
+    (see `versioning.TableVersions`). The migration adds a row per table.
+    """
+
+    __tablename__ = "table_version"
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+# Full-text index of the books (SQLite FTS5), the rowid is the book ID. It is
+# kept in sync by triggers, the migration creates the same objects.
+BOOK_SEARCH = table(
+    "book_search",
+    column("rowid", Integer),
+    column("title", String),
+    column("author_name", String),
+)
+BOOK_SEARCH_DDL = (
+    """
+    CREATE VIRTUAL TABLE book_search USING fts5(
+        title, author_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER book_search_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_search (rowid, title, author_name)
+        SELECT new.id, new.title, author.name FROM author
+        WHERE author.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER book_search_update AFTER UPDATE OF title, author_id ON book
+    BEGIN
+        DELETE FROM book_search WHERE rowid = old.id;
+        INSERT INTO book_search (rowid, title, author_name)
+        SELECT new.id, new.title, author.name FROM author
+        WHERE author.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER book_search_delete AFTER DELETE ON book BEGIN
+        DELETE FROM book_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER book_search_author_update AFTER UPDATE OF name ON author BEGIN
+        UPDATE book_search SET author_name = new.name
+        WHERE rowid IN (SELECT id FROM book WHERE author_id = new.id);
+    END
+    """,
+)
+for statement in BOOK_SEARCH_DDL:
+    event.listen(
+        Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Base.metadata,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS book_search").execute_if(dialect="sqlite"),
+)
+
 configure_mappers()
@@ -0,0 +1,30 @@
+"""
+Parsing of the HTTP headers listing values with their quality, e.g. Accept
+(`application/msgpack, application/json;q=0.5`) and Accept-Encoding
+(`zstd, gzip;q=0.8, br;q=0`).
+"""
+
+
+def quality_values(header: str) -> dict[str, float]:
+    """
+    Quality of each value of the header, lower-cased. A value without `q` has
+    quality 1, one with an invalid `q` quality 0, a value listed several times
+    keeps the highest.
+    :param header: The header value, a comma separated list.
+    :return: Qualities by value.
+    """
+    qualities: dict[str, float] = {}
+    for item in header.lower().split(","):
+        value, *params = (part.strip() for part in item.split(";"))
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        qualities[value] = max(qualities.get(value, 0.0), q)
+    return qualities
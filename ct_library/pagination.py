@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Generic, Sequence, TypeVar
+
+from sqlalchemy import Select, tuple_
+
+from ct_library.exceptions import InvalidCursor
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+@dataclass
+class Page(Generic[T]):
+    """
+    One page of a keyset paginated listing.
+    """
+
+    items: Sequence[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor.
+    :param values: Values of the sort key columns.
+    :return: URL safe cursor string.
+    """
+    payload = json.dumps(
+        [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None, *types: type) -> tuple | None:
+    """
+    Decode a cursor created by `encode_cursor`.
+    :param cursor: The cursor received from the client, None for the first page.
+    :param types: Expected types of the sort key columns.
+    :return: Tuple with the sort key values, None for the first page.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Unexpected cursor shape")
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for value, type_ in zip(values, types)
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor(f"Invalid cursor {cursor!r}") from exc
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """
+    Sort key of a listing, the cursors of its pages hold the values of these
+    columns of the last row, e.g. `SortKey(("title", "id"), (str, int))`.
+    """
+
+    names: tuple[str, ...]
+    types: tuple[type, ...]
+
+    def after(self, cursor: str | None) -> tuple | None:
+        """
+        :return: The sort key the page starts after, None for the first page.
+        """
+        return decode_cursor(cursor, *self.types)
+
+    def page(self, rows: Sequence[T], limit: int) -> Page[T]:
+        """
+        Build a page from rows fetched by a `keyset` query, see `paginate`.
+        """
+        return paginate(rows, limit, key=attrgetter(*self.names))
+
+
+def keyset(
+    query: Select, columns: Sequence[Any], after: tuple | None, limit: int
+) -> Select:
+    """
+    Apply keyset pagination to the query. One extra row is fetched so `paginate`
+    can tell whether another page exists.
+    :param query: The query to paginate.
+    :param columns: Columns forming a unique, stable sort key.
+    :param after: Sort key of the last row of the previous page.
+    :param limit: Page size.
+    :return: The paginated query.
+    """
+    if after is not None:
+        query = query.where(tuple_(*columns) > tuple_(*after))
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def paginate(rows: Sequence[T], limit: int, key: Callable[[T], tuple]) -> Page[T]:
+    """
+    Build a page from rows fetched by a `keyset` query.
+    :param rows: Rows returned by the database (at most `limit + 1`).
+    :param limit: Page size.
+    :param key: Returns the sort key of a row.
+    :return: The page with the cursor of the next page, if there is one.
+    """
+    if len(rows) <= limit:
+        return Page(items=rows)
+    items = rows[:limit]
+    return Page(items=items, next_cursor=encode_cursor(*key(items[-1])))
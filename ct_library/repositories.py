@@ -1,129 +1,718 @@
+import re
+from collections import Counter
 from contextlib import AbstractContextManager
-from typing import Callable, Sequence
+from datetime import datetime
+from typing import Callable, Collection, Iterable, Iterator, Sequence
 
-from sqlalchemy import func
-from sqlalchemy.orm import aliased
-from sqlalchemy.sql import delete, select
+from sqlalchemy import (
+    ColumnElement,
+    CompoundSelect,
+    Row,
+    Select,
+    func,
+    literal_column,
+    union,
+    union_all,
+)
+from sqlalchemy.dialects.sqlite import Insert as SQLiteInsert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import delete, insert, select, update
 from sqlmodel import Session
 
-from ct_library.models import Author, Book, BookLeaseLog
+from ct_library.cache import (
+    Cache,
+    NullCache,
+    cached,
+    entity_key,
+    invalidate,
+    remember,
+)
+from ct_library.models import (
+    BOOK_SEARCH,
+    Author,
+    AuthorStats,
+    Base,
+    Book,
+    BookLeaseLog,
+    BookLeaseLogArchive,
+    BookStats,
+)
+from ct_library.pagination import DEFAULT_PAGE_LIMIT, keyset
+
+# Load plans, relationships are declared with lazy="raise" so every use case
+# has to state what it needs up front.
+BOOK_WITH_HISTORY = (selectinload(Book.lease_logs),)
+
+# Rows fetched from the database cursor at once by the exports, an export
+# holds one such chunk in memory regardless of the size of the table.
+EXPORT_CHUNK_SIZE = 1000
+
+# Lease rows folded into the analytics at once, the analytics hold one such
+# chunk in memory regardless of the size of the lease history.
+ANALYTICS_CHUNK_SIZE = 50_000
+
+# Lease logs examined by one archival transaction, the write lock is held only
+# while one such batch is moved.
+ARCHIVE_BATCH_SIZE = 500
+
+# Columns of the list endpoints, their rows are serialized straight from the
+# projection without building ORM entities.
+AUTHOR_LIST_COLUMNS = (Author.id, Author.name, Author.created_at, Author.updated_at)
+BOOK_LIST_COLUMNS = (
+    Book.id,
+    Book.title,
+    Book.author_id,
+    Book.created_at,
+    Book.updated_at,
+    Book.available.label("available"),
+)
+LEASE_LIST_COLUMNS = (
+    BookLeaseLog.id,
+    BookLeaseLog.book_id,
+    BookLeaseLog.created_at,
+    BookLeaseLog.returned_at,
+)
+ARCHIVED_LEASE_LIST_COLUMNS = (
+    BookLeaseLogArchive.id,
+    BookLeaseLogArchive.book_id,
+    BookLeaseLogArchive.created_at,
+    BookLeaseLogArchive.returned_at,
+)
+
+
+def projection(
+    columns: Sequence, fields: Collection[str] | None, *required: str
+) -> tuple:
+    """
+    The columns of a list projection which the requested fields need, e.g.
+    `projection(BOOK_LIST_COLUMNS, {"id", "title"}, "id")`, in their order.
+    :param fields: Names of the fields, None for all the columns.
+    :param required: Columns selected anyway, the sort key of the pagination.
+    """
+    if fields is None:
+        return tuple(columns)
+    selected = {*fields, *required}
+    return tuple(column for column in columns if column.key in selected)
+
+
+# Relevance of a full-text match, lower is better. A match in the title weighs
+# ten times more than one in the author's name.
+SEARCH_RANK = func.bm25(literal_column("book_search"), 10.0, 1.0)
+
+
+def match_expression(query: str) -> str | None:
+    """
+    FTS5 query matching every word of the search as a prefix, e.g. `harry pot`
+    becomes `"harry"* "pot"*`. FTS5 operators and quotes in the search are not
+    interpreted.
+    :return: None when the search has no words.
+    """
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def book_search_query(
+    match: str,
+    available: bool | None,
+    after: tuple | None,
+    limit: int,
+    fields: Collection[str] | None = None,
+) -> Select:
+    """
+    Page of the books matching the FTS5 query, best match first.
+    """
+    columns = projection(BOOK_LIST_COLUMNS, fields, "id")
+    query = (
+        select(*columns, SEARCH_RANK.label("rank"))
+        .join_from(BOOK_SEARCH, Book, Book.id == BOOK_SEARCH.c.rowid)
+        .where(literal_column("book_search").match(match))
+    )
+    if available is not None:
+        query = query.where(Book.available if available else ~Book.available)
+    return keyset(query, (SEARCH_RANK, Book.id), after, limit)
+
+
+def lease_history_query(
+    book_id: int,
+    full_history: bool,
+    after: tuple | None,
+    limit: int,
+    fields: Collection[str] | None = None,
+) -> Select:
+    """
+    Page of the lease history of a book, oldest first. The archived leases are
+    only read with `full_history`, the hot table alone is read otherwise.
+    """
+    sort_key = ("created_at", "id")
+    query = select(*projection(LEASE_LIST_COLUMNS, fields, *sort_key)).where(
+        BookLeaseLog.book_id == book_id
+    )
+    if not full_history:
+        return keyset(query, (BookLeaseLog.created_at, BookLeaseLog.id), after, limit)
+    archived = select(
+        *projection(ARCHIVED_LEASE_LIST_COLUMNS, fields, *sort_key)
+    ).where(BookLeaseLogArchive.book_id == book_id)
+    leases = union_all(archived, query).subquery("leases")
+    return keyset(select(leases), (leases.c.created_at, leases.c.id), after, limit)
+
+
+def sql_epoch_seconds(timestamp) -> ColumnElement[float]:
+    """
+    Epoch seconds of a stored timestamp computed by SQLite, cheaper to fetch
+    than a datetime built per row.
+    """
+    return (func.julianday(timestamp) - 2440587.5) * 86400.0
+
+
+def lease_times_query(
+    since: datetime | None, until: datetime | None, author_id: int | None
+) -> CompoundSelect:
+    """
+    Creation and return times of the leases created in the range, archived
+    leases included, as `(created, returned)` epoch seconds.
+    """
+    queries = []
+    for model in (BookLeaseLog, BookLeaseLogArchive):
+        query = select(
+            sql_epoch_seconds(model.created_at), sql_epoch_seconds(model.returned_at)
+        )
+        if since is not None:
+            query = query.where(model.created_at >= since)
+        if until is not None:
+            query = query.where(model.created_at < until)
+        if author_id is not None:
+            query = query.where(
+                model.book_id.in_(select(Book.id).where(Book.author_id == author_id))
+            )
+        queries.append(query)
+    return union_all(*queries)
+
+
+def changed_since(id_column, since: datetime, *columns) -> ColumnElement[bool]:
+    """
+    Rows with any of the time columns at or after `since`. Selected through an
+    IN of a UNION with one index search per column, SQLite reads the IDs in
+    order; an OR of the columns would scan the table to keep the ID order.
+    """
+    return id_column.in_(
+        union(*(select(id_column).where(column >= since) for column in columns))
+    )
+
+
+def book_export_query(since: datetime | None) -> Select:
+    """
+    Books created or updated since the given time, all by default, by ID.
+    """
+    query = select(*BOOK_LIST_COLUMNS).order_by(Book.id)
+    if since is not None:
+        query = query.where(
+            changed_since(Book.id, since, Book.created_at, Book.updated_at)
+        )
+    return query
+
+
+def lease_export_query(since: datetime | None) -> CompoundSelect:
+    """
+    Lease logs created or returned since the given time, all by default,
+    archived leases included, by ID.
+    """
+    queries = []
+    for columns in (LEASE_LIST_COLUMNS, ARCHIVED_LEASE_LIST_COLUMNS):
+        id_column, _, created_at, returned_at = columns
+        query = select(*columns)
+        if since is not None:
+            query = query.where(
+                changed_since(id_column, since, created_at, returned_at)
+            )
+        queries.append(query)
+    return union_all(*queries).order_by("id")
+
+
+def add_to_counter(model: type[Base], key: str, counter: str) -> SQLiteInsert:
+    """
+    Upsert adding the given value to the counter of the row, the row is created
+    when it does not exist yet. Execute it with one parameter set per row.
+    """
+    statement = sqlite_insert(model)
+    return statement.on_conflict_do_update(
+        index_elements=[key],
+        set_={counter: getattr(model, counter) + getattr(statement.excluded, counter)},
+    )
+
+
+ADD_AUTHOR_BOOKS = add_to_counter(AuthorStats, "author_id", "book_count")
+ADD_BOOK_LEASES = add_to_counter(BookStats, "book_id", "lease_count")
+
+
+def author_book_counts(author_ids: Iterable[int], sign: int = 1) -> list[dict]:
+    """
+    `ADD_AUTHOR_BOOKS` parameters counting one book per author ID, or
+    discounting it with a negative sign.
+    """
+    return [
+        {"author_id": author_id, "book_count": sign * count}
+        for author_id, count in Counter(author_ids).items()
+    ]
+
+
+def book_lease_counts(book_leases: Iterable[BookLeaseLog]) -> list[dict]:
+    """
+    `ADD_BOOK_LEASES` parameters counting the leases opened by the lease logs,
+    the returns are not counted.
+    """
+    opened = Counter(log.book_id for log in book_leases if log.returned_at is None)
+    return [
+        {"book_id": book_id, "lease_count": count} for book_id, count in opened.items()
+    ]
+
+
+# Number of books of every author, authors without books have no stats row
+AUTHOR_STATS = select(
+    Author.id.label("author_id"),
+    Author.name,
+    func.coalesce(AuthorStats.book_count, 0).label("book_count"),
+).outerjoin(AuthorStats, AuthorStats.author_id == Author.id)
+
+# Books by the number of their leases, their index is read backwards
+TOP_BOOKS = (
+    select(BookStats.book_id, Book.title, BookStats.lease_count)
+    .join(Book, Book.id == BookStats.book_id)
+    .order_by(BookStats.lease_count.desc(), BookStats.book_id.desc())
+)
+
+
+# Book with its open lease, the lease columns are NULL when the book is available
+CURRENT_LEASE = select(Book, BookLeaseLog).outerjoin(
+    BookLeaseLog, BookLeaseLog.id == Book.current_lease_id
+)
+
+
+def author_list_query(
+    after: tuple | None, limit: int, fields: Collection[str] | None = None
+) -> Select:
+    """
+    Page of the authors ordered by name.
+    """
+    columns = projection(AUTHOR_LIST_COLUMNS, fields, "name", "id")
+    return keyset(select(*columns), (Author.name, Author.id), after, limit)
+
+
+def book_list_query(
+    available: bool | None,
+    after: tuple | None,
+    limit: int,
+    fields: Collection[str] | None = None,
+) -> Select:
+    """
+    Page of the books ordered by title, only the available or the leased ones
+    when `available` is given.
+    """
+    query = select(*projection(BOOK_LIST_COLUMNS, fields, "title", "id"))
+    if available is not None:
+        query = query.where(Book.available if available else ~Book.available)
+    return keyset(query, (Book.title, Book.id), after, limit)
+
+
+def books_query(*criteria: ColumnElement[bool], with_history: bool = False) -> Select:
+    """
+    Book entities matching the criteria, with their lease logs when
+    `with_history` is set.
+    """
+    query = select(Book).where(*criteria)
+    if with_history:
+        query = query.options(*BOOK_WITH_HISTORY)
+    return query
+
+
+def existing_authors_query(author_ids: Iterable[int]) -> Select:
+    """
+    IDs of the given authors which exist.
+    """
+    return select(Author.id).where(Author.id.in_(set(author_ids)))
+
+
+def author_stats_query(after: tuple | None, limit: int) -> Select:
+    """
+    Page of the book counts of the authors, ordered by author name.
+    """
+    return keyset(AUTHOR_STATS, (Author.name, Author.id), after, limit)
+
+
+def current_leases(book_lease_logs: Iterable[BookLeaseLog]) -> list[dict]:
+    """
+    `update(Book)` parameters pointing the current lease of every book at its
+    lease log while the lease is open, and clearing it once it is returned.
+    """
+    return [
+        {
+            "id": log.book_id,
+            "current_lease_id": None if log.returned_at is not None else log.id,
+        }
+        for log in book_lease_logs
+    ]
 
 
 class BaseRepository:
     def __init__(
-        self, session_factory: Callable[..., AbstractContextManager[Session]]
+        self,
+        session_factory: Callable[..., AbstractContextManager[Session]],
+        cache: Cache | None = None,
     ) -> None:
         self.session_factory = session_factory
+        self.cache = cache or NullCache()
 
 
 class AuthorRepository(BaseRepository):
-    def get_all(self) -> Sequence[Author]:
+    def get_all(
+        self,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        :param fields: Columns to select, all by default.
+        """
         with self.session_factory() as session:
-            return session.execute(select(Author).order_by(Author.name)).scalars().all()
+            return session.execute(author_list_query(after, limit, fields)).all()
 
-    def get_by_id(self, author_id) -> Author:
+    def get_by_id(
+        self, author_id, fields: Collection[str] | None = None
+    ) -> Author | Row:
+        """
+        The cached author or the author loaded and cached, only the columns of
+        the fields are selected when given and nothing is cached then.
+        """
+        if (author := cached(self.cache, Author, author_id)) is not None:
+            return author
         with self.session_factory() as session:
-            return session.query(Author).where(Author.id == author_id).one()
+            if fields is not None:
+                query = select(*projection(AUTHOR_LIST_COLUMNS, fields))
+                return session.execute(query.where(Author.id == author_id)).one()
+            query = select(Author).where(Author.id == author_id)
+            author = session.scalars(query).one()
+            remember(self.cache, author)
+            return author
 
     def create(self, author: Author) -> Author:
         with self.session_factory() as session:
             session.add(author)
-            session.commit()
-            session.refresh(author)
+            session.flush()
+            invalidate(self.cache, session, entity_key(Author, author.id))
             return author
 
     def delete_by_id(self, author_id) -> None:
         with self.session_factory() as session:
             session.execute(delete(Author).where(Author.id == author_id))
-            session.commit()
+            invalidate(self.cache, session, entity_key(Author, author_id))
+
+    def get_existing_ids(self, author_ids: Iterable[int]) -> set[int]:
+        """
+        IDs of the given authors which exist, in one query.
+        """
+        with self.session_factory() as session:
+            return set(session.scalars(existing_authors_query(author_ids)))
+
+    def bulk_create(self, authors: Sequence[dict]) -> None:
+        """
+        Insert the authors with one executemany.
+        """
+        with self.session_factory() as session:
+            session.execute(insert(Author), authors)
 
 
 class BookRepository(BaseRepository):
-    def get_all(self) -> Sequence[Book]:
+    def get_all(
+        self,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        :param fields: Columns to select, all by default.
+        """
+        with self.session_factory() as session:
+            query = book_list_query(None, after, limit, fields)
+            return session.execute(query).all()
+
+    def get_by_id(
+        self,
+        book_id,
+        with_history: bool = False,
+        fields: Collection[str] | None = None,
+    ) -> Book | Row:
+        """
+        The cached book or the book loaded and cached, only the columns of the
+        fields are selected when given and nothing is cached then.
+        """
+        if not with_history and (book := cached(self.cache, Book, book_id)) is not None:
+            return book
+        with self.session_factory() as session:
+            if fields is not None and not with_history:
+                query = select(*projection(BOOK_LIST_COLUMNS, fields))
+                return session.execute(query.where(Book.id == book_id)).one()
+            query = books_query(Book.id == book_id, with_history=with_history)
+            book = session.scalars(query).one()
+            remember(self.cache, book)
+            return book
+
+    def get_with_current_lease(self, book_id) -> tuple[Book, BookLeaseLog | None]:
+        """
+        Get the book together with its open lease, if any, in one query.
+        """
         with self.session_factory() as session:
             return (
-                session.query(Book)
-                .join(BookLeaseLog, isouter=True)
-                .order_by(Book.title, BookLeaseLog.created_at.desc())
-                .all()
+                session.execute(CURRENT_LEASE.where(Book.id == book_id)).tuples().one()
             )
 
-    def get_by_id(self, book_id) -> Book:
+    def get_with_current_leases(
+        self, book_ids: Iterable[int]
+    ) -> Sequence[tuple[Book, BookLeaseLog | None]]:
+        """
+        Get the books together with their open leases in one query, missing
+        books are left out.
+        """
         with self.session_factory() as session:
-            return session.query(Book).where(Book.id == book_id).one()
+            return (
+                session.execute(CURRENT_LEASE.where(Book.id.in_(book_ids)))
+                .tuples()
+                .all()
+            )
 
     def create(self, book: Book) -> Book:
+        """
+        Insert the book and count it to its author, in one transaction.
+        """
         with self.session_factory() as session:
             session.add(book)
-            session.commit()
-            session.refresh(book)
+            session.flush()
+            session.execute(ADD_AUTHOR_BOOKS, author_book_counts([book.author_id]))
+            invalidate(self.cache, session, entity_key(Book, book.id))
             return book
 
     def update_book(self, book_id, book_data):
         pass
 
     def delete_by_id(self, book_id) -> None:
+        """
+        Delete the book and discount it from its author, in one transaction.
+        """
         with self.session_factory() as session:
-            session.execute(delete(Book).where(Book.id == book_id))
-            session.commit()
+            author_id = session.scalar(
+                delete(Book).where(Book.id == book_id).returning(Book.author_id)
+            )
+            if author_id is not None:
+                session.execute(ADD_AUTHOR_BOOKS, author_book_counts([author_id], -1))
+            invalidate(self.cache, session, entity_key(Book, book_id))
 
-    def get_by_author_id(self, author_id) -> Sequence[Book]:
+    def bulk_create(self, books: Sequence[dict]) -> None:
+        """
+        Insert the books with one executemany, their authors are counted with
+        another one.
+        """
         with self.session_factory() as session:
-            return session.query(Book).where(Book.author_id == author_id).all()
+            session.execute(insert(Book), books)
+            session.execute(
+                ADD_AUTHOR_BOOKS,
+                author_book_counts(book["author_id"] for book in books),
+            )
 
-    def filter_by_availability(self, available: bool) -> Sequence[Book]:
+    def stream_all(
+        self, since: datetime | None = None, chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Iterator[Sequence[Row]]:
+        """
+        Stream all books created or updated since the given time, ordered by
+        ID, in chunks fetched from the database cursor.
+        """
         with self.session_factory() as session:
-            LatestLog = aliased(BookLeaseLog)
+            query = book_export_query(since)
+            result = session.execute(query.execution_options(yield_per=chunk_size))
+            yield from result.partitions()
 
-            query = (
-                select(Book)
-                .outerjoin(
-                    LatestLog,
-                    (Book.id == LatestLog.book_id)
-                    & (
-                        LatestLog.created_at
-                        == (
-                            select(func.max(BookLeaseLog.created_at))
-                            .where(BookLeaseLog.book_id == Book.id)
-                            .scalar_subquery()
-                        )
-                    ),
-                )
-                .where(
-                    (LatestLog.id.is_(None)) | (LatestLog.returned_at.isnot(None))
-                    if available
-                    else LatestLog.returned_at.is_(None) & (LatestLog.id.isnot(None))
-                )
-            )
+    def get_by_author_id(self, author_id, with_history: bool = False) -> Sequence[Book]:
+        with self.session_factory() as session:
+            query = books_query(Book.author_id == author_id, with_history=with_history)
             return session.scalars(query).all()
 
+    def filter_by_availability(
+        self,
+        available: bool,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        with self.session_factory() as session:
+            query = book_list_query(available, after, limit, fields)
+            return session.execute(query).all()
+
+    def search(
+        self,
+        match: str,
+        available: bool | None = None,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        Books matching the full-text query (see `match_expression`), best
+        match first, optionally only the available or the leased ones.
+        """
+        with self.session_factory() as session:
+            query = book_search_query(match, available, after, limit, fields)
+            return session.execute(query).all()
+
 
 class BookLendLogRepository(BaseRepository):
     def get_last_lease_log(self, book_id) -> BookLeaseLog:
         with self.session_factory() as session:
             return (
                 session.query(BookLeaseLog)
-                .where(Book.id == book_id)
+                .where(BookLeaseLog.book_id == book_id)
                 .order_by(BookLeaseLog.created_at.desc())
                 .limit(1)
                 .one()
             )
 
-    def get_by_id(self, book_id) -> BookLeaseLog:
+    def get_by_id(self, lease_id) -> BookLeaseLog:
         with self.session_factory() as session:
-            return session.query(BookLeaseLog).where(Book.id == book_id).one()
+            return session.query(BookLeaseLog).where(BookLeaseLog.id == lease_id).one()
 
     def get_by_author_id(self, author_id) -> Sequence[BookLeaseLog]:
         with self.session_factory() as session:
-            return session.query(BookLeaseLog).where(Book.author_id == author_id).all()
+            return (
+                session.query(BookLeaseLog)
+                .join(Book, BookLeaseLog.book_id == Book.id)
+                .where(Book.author_id == author_id)
+                .all()
+            )
+
+    def save(self, book_lease_log: BookLeaseLog) -> BookLeaseLog:
+        """
+        Save the lease log and point the book's current lease at it while it
+        is open, both in one transaction which also counts an opened lease to
+        the book's stats. The cached book is invalidated as its availability
+        changes.
+        """
+        self.save_all([book_lease_log])
+        return book_lease_log
+
+    def save_all(self, book_lease_logs: Sequence[BookLeaseLog]) -> None:
+        """
+        `save` for many lease logs at once: the logs are flushed together and
+        the current leases of their books are updated with one executemany.
+        """
+        with self.session_factory() as session:
+            session.add_all(book_lease_logs)
+            session.flush()
+            session.execute(update(Book), current_leases(book_lease_logs))
+            if lease_counts := book_lease_counts(book_lease_logs):
+                session.execute(ADD_BOOK_LEASES, lease_counts)
+            for log in book_lease_logs:
+                invalidate(self.cache, session, entity_key(Book, log.book_id))
 
-    def save(self, book: BookLeaseLog) -> BookLeaseLog:
+    def get_by_book_id(
+        self,
+        book_id,
+        after: tuple | None = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        full_history: bool = False,
+        fields: Collection[str] | None = None,
+    ) -> Sequence[Row]:
+        """
+        Page of the lease history of the book, with the archived leases when
+        `full_history` is set.
+        :param fields: Columns to select, all by default.
+        """
         with self.session_factory() as session:
-            session.add(book)
-            session.commit()
-            session.refresh(book)
-            return book
+            query = lease_history_query(book_id, full_history, after, limit, fields)
+            return session.execute(query).all()
+
+    def stream_lease_times(
+        self,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        author_id: int | None = None,
+        chunk_size: int = ANALYTICS_CHUNK_SIZE,
+    ) -> Iterator[Sequence[Row]]:
+        """
+        Stream the `(created, returned)` epoch seconds of the leases, see
+        `lease_times_query`, in chunks fetched from the database cursor.
+        """
+        with self.session_factory() as session:
+            query = lease_times_query(since, until, author_id)
+            result = session.execute(query.execution_options(yield_per=chunk_size))
+            yield from result.partitions()
+
+    def archive(
+        self,
+        before: datetime,
+        after_id: int = 0,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+    ) -> tuple[int, int | None]:
+        """
+        Move the leases returned before the given time among the next
+        `batch_size` lease logs by ID into the archive, in one transaction.
+        Open leases stay whatever their age, they are never referenced from
+        the archive.
+        :param after_id: ID of the last lease log of the previous batch.
+        :return: The number of archived leases and the ID the next batch
+            starts after, None once the end of the table is reached.
+        """
+        with self.session_factory() as session:
+            batch = session.scalars(
+                select(BookLeaseLog.id)
+                .where(BookLeaseLog.id > after_id)
+                .order_by(BookLeaseLog.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                return 0, None
+            archived = (
+                BookLeaseLog.id.between(batch[0], batch[-1]),
+                BookLeaseLog.returned_at < before,
+            )
+            session.execute(
+                insert(BookLeaseLogArchive).from_select(
+                    ["id", "book_id", "user_id", "created_at", "returned_at"],
+                    select(
+                        BookLeaseLog.id,
+                        BookLeaseLog.book_id,
+                        BookLeaseLog.user_id,
+                        BookLeaseLog.created_at,
+                        BookLeaseLog.returned_at,
+                    ).where(*archived),
+                )
+            )
+            moved = session.execute(delete(BookLeaseLog).where(*archived)).rowcount
+            return moved, batch[-1] if len(batch) == batch_size else None
+
+    def stream_all(
+        self, since: datetime | None = None, chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Iterator[Sequence[Row]]:
+        """
+        Stream all lease logs created or returned since the given time,
+        archived leases included, ordered by ID, in chunks fetched from the
+        database cursor.
+        """
+        with self.session_factory() as session:
+            query = lease_export_query(since)
+            result = session.execute(query.execution_options(yield_per=chunk_size))
+            yield from result.partitions()
+
+
+class StatsRepository(BaseRepository):
+    def get_author_stats(
+        self, after: tuple | None = None, limit: int = DEFAULT_PAGE_LIMIT
+    ) -> Sequence[Row]:
+        """
+        Page of the book counts of the authors, ordered by author name.
+        """
+        with self.session_factory() as session:
+            return session.execute(author_stats_query(after, limit)).all()
 
-    def get_by_book_id(self, book_id) -> Sequence[BookLeaseLog]:
+    def get_top_books(self, limit: int) -> Sequence[Row]:
+        """
+        The most leased books, most leases first.
+        """
         with self.session_factory() as session:
-            return session.query(BookLeaseLog).where(Book.id == book_id).all()
+            return session.execute(TOP_BOOKS.limit(limit)).all()
@@ -0,0 +1,67 @@
+"""
+Routing of the statements of a session between the primary engine and a
+read-only one.
+
+Reads go to the read engine, e.g. the SQLite file opened a second time with
+`mode=ro` or a replica. Everything else goes to the primary: flushes and DML
+statements, and every statement of a session which has written already, so a
+unit of work reads its own writes. A session marked with `USE_PRIMARY` (the
+writing units of work) never uses the read engine, its reads must see the
+state it locked.
+"""
+
+from sqlalchemy import Engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+# Session info key pinning the session to the primary engine
+USE_PRIMARY = "use_primary"
+
+# Pragmas which need write access, a read-only connection can not run them
+WRITE_PRAGMAS = frozenset({"journal_mode"})
+
+
+class RoutingSession(Session):
+    """
+    Session reading from `read_bind` until it writes.
+    :param read_bind: The read-only engine, every statement goes to the
+        primary (`bind`) when it is None.
+    """
+
+    def __init__(self, *args, read_bind: Engine | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_bind = read_bind
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.read_bind is None or self.info.get(USE_PRIMARY):
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self._flushing or (clause is not None and clause.is_dml):
+            self.info[USE_PRIMARY] = True
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return self.read_bind
+
+
+def read_only_url(db_url: str, read_url: str | None = None) -> str | None:
+    """
+    URL of the read engine: the replica when given, the database file opened
+    read-only for SQLite.
+    :return: None when the reads can not be routed, e.g. for in-memory SQLite
+        or another database without a replica.
+    """
+    if read_url:
+        return read_url
+    url = make_url(db_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    if url.database.startswith("file:"):
+        return None
+    return url.set(
+        database=f"file:{url.database}", query={"mode": "ro", "uri": "true"}
+    ).render_as_string(hide_password=False)
+
+
+def read_only_pragmas(pragmas: dict[str, str | int]) -> dict[str, str | int]:
+    """
+    The pragmas a read-only connection can run, the primary sets the others.
+    """
+    return {name: value for name, value in pragmas.items() if name not in WRITE_PRAGMAS}
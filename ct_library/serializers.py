@@ -1,8 +1,40 @@
 import enum
-from datetime import datetime
+import functools
+from datetime import date, datetime, timezone
+from typing import Annotated, Any, ClassVar, Sequence
 
-from pydantic import BaseModel, Field
-from pydantic.fields import computed_field
+import msgpack
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import AfterValidator, BaseModel, Field, TypeAdapter
+from pydantic.fields import FieldInfo, computed_field
+from pydantic_core import to_json
+from sqlalchemy import Row
+
+from ct_library.exceptions import InvalidFields
+from ct_library.negotiation import quality_values
+from ct_library.pagination import (
+    DEFAULT_PAGE_LIMIT,
+    MAX_PAGE_LIMIT,
+    NEXT_CURSOR_HEADER,
+    Page,
+)
+
+
+def naive_utc(value: datetime | None) -> datetime | None:
+    """
+    Timestamps are stored as naive UTC, convert an aware value to compare it
+    with them.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Timestamps in and out of the API are naive UTC, like the stored ones. Aware
+# values (the defaults of rows just created, times sent with an offset) are
+# converted, so a response never mixes the two formats.
+UTCDateTime = Annotated[datetime, AfterValidator(naive_utc)]
 
 
 class AuthorInSerializer(BaseModel):
@@ -16,8 +48,8 @@ class AuthorOutSerializer(AuthorInSerializer):
     name: str
     #    model_config = ConfigDict(from_attributes=True)
     id: int
-    created_at: datetime = Field()
-    updated_at: datetime | None = Field()
+    created_at: UTCDateTime = Field()
+    updated_at: UTCDateTime | None = Field()
 
 
 class BookInSerializer(BaseModel):
@@ -27,17 +59,21 @@ class BookInSerializer(BaseModel):
         from_attributes = True
 
 
+class BookBulkInSerializer(BookInSerializer):
+    author_id: int
+
+
 class BookOutSerializer(BookInSerializer):
     id: int = Field(init=False, frozen=True)
     available: bool
     author_id: int = Field()
-    created_at: datetime = Field()
+    created_at: UTCDateTime = Field()
 
-    updated_at: datetime | None = Field()
+    updated_at: UTCDateTime | None = Field()
 
 
 class BookLeaseLogInSerializer(BaseModel):
-    returned_at: datetime | None = Field(default=None)
+    returned_at: UTCDateTime | None = Field(default=None)
 
     class Config:
         from_attributes = True
@@ -49,10 +85,15 @@ class LeaseStatus(enum.Enum):
 
 
 class BookLeaseLogOutSerializer(BookLeaseLogInSerializer):
+    # Fields read by the computed fields, see `sparse_serializer`
+    computed_field_requires: ClassVar[dict[str, tuple[str, ...]]] = {
+        "status": ("returned_at",)
+    }
+
     id: int = Field()
     book_id: int = Field()
-    created_at: datetime = Field()
-    returned_at: datetime | None = Field(default=None)
+    created_at: UTCDateTime = Field()
+    returned_at: UTCDateTime | None = Field(default=None)
 
     @computed_field(return_type=enum.Enum)
     @property
@@ -62,6 +103,64 @@ class BookLeaseLogOutSerializer(BookLeaseLogInSerializer):
         return LeaseStatus.leased
 
 
+class AuthorStatsOutSerializer(BaseModel):
+    author_id: int
+    name: str
+    book_count: int
+
+
+class BookStatsOutSerializer(BaseModel):
+    book_id: int
+    title: str
+    lease_count: int
+
+
+class DurationSummary(BaseModel):
+    # Seconds, the percentiles are exact to about 1 %
+    count: int
+    mean: float | None
+    max: float | None
+    p50: float | None
+    p90: float | None
+    p99: float | None
+
+
+class DailyLeaseVolume(BaseModel):
+    day: date
+    leases: int
+
+
+class LeaseAnalyticsOutSerializer(BaseModel):
+    leases: int
+    returned: int
+    open: int
+    duration: DurationSummary
+    open_age: DurationSummary
+    daily: list[DailyLeaseVolume]
+
+
+# Books leased or returned by one batch request at most
+MAX_BATCH_LEASE_SIZE = 100
+
+
+class LeaseAction(enum.Enum):
+    lease = "lease"
+    return_ = "return"
+
+
+class BookBatchLeaseInSerializer(BaseModel):
+    book_ids: list[int] = Field(min_length=1, max_length=MAX_BATCH_LEASE_SIZE)
+    action: LeaseAction
+    returned_at: UTCDateTime | None = Field(default=None)
+
+
+class BookLeaseResult(BaseModel):
+    book_id: int
+    status_code: int
+    lease: BookLeaseLogOutSerializer | None = Field(default=None)
+    detail: str | None = Field(default=None)
+
+
 class BookLendSerializer(BaseModel):
     type: str
 
@@ -69,5 +168,280 @@ class BookLendSerializer(BaseModel):
         from_attributes = True
 
 
-class BookFilterParams(BaseModel):
+class PaginationParams(BaseModel):
+    limit: int = Field(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT)
+    cursor: str | None = Field(default=None)
+
+
+class FieldsParams(BaseModel):
+    # Comma separated fields of the response, e.g. `id,title`, all by default
+    fields: str | None = Field(default=None, max_length=500)
+
+
+class AuthorListParams(PaginationParams, FieldsParams):
+    pass
+
+
+class BookFilterParams(PaginationParams, FieldsParams):
     available: bool | None = Field(default=None)
+
+
+class BookSearchParams(BookFilterParams):
+    q: str = Field(min_length=1, max_length=200)
+
+
+class TopBooksParams(BaseModel):
+    limit: int = Field(default=10, ge=1, le=MAX_PAGE_LIMIT)
+
+
+class LeaseAnalyticsParams(BaseModel):
+    # Range of the lease creation times, `until` is exclusive
+    since: UTCDateTime | None = Field(default=None)
+    until: UTCDateTime | None = Field(default=None)
+    author_id: int | None = Field(default=None)
+
+
+class LeaseHistoryParams(PaginationParams, FieldsParams):
+    # Read the archived leases too, only the hot table is read by default
+    full_history: bool = Field(default=False)
+
+
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_BATCH_SIZE = 10_000
+# Errors listed in a bulk import result, the rest is only counted
+MAX_REPORTED_IMPORT_ERRORS = 1000
+
+
+class ExportFormat(enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class ExportParams(BaseModel):
+    format: ExportFormat = Field(default=ExportFormat.ndjson)
+    since: UTCDateTime | None = Field(default=None)
+
+
+class BulkImportParams(BaseModel):
+    batch_size: int = Field(
+        default=DEFAULT_IMPORT_BATCH_SIZE, ge=1, le=MAX_IMPORT_BATCH_SIZE
+    )
+
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    created: int = Field(default=0)
+    failed: int = Field(default=0)
+    errors: list[BulkImportError] = Field(default_factory=list)
+
+
+class JSONBytesResponse(JSONResponse):
+    """
+    JSON response which sends already encoded content as is, anything else is
+    encoded by pydantic-core.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return to_json(content)
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Media ranges a client may ask for MessagePack with
+MSGPACK_MEDIA_RANGES = frozenset({MSGPACK_MEDIA_TYPE, "application/x-msgpack"})
+JSON_MEDIA_RANGES = frozenset({JSON_MEDIA_TYPE, "application/*", "*/*"})
+
+# Documents the MessagePack variant of the negotiated list endpoints
+MSGPACK_OPENAPI = {200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+
+
+class MsgPackResponse(Response):
+    """
+    MessagePack response which sends already encoded content as is.
+    """
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return pack(content)
+
+
+def negotiate_media_type(request: Request) -> str:
+    """
+    MessagePack when the Accept header prefers it over JSON, JSON otherwise.
+    """
+    accept = request.headers.get("accept")
+    if not accept:
+        return JSON_MEDIA_TYPE
+    quality = quality_values(accept)
+    msgpack_q = max(
+        quality.get(media_range, 0.0) for media_range in MSGPACK_MEDIA_RANGES
+    )
+    json_q = max(quality.get(media_range, 0.0) for media_range in JSON_MEDIA_RANGES)
+    if msgpack_q > json_q:
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def _pack_default(value: Any) -> Any:
+    # Naive timestamps are read back from SQLite, they are all UTC
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Cannot pack {type(value).__name__}")
+
+
+def pack(content: Any) -> bytes:
+    """
+    Encode to MessagePack, timestamps as the Timestamp extension type (6 to 15
+    bytes instead of an ISO string), read them with `timestamp=3`.
+    """
+    return msgpack.packb(content, datetime=True, default=_pack_default)
+
+
+@functools.cache
+def list_adapter(serializer: type[BaseModel]) -> TypeAdapter:
+    """
+    Adapter validating and encoding a whole list of the serializer at once
+    instead of row by row.
+    """
+    return TypeAdapter(list[serializer])
+
+
+def sparse_serializer(
+    serializer: type[BaseModel], fields: str | None
+) -> type[BaseModel]:
+    """
+    Serializer with only the requested fields of `serializer`, in the order
+    they are declared in, e.g. `sparse_serializer(BookOutSerializer, "id,title")`.
+    Fields a requested computed field reads (`computed_field_requires`) are
+    validated but not sent, `loaded_fields` tells the fields to load.
+    :param fields: Comma separated field names, None for all of them.
+    :raises InvalidFields: Some of the fields are not fields of the serializer.
+    """
+    if fields is None:
+        return serializer
+    requested = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = requested - serializer.model_fields.keys()
+    unknown -= serializer.model_computed_fields.keys()
+    if unknown or not requested:
+        raise InvalidFields(
+            f"Unknown fields {', '.join(sorted(unknown))}" if unknown else "No fields"
+        )
+    return _sparse_serializer(serializer, requested)
+
+
+@functools.cache
+def _sparse_serializer(
+    serializer: type[BaseModel], requested: frozenset[str]
+) -> type[BaseModel]:
+    requires = getattr(serializer, "computed_field_requires", {})
+    loaded = set(requested)
+    for name in requested & serializer.model_computed_fields.keys():
+        loaded.update(requires.get(name, ()))
+    namespace: dict[str, Any] = {
+        "__annotations__": {"loaded_fields": ClassVar[frozenset[str]]},
+        "loaded_fields": frozenset(loaded),
+    }
+    for name, info in serializer.model_fields.items():
+        if name in loaded:
+            namespace["__annotations__"][name] = info.annotation
+            namespace[name] = FieldInfo.merge_field_infos(
+                info, exclude=name not in requested
+            )
+    for name, info in serializer.model_computed_fields.items():
+        if name in requested:
+            namespace[name] = computed_field(
+                info.wrapped_property, return_type=info.return_type
+            )
+    return type(serializer.__name__, (BaseModel,), namespace)
+
+
+def loaded_fields(serializer: type[BaseModel]) -> frozenset[str] | None:
+    """
+    Fields the repositories have to load for the serializer, None when it is
+    not a sparse one and needs them all.
+    """
+    return getattr(serializer, "loaded_fields", None)
+
+
+def dump_item(serializer: type[BaseModel], item: Any) -> bytes:
+    """
+    Encode an ORM entity or a projected row to a JSON object.
+    :param serializer: The serializer, or a sparse one of it.
+    """
+    if isinstance(item, Row):
+        value = serializer.model_validate(item._asdict())
+    else:
+        value = serializer.model_validate(item, from_attributes=True)
+    return value.model_dump_json().encode()
+
+
+AUTHOR_LIST = list_adapter(AuthorOutSerializer)
+BOOK_LIST = list_adapter(BookOutSerializer)
+BOOK_LEASE_LOG_LIST = list_adapter(BookLeaseLogOutSerializer)
+AUTHOR_STATS_LIST = list_adapter(AuthorStatsOutSerializer)
+BOOK_STATS_LIST = list_adapter(BookStatsOutSerializer)
+
+
+def validate_list(adapter: TypeAdapter, rows: Sequence[Any]) -> list[BaseModel]:
+    """
+    Validate ORM entities or projected rows with a list adapter. Rows are
+    validated as plain dicts, reading their attributes one by one is several
+    times slower.
+    :param adapter: One of the list adapters above.
+    :param rows: Rows or objects with the attributes of the serializer.
+    :return: The serializers.
+    """
+    if rows and isinstance(rows[0], Row):
+        keys = rows[0]._fields
+        return adapter.validate_python([dict(zip(keys, row)) for row in rows])
+    return adapter.validate_python(rows, from_attributes=True)
+
+
+def dump_list(adapter: TypeAdapter, rows: Sequence[Any]) -> bytes:
+    """
+    Encode ORM entities or projected rows to a JSON array.
+    :param adapter: One of the list adapters above.
+    :param rows: Rows or objects with the attributes of the serializer.
+    :return: The JSON document.
+    """
+    return adapter.dump_json(validate_list(adapter, rows))
+
+
+def pack_list(adapter: TypeAdapter, rows: Sequence[Any]) -> bytes:
+    """
+    Encode ORM entities or projected rows to a MessagePack array, the items
+    have the fields of the JSON encoding.
+    :param adapter: One of the list adapters above.
+    :param rows: Rows or objects with the attributes of the serializer.
+    :return: The MessagePack document.
+    """
+    return pack(adapter.dump_python(validate_list(adapter, rows)))
+
+
+def page_response(
+    adapter: TypeAdapter, page: Page, media_type: str = JSON_MEDIA_TYPE
+) -> Response:
+    """
+    Response with the encoded page, the cursor of the next page is sent in the
+    X-Next-Cursor header.
+    :param media_type: JSON or MessagePack, see `negotiate_media_type`.
+    """
+    headers = {"Vary": "Accept"}
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return MsgPackResponse(pack_list(adapter, page.items), headers=headers)
+    return JSONBytesResponse(dump_list(adapter, page.items), headers=headers)
@@ -1,21 +1,153 @@
+import time
 from datetime import datetime, timezone
-from typing import Sequence
+from typing import Collection, Iterable, Iterator, Sequence
 
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import Row
 
-from ct_library.exceptions import Forbidden
+from ct_library.analytics import LeaseAnalytics, epoch_seconds
+from ct_library.exceptions import AwesomeException, Conflict, Forbidden
 from ct_library.models import Author, Book, BookLeaseLog
+from ct_library.pagination import Page, SortKey
 from ct_library.repositories import (
+    ARCHIVE_BATCH_SIZE,
     AuthorRepository,
     BookLendLogRepository,
     BookRepository,
+    StatsRepository,
+    match_expression,
 )
 from ct_library.serializers import (
     AuthorInSerializer,
+    BookBatchLeaseInSerializer,
+    BookBulkInSerializer,
     BookFilterParams,
     BookInSerializer,
     BookLeaseLogInSerializer,
+    BookLeaseLogOutSerializer,
+    BookLeaseResult,
+    BookSearchParams,
+    BulkImportError,
+    LeaseAction,
+    LeaseAnalyticsParams,
+    LeaseHistoryParams,
+    PaginationParams,
+    TopBooksParams,
+    naive_utc,
 )
+from ct_library.unit_of_work import UnitOfWork
+from ct_library.versioning import TableVersions
+
+# Sort keys of the listings, the cursors of their pages hold them
+AUTHOR_ORDER = SortKey(("name", "id"), (str, int))
+BOOK_ORDER = SortKey(("title", "id"), (str, int))
+# The bm25 rank depends on the whole corpus, any insert, update or delete of a
+# book or author shifts it: a search cursor only continues the listing of an
+# unchanged corpus, pages read across a write may skip or repeat books
+SEARCH_ORDER = SortKey(("rank", "id"), (float, int))
+LEASE_ORDER = SortKey(("created_at", "id"), (datetime, int))
+AUTHOR_STATS_ORDER = SortKey(("name", "author_id"), (str, int))
+
+
+def apply_lease_action(
+    book: Book,
+    current_lease: BookLeaseLog | None,
+    user_id: int,
+    action: LeaseAction,
+    returned_at: datetime,
+) -> BookLeaseLog:
+    """
+    Lease the book to the user or close its open lease.
+    :raises Forbidden: The book is lent to another user.
+    :raises Conflict: The book is leased already, or is not leased when it is
+        returned.
+    :return: The new or closed book lend log, not saved yet.
+    """
+    if current_lease is not None and current_lease.user_id != user_id:
+        raise Forbidden(f"Book {book.title} is already lent to another user")
+    if action is LeaseAction.lease:
+        if current_lease is not None:
+            raise Conflict(f"Book {book.title} is already leased")
+        return BookLeaseLog(book_id=book.id, user_id=user_id, returned_at=None)
+    if current_lease is None:
+        raise Conflict(f"Book {book.title} is not leased")
+    current_lease.returned_at = returned_at
+    return current_lease
+
+
+def toggle_lease(
+    book: Book, current_lease: BookLeaseLog | None, user_id: int, returned_at: datetime
+) -> BookLeaseLog:
+    """
+    Lease the book when it is available, return it otherwise.
+    :raises Forbidden: The book is lent to another user.
+    :return: The new or closed book lend log, not saved yet.
+    """
+    action = LeaseAction.lease if current_lease is None else LeaseAction.return_
+    return apply_lease_action(book, current_lease, user_id, action, returned_at)
+
+
+def apply_lease_actions(
+    books: Iterable[tuple[Book, BookLeaseLog | None]],
+    user_id: int,
+    action: LeaseAction,
+    returned_at: datetime,
+) -> dict[int, BookLeaseLog | AwesomeException]:
+    """
+    `apply_lease_action` for every book of a batch, a book which can not be
+    leased or returned gets its error and does not stop the others.
+    :param books: The books with their open leases.
+    :return: The new or closed lease log, or the error, per book ID.
+    """
+    outcomes: dict[int, BookLeaseLog | AwesomeException] = {}
+    for book, current_lease in books:
+        try:
+            outcomes[book.id] = apply_lease_action(
+                book, current_lease, user_id, action, returned_at
+            )
+        except (Forbidden, Conflict) as exc:
+            outcomes[book.id] = exc
+    return outcomes
+
+
+def split_by_author(
+    books: Sequence[tuple[int, BookBulkInSerializer]], existing: Collection[int]
+) -> tuple[list[dict], list[BulkImportError]]:
+    """
+    Split the books of a bulk import by the existence of their authors.
+    :param existing: IDs of the authors which exist.
+    :return: Values of the books to insert and errors of the other ones.
+    """
+    values = [book.model_dump() for _, book in books if book.author_id in existing]
+    errors = [
+        BulkImportError(line=line, error=f"Author {book.author_id} does not exist")
+        for line, book in books
+        if book.author_id not in existing
+    ]
+    return values, errors
+
+
+def lease_result(
+    book_id: int, outcome: BookLeaseLog | AwesomeException | None
+) -> BookLeaseResult:
+    """
+    Result of one book of a batch lease, with the status code the single book
+    endpoint would respond with.
+    :param outcome: The saved lease log, the error, or None for a missing book.
+    """
+    if outcome is None:
+        return BookLeaseResult(
+            book_id=book_id, status_code=404, detail="Book not found"
+        )
+    if isinstance(outcome, AwesomeException):
+        status_code = 403 if isinstance(outcome, Forbidden) else 409
+        return BookLeaseResult(
+            book_id=book_id, status_code=status_code, detail=str(outcome)
+        )
+    return BookLeaseResult(
+        book_id=book_id,
+        status_code=200 if outcome.returned_at else 201,
+        lease=BookLeaseLogOutSerializer.model_validate(outcome),
+    )
 
 
 class AuthorService:
@@ -23,8 +155,11 @@ class AuthorService:
     Service class for author operations.
     """
 
-    def __init__(self, author_repository: AuthorRepository):
+    def __init__(
+        self, author_repository: AuthorRepository, table_versions: TableVersions
+    ):
         self.author_repo = author_repository
+        self.table_versions = table_versions
 
     def create(self, author: AuthorInSerializer) -> Author:
         """
@@ -35,21 +170,45 @@ class AuthorService:
         model = Author(**data)
         model = self.author_repo.create(model)
         print(model)
+        self.table_versions.bump("author")
         return model
 
-    def get_all(self) -> list[Author]:
+    def bulk_create(
+        self, authors: Sequence[tuple[int, AuthorInSerializer]]
+    ) -> list[BulkImportError]:
         """
-        Get all authors.
-        :return: A list of authors.
+        Create authors in bulk.
+        :param authors: Authors with the numbers of their lines.
+        :return: Errors of the authors which could not be created.
         """
-        return self.author_repo.get_all()
+        self.author_repo.bulk_create([author.model_dump() for _, author in authors])
+        self.table_versions.bump("author")
+        return []
 
-    def get_by_id(self, author_id: int) -> Author:
+    def get_all(
+        self, pagination: PaginationParams, fields: Collection[str] | None = None
+    ) -> Page[Row]:
+        """
+        Get a page of authors ordered by name.
+        :param fields: Fields to load, all by default.
+        :return: A page of author rows.
+        """
+        authors = self.author_repo.get_all(
+            after=AUTHOR_ORDER.after(pagination.cursor),
+            limit=pagination.limit,
+            fields=fields,
+        )
+        return AUTHOR_ORDER.page(authors, pagination.limit)
+
+    def get_by_id(
+        self, author_id: int, fields: Collection[str] | None = None
+    ) -> Author | Row:
         """
         Get an author by ID.
+        :param fields: Fields to load, all by default.
         :return: The author with the specified ID.
         """
-        return self.author_repo.get_by_id(author_id)
+        return self.author_repo.get_by_id(author_id, fields=fields)
 
     def delete_by_id(self, author_id: int) -> None:
         """
@@ -57,6 +216,7 @@ class AuthorService:
         :return: None
         """
         self.author_repo.delete_by_id(author_id)
+        self.table_versions.bump("author")
 
 
 class BookService:
@@ -65,10 +225,14 @@ class BookService:
     """
 
     def __init__(
-        self, book_repository: BookRepository, author_repository: AuthorRepository
+        self,
+        book_repository: BookRepository,
+        author_repository: AuthorRepository,
+        table_versions: TableVersions,
     ):
         self.book_repo = book_repository
         self.author_repo = author_repository
+        self.table_versions = table_versions
 
     def create(self, book: BookInSerializer, author_id: int) -> Book:
         """
@@ -81,27 +245,88 @@ class BookService:
         model = Book(**data)
         model.author_id = author.id
         model = self.book_repo.create(model)
+        self.table_versions.bump("book")
         return model
 
-    def get_all(self, filter_params: BookFilterParams) -> Sequence[Book]:
+    def bulk_create(
+        self, books: Sequence[tuple[int, BookBulkInSerializer]]
+    ) -> list[BulkImportError]:
+        """
+        Create books in bulk, the authors of all the books are checked with one
+        query.
+        :param books: Books with the numbers of their lines.
+        :return: Errors of the books whose author does not exist.
+        """
+        existing = self.author_repo.get_existing_ids(
+            book.author_id for _, book in books
+        )
+        values, errors = split_by_author(books, existing)
+        if values:
+            self.book_repo.bulk_create(values)
+            self.table_versions.bump("book")
+        return errors
+
+    def get_all(
+        self, filter_params: BookFilterParams, fields: Collection[str] | None = None
+    ) -> Page[Row]:
         """
-        Get all books.
-        :return: A list of books.
+        Get a page of books ordered by title.
+        :param fields: Fields to load, all by default.
+        :return: A page of book rows.
         """
+        after = BOOK_ORDER.after(filter_params.cursor)
         if isinstance(filter_params.available, bool):
             # TODO: Fix this repo - DRY
-            return self.book_repo.filter_by_availability(
-                available=bool(filter_params.available)
+            books = self.book_repo.filter_by_availability(
+                available=bool(filter_params.available),
+                after=after,
+                limit=filter_params.limit,
+                fields=fields,
             )
         else:
-            return self.book_repo.get_all()
+            books = self.book_repo.get_all(
+                after=after, limit=filter_params.limit, fields=fields
+            )
+        return BOOK_ORDER.page(books, filter_params.limit)
 
-    def get_by_id(self, book_id: int) -> Book:
+    def export(self, since: datetime | None = None) -> Iterator[Sequence[Row]]:
+        """
+        Stream all books, or only those created or updated since the given
+        time, in chunks of rows.
+        :return: Chunks of book rows ordered by ID.
+        """
+        return self.book_repo.stream_all(since=since)
+
+    def search(
+        self, search_params: BookSearchParams, fields: Collection[str] | None = None
+    ) -> Page[Row]:
+        """
+        Full-text search of the books by title and author name, every word of
+        the search matches as a prefix.
+        :param fields: Fields to load, all by default.
+        :return: A page of book rows, best match first.
+        """
+        match = match_expression(search_params.q)
+        if match is None:
+            return Page(items=[])
+        books = self.book_repo.search(
+            match,
+            available=search_params.available,
+            after=SEARCH_ORDER.after(search_params.cursor),
+            limit=search_params.limit,
+            fields=fields,
+        )
+        return SEARCH_ORDER.page(books, search_params.limit)
+
+    def get_by_id(
+        self, book_id: int, fields: Collection[str] | None = None
+    ) -> Book | Row:
         """
         Get a book by ID.
+        :param fields: Fields to load, all by default.
         :return: The book with the specified ID.
         """
-        return self.book_repo.get_by_id(book_id)
+        return self.book_repo.get_by_id(book_id, fields=fields)
 
     def get_by_author_id(self, author_id: int) -> Sequence[Book]:
         """
@@ -116,6 +341,7 @@ class BookService:
         :return: None
         """
         self.book_repo.delete_by_id(book_id)
+        self.table_versions.bump("book")
 
 
 class BookLeaseService:
@@ -127,49 +353,157 @@ class BookLeaseService:
         self,
         book_lease_log_repository: BookLendLogRepository,
         book_repository: BookRepository,
+        table_versions: TableVersions,
+        unit_of_work: UnitOfWork,
     ):
         self.book_lease_log_repo = book_lease_log_repository
         self.book_repo = book_repository
+        self.table_versions = table_versions
+        self.unit_of_work = unit_of_work
 
     def lease_or_return_book(
         self, book_id: int, user_id: int, book_lease_log: BookLeaseLogInSerializer
     ) -> BookLeaseLog:
         """
-        Create a new book lend log.
-        :return: The created book lend log.
+        Lease the book when it is available, return it otherwise.
+        Run it in a writing unit of work, the book is then read under the write
+        lock and concurrent leases of the same book can not interleave.
+        :return: The created or closed book lend log.
+        """
+        book, current_lease = self.book_repo.get_with_current_lease(book_id)
+        book_lease_obj = toggle_lease(
+            book,
+            current_lease,
+            int(user_id),
+            book_lease_log.returned_at or datetime.now(timezone.utc),
+        )
+        book_lease_obj = self.book_lease_log_repo.save(book_lease_obj)
+        self.table_versions.bump("book", "book_lease_log")
+        return book_lease_obj
+
+    def lease_or_return_books(
+        self, user_id: int, batch: BookBatchLeaseInSerializer
+    ) -> list[BookLeaseResult]:
+        """
+        Lease or return several books for one user. The books and their open
+        leases are read in one query and all lease logs are saved at once, in
+        the transaction of the unit of work which should be a writing one.
+        A book which can not be leased or returned is reported in its result
+        and does not stop the others.
+        :return: One result per distinct book ID, in the requested order.
         """
         user_id = int(user_id)
-        book = self.book_repo.get_by_id(book_id)
+        book_ids = list(dict.fromkeys(batch.book_ids))
+        outcomes = apply_lease_actions(
+            self.book_repo.get_with_current_leases(book_ids),
+            user_id,
+            batch.action,
+            batch.returned_at or datetime.now(timezone.utc),
+        )
+        leases = [
+            lease for lease in outcomes.values() if isinstance(lease, BookLeaseLog)
+        ]
+        if leases:
+            self.book_lease_log_repo.save_all(leases)
+            self.table_versions.bump("book", "book_lease_log")
+        return [lease_result(book_id, outcomes.get(book_id)) for book_id in book_ids]
 
-        try:
-            book_lease_obj = self.book_lease_log_repo.get_last_lease_log(
-                book_id=book.id
-            )
+    def analytics(self, params: LeaseAnalyticsParams) -> dict:
+        """
+        Lease durations, ages of the open leases and daily lease volumes of the
+        leases created in the range, optionally of one author's books only.
+        The lease history is folded chunk by chunk, see `ct_library.analytics`.
+        :return: The aggregates, see `LeaseAnalyticsOutSerializer`.
+        """
+        analytics = LeaseAnalytics(now=epoch_seconds(datetime.now(timezone.utc)))
+        chunks = self.book_lease_log_repo.stream_lease_times(
+            since=params.since,
+            until=params.until,
+            author_id=params.author_id,
+        )
+        for rows in chunks:
+            analytics.add(rows)
+        return analytics.result()
 
-            if book_lease_obj.returned_at is not None:
-                book_lease_obj = BookLeaseLog(
-                    book_id=book.id, user_id=user_id, returned_at=None
-                )
-            else:
-                if book_lease_obj.user_id != user_id:
-                    raise Forbidden(
-                        f"Book {book.title} is already lent to another user"
-                    )
-                book_lease_obj.returned_at = book_lease_log.returned_at or datetime.now(
-                    timezone.utc
+    def get_by_book_id(
+        self,
+        book_id: int,
+        pagination: LeaseHistoryParams,
+        fields: Collection[str] | None = None,
+    ) -> Page[Row]:
+        """
+        Get a page of the lease history of a book, oldest first, with the
+        archived leases when the full history is requested.
+        :return: A page of book lend log rows with the specified book ID.
+        """
+        book_leases = self.book_lease_log_repo.get_by_book_id(
+            book_id,
+            after=LEASE_ORDER.after(pagination.cursor),
+            limit=pagination.limit,
+            full_history=pagination.full_history,
+            fields=fields,
+        )
+        return LEASE_ORDER.page(book_leases, pagination.limit)
+
+    def archive(
+        self,
+        before: datetime,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        pause: float = 0,
+    ) -> int:
+        """
+        Move the leases returned before the given time into the archive. Each
+        batch runs in a writing unit of work of its own, together with the bump
+        of the lease log version, and the writers waiting for the lock get it
+        between the batches; run it outside of a unit of work scope.
+        :param pause: Seconds to sleep between the batches.
+        :return: The number of archived leases.
+        """
+        before = naive_utc(before)
+        archived, after_id = 0, 0
+        while after_id is not None:
+            with self.unit_of_work.scope(write=True):
+                moved, after_id = self.book_lease_log_repo.archive(
+                    before, after_id, batch_size
                 )
+                if moved:
+                    self.table_versions.bump("book_lease_log")
+            archived += moved
+            if after_id is not None and pause:
+                time.sleep(pause)
+        return archived
 
-        except NoResultFound:
-            book_lease_obj = BookLeaseLog(
-                book_id=book.id, user_id=user_id, returned_at=None
-            )
+    def export(self, since: datetime | None = None) -> Iterator[Sequence[Row]]:
+        """
+        Stream the lease history of all books, or only the leases created or
+        returned since the given time, in chunks of rows.
+        :return: Chunks of book lend log rows ordered by ID.
+        """
+        return self.book_lease_log_repo.stream_all(since=since)
 
-        book_lease_obj = self.book_lease_log_repo.save(book_lease_obj)
-        return book_lease_obj
 
-    def get_by_book_id(self, book_id: int) -> Sequence[BookLeaseLog]:
+class StatsService:
+    """
+    Service class for the statistics, read from the counter tables the
+    repositories maintain with every write.
+    """
+
+    def __init__(self, stats_repository: StatsRepository):
+        self.stats_repo = stats_repository
+
+    def get_author_stats(self, pagination: PaginationParams) -> Page[Row]:
+        """
+        Get a page of the book counts of the authors, ordered by author name.
+        :return: A page of author stats rows.
+        """
+        authors = self.stats_repo.get_author_stats(
+            after=AUTHOR_STATS_ORDER.after(pagination.cursor), limit=pagination.limit
+        )
+        return AUTHOR_STATS_ORDER.page(authors, pagination.limit)
+
+    def get_top_books(self, params: TopBooksParams) -> Sequence[Row]:
         """
-        Get a book lend log by book ID.
-        :return: The book lend log with the specified book ID.
+        Get the most leased books.
+        :return: Book stats rows, most leases first.
         """
-        return self.book_lease_log_repo.get_by_book_id(book_id)
+        return self.stats_repo.get_top_books(params.limit)
@@ -0,0 +1,206 @@
+"""
+Typed settings of the application, read from a named profile and the
+environment.
+
+`CT_LIBRARY_PROFILE` selects the profile (dev, test, bench or prod), any
+setting of the profile is then overridden by a `CT_LIBRARY_` variable with
+`__` between the nested names, e.g.
+
+    CT_LIBRARY_PROFILE=prod CT_LIBRARY_DB__URL=sqlite:////srv/library.db \
+    CT_LIBRARY_SERVER__WORKERS=8 python ct_library/main.py
+
+Dict settings are given as JSON and merged into the defaults, e.g.
+`CT_LIBRARY_DB__PRAGMAS='{"synchronous": "OFF"}'` changes only that pragma.
+"""
+
+import enum
+import json
+import os
+from typing import Any, Literal, Mapping
+
+from pydantic import BaseModel, Field, model_validator
+
+from ct_library.models import DEFAULT_SQLITE_PRAGMAS
+from ct_library.repositories import ARCHIVE_BATCH_SIZE
+
+ENV_PREFIX = "CT_LIBRARY_"
+ENV_NESTED_DELIMITER = "__"
+
+
+class Profile(enum.Enum):
+    dev = "dev"
+    test = "test"
+    bench = "bench"
+    prod = "prod"
+
+
+class DatabaseSettings(BaseModel):
+    url: str = Field(default="sqlite:///database.db")
+    # Replicas for the reads, by default the SQLite file is opened read-only
+    read_url: str | None = Field(default=None)
+    # URLs of the async stack, by default the ones above with the async
+    # driver (see `models.async_url`)
+    async_url: str | None = Field(default=None)
+    async_read_url: str | None = Field(default=None)
+    pragmas: dict[str, str | int] = Field(
+        default_factory=lambda: dict(DEFAULT_SQLITE_PRAGMAS)
+    )
+    pool_size: int = Field(default=5, ge=1)
+    max_overflow: int = Field(default=10, ge=0)
+    pool_timeout: float = Field(default=30, gt=0)
+    echo: bool = Field(default=True)
+
+
+class CacheSettings(BaseModel):
+    # The memory cache is per process, forced to "none" with several workers
+    backend: Literal["memory", "none"] = Field(default="memory")
+    max_size: int = Field(default=10_000, ge=1)
+    ttl: float = Field(default=30, gt=0)
+
+
+class ResponseCacheSettings(BaseModel):
+    max_size: int = Field(default=1_000, ge=1)
+    ttl: float = Field(default=30, gt=0)
+
+
+class ServerSettings(BaseModel):
+    host: str = Field(default="0.0.0.0")
+    port: int = Field(default=8000)
+    workers: int = Field(default=1, ge=1)
+    # Threads running the sync endpoints, anyio's default is 40
+    thread_pool_size: int = Field(default=40, ge=1)
+
+
+class AdmissionSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    # Requests handled at once per worker, reads and writes (any other method)
+    read_limit: int = Field(default=32, ge=1)
+    write_limit: int = Field(default=4, ge=1)
+    # Requests waiting for their turn, more are rejected right away
+    read_queue_size: int = Field(default=64, ge=0)
+    write_queue_size: int = Field(default=32, ge=0)
+    # Seconds a request waits in the queue before it is rejected
+    queue_timeout: float = Field(default=1, gt=0)
+    # Seconds sent in the Retry-After header of the rejections
+    retry_after: int = Field(default=1, ge=0)
+
+
+class CompressionSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    # Smaller responses are sent uncompressed
+    minimum_size: int = Field(default=1024, ge=0)
+    gzip_level: int = Field(default=6, ge=1, le=9)
+    zstd_level: int = Field(default=3, ge=1, le=22)
+
+
+class ArchiveSettings(BaseModel):
+    # Returned leases older than this many days are moved to the archive
+    horizon_days: int = Field(default=365, ge=1)
+    batch_size: int = Field(default=ARCHIVE_BATCH_SIZE, ge=1)
+    # Seconds between the batches, leaves the write lock to the requests
+    pause: float = Field(default=0.05, ge=0)
+
+
+class Settings(BaseModel):
+    profile: Profile = Field(default=Profile.dev)
+    mode: Literal["sync", "async"] = Field(default="sync")
+    db: DatabaseSettings = Field(default_factory=DatabaseSettings)
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    response_cache: ResponseCacheSettings = Field(default_factory=ResponseCacheSettings)
+    server: ServerSettings = Field(default_factory=ServerSettings)
+    admission: AdmissionSettings = Field(default_factory=AdmissionSettings)
+    compression: CompressionSettings = Field(default_factory=CompressionSettings)
+    archive: ArchiveSettings = Field(default_factory=ArchiveSettings)
+
+    @model_validator(mode="after")
+    def disable_process_caches(self) -> "Settings":
+        """
+        A worker invalidates its entity cache on its own writes only, with
+        several workers the others would serve stale entities until the TTL.
+        """
+        if self.server.workers > 1:
+            self.cache.backend = "none"
+        return self
+
+
+# Settings of each profile which differ from the defaults (dev)
+PROFILES: dict[Profile, dict[str, Any]] = {
+    Profile.dev: {},
+    Profile.test: {
+        "db": {
+            "url": "sqlite:///test_database.db",
+            "echo": False,
+        },
+        "cache": {"backend": "none"},
+    },
+    Profile.bench: {
+        "db": {"echo": False, "pool_size": 20, "max_overflow": 20},
+        "server": {"thread_pool_size": 100},
+        # Unlimited for the throughput benchmarks, the load shedding is
+        # measured by benchmarks/admission_control.py
+        "admission": {"enabled": False},
+    },
+    Profile.prod: {
+        "db": {"echo": False, "pool_size": 10, "max_overflow": 20},
+        "server": {"workers": os.cpu_count() or 1},
+    },
+}
+
+
+def load_settings(
+    profile: Profile | str | None = None, environ: Mapping[str, str] | None = None
+) -> Settings:
+    """
+    Settings of the profile overridden by the environment.
+    :param profile: The profile, `CT_LIBRARY_PROFILE` or dev by default.
+    :param environ: The environment, `os.environ` by default.
+    :return: The validated settings.
+    """
+    environ = os.environ if environ is None else environ
+    profile = Profile(profile or environ.get(f"{ENV_PREFIX}PROFILE", "dev"))
+    values = _merge(Settings().model_dump(mode="json"), PROFILES[profile])
+    values["profile"] = profile.value
+    return Settings.model_validate(_merge(values, _from_env(environ)))
+
+
+def _from_env(environ: Mapping[str, str]) -> dict[str, Any]:
+    """
+    Nested settings given by the `CT_LIBRARY_` variables.
+    """
+    values: dict[str, Any] = {}
+    for name, value in environ.items():
+        if not name.startswith(ENV_PREFIX) or name == f"{ENV_PREFIX}PROFILE":
+            continue
+        *parents, field = (
+            name.removeprefix(ENV_PREFIX).lower().split(ENV_NESTED_DELIMITER)
+        )
+        model: type[BaseModel] | None = Settings
+        target = values
+        for parent in parents:
+            model = _nested_model(model, parent)
+            target = target.setdefault(parent, {})
+        if model is None or field not in model.model_fields:
+            continue
+        annotation = model.model_fields[field].annotation
+        is_dict = getattr(annotation, "__origin__", None) is dict
+        target[field] = json.loads(value) if is_dict else value
+    return values
+
+
+def _nested_model(model: type[BaseModel] | None, name: str) -> type[BaseModel] | None:
+    if model is None or name not in model.model_fields:
+        return None
+    annotation = model.model_fields[name].annotation
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    return None
+
+
+def _merge(base: dict[str, Any], override: Mapping[str, Any]) -> dict[str, Any]:
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, Mapping) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
@@ -0,0 +1,155 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator
+
+from anyio import to_thread
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from ct_library.routing import USE_PRIMARY
+
+# Execution options of the session of a writing scope: the transaction takes
+# the write lock when it begins (SQLite `BEGIN IMMEDIATE`), so what the unit of
+# work reads can not change under it before it writes
+WRITE_EXECUTION_OPTIONS = {"sqlite_begin": "IMMEDIATE"}
+
+# HTTP methods whose requests run in a read-only unit of work
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class _Scope:
+    """
+    Session shared by everything running inside one scope, created on first use.
+    """
+
+    session = None
+
+    def __init__(self, write: bool = False):
+        self.write = write
+
+
+class UnitOfWork:
+    """
+    Session provider for repositories.
+
+    Inside `scope()` (one per request) all repositories share a single session
+    and transaction which is committed once when the scope ends, or rolled back
+    on error. A writing scope runs every statement on the primary engine, a
+    reading one on the read engine until it writes. Outside of a scope every
+    call gets a short-lived session of its own which is committed on exit.
+    """
+
+    def __init__(self, session_factory: sessionmaker):
+        self.session_factory = session_factory
+        self._scope: ContextVar[_Scope | None] = ContextVar(
+            "unit_of_work_scope", default=None
+        )
+
+    @contextmanager
+    def __call__(self) -> Iterator[Session]:
+        scope = self._scope.get()
+        if scope is None:
+            with self.session_factory() as session, session.begin():
+                yield session
+            return
+
+        if scope.session is None:
+            scope.session = self.session_factory()
+            if scope.write:
+                scope.session.info[USE_PRIMARY] = True
+                scope.session.connection(execution_options=WRITE_EXECUTION_OPTIONS)
+        yield scope.session
+
+    @contextmanager
+    def scope(self, write: bool = False) -> Iterator[None]:
+        """
+        Share one session and transaction inside the block.
+        :param write: Take the write lock when the transaction begins.
+        """
+        scope = _Scope(write)
+        token = self._scope.set(scope)
+        try:
+            yield
+            if scope.session is not None:
+                scope.session.commit()
+        except BaseException:
+            if scope.session is not None:
+                scope.session.rollback()
+            raise
+        finally:
+            if scope.session is not None:
+                scope.session.close()
+            self._scope.reset(token)
+
+    @asynccontextmanager
+    async def request_scope(self, write: bool = False) -> AsyncIterator[None]:
+        """
+        `scope()` for the event loop, the blocking commit and rollback run in
+        the thread pool. Sync endpoints running in the thread pool see the scope
+        as the context is copied to the worker threads.
+        :param write: Take the write lock when the transaction begins.
+        """
+        scope = _Scope(write)
+        token = self._scope.set(scope)
+        try:
+            yield
+            if scope.session is not None:
+                await to_thread.run_sync(scope.session.commit)
+        except BaseException:
+            if scope.session is not None:
+                await to_thread.run_sync(scope.session.rollback)
+            raise
+        finally:
+            if scope.session is not None:
+                await to_thread.run_sync(scope.session.close)
+            self._scope.reset(token)
+
+
+class AsyncUnitOfWork:
+    """
+    Async counterpart of `UnitOfWork` for the async repositories.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+        self._scope: ContextVar[_Scope | None] = ContextVar(
+            "async_unit_of_work_scope", default=None
+        )
+
+    @asynccontextmanager
+    async def __call__(self) -> AsyncIterator[AsyncSession]:
+        scope = self._scope.get()
+        if scope is None:
+            async with self.session_factory() as session, session.begin():
+                yield session
+            return
+
+        if scope.session is None:
+            scope.session = self.session_factory()
+            if scope.write:
+                scope.session.info[USE_PRIMARY] = True
+                await scope.session.connection(
+                    execution_options=WRITE_EXECUTION_OPTIONS
+                )
+        yield scope.session
+
+    @asynccontextmanager
+    async def request_scope(self, write: bool = False) -> AsyncIterator[None]:
+        """
+        Share one session and transaction inside the block.
+        :param write: Take the write lock when the transaction begins.
+        """
+        scope = _Scope(write)
+        token = self._scope.set(scope)
+        try:
+            yield
+            if scope.session is not None:
+                await scope.session.commit()
+        except BaseException:
+            if scope.session is not None:
+                await scope.session.rollback()
+            raise
+        finally:
+            if scope.session is not None:
+                await scope.session.close()
+            self._scope.reset(token)
@@ -0,0 +1,195 @@
+import hashlib
+from typing import Hashable, Sequence
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import Row, Select, Update, select, update
+
+from ct_library.cache import Cache
+from ct_library.models import TableVersion
+from ct_library.pagination import NEXT_CURSOR_HEADER
+from ct_library.serializers import negotiate_media_type
+from ct_library.unit_of_work import AsyncUnitOfWork, UnitOfWork
+
+# Headers of a cached list response which are sent again when it is reused
+CACHED_HEADERS = ("ETag", "Content-Type", "Vary", NEXT_CURSOR_HEADER)
+
+
+def versions_query(tables: Sequence[str]) -> Select:
+    """
+    Query of the names and versions of the tables.
+    """
+    return select(TableVersion.name, TableVersion.version).where(
+        TableVersion.name.in_(tables)
+    )
+
+
+def bump_query(tables: Sequence[str]) -> Update:
+    """
+    Statement incrementing the versions of the tables.
+    """
+    return (
+        update(TableVersion)
+        .where(TableVersion.name.in_(tables))
+        .values(version=TableVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _ordered(tables: Sequence[str], rows: Sequence[Row]) -> tuple[int, ...]:
+    versions = dict(rows)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+class TableVersions:
+    """
+    Per table counters bumped by the services on every write. A version names
+    one state of the table, anything derived from the table can be cached
+    under it.
+
+    Counters live in the `table_version` table, shared by all the workers. They
+    are bumped in the transaction of the write and read in the transaction of
+    the request, so a version always names the rows the request reads.
+    """
+
+    def __init__(self, unit_of_work: UnitOfWork):
+        self.unit_of_work = unit_of_work
+
+    def get(self, *tables: str) -> tuple[int, ...]:
+        """
+        :return: Current versions of the tables.
+        """
+        with self.unit_of_work() as session:
+            return _ordered(tables, session.execute(versions_query(tables)).all())
+
+    def bump(self, *tables: str) -> None:
+        """
+        Bump the versions in the transaction of the current unit of work, the
+        new versions become visible with the written rows.
+        """
+        with self.unit_of_work() as session:
+            session.execute(bump_query(tables))
+
+
+class AsyncTableVersions:
+    """
+    Async counterpart of `TableVersions` for the async services.
+    """
+
+    def __init__(self, unit_of_work: AsyncUnitOfWork):
+        self.unit_of_work = unit_of_work
+
+    async def get(self, *tables: str) -> tuple[int, ...]:
+        """
+        :return: Current versions of the tables.
+        """
+        async with self.unit_of_work() as session:
+            result = await session.execute(versions_query(tables))
+            return _ordered(tables, result.all())
+
+    async def bump(self, *tables: str) -> None:
+        """
+        Bump the versions in the transaction of the current unit of work.
+        """
+        async with self.unit_of_work() as session:
+            await session.execute(bump_query(tables))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of the If-None-Match header with the entity tag.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+class ListResponseCache:
+    """
+    Encoded list responses cached per endpoint, query parameters, negotiated
+    media type and version of the tables they are read from, with a strong
+    ETag of the body.
+
+        key = list_cache.key(request, "book")
+        if (response := list_cache.lookup(request, key)) is not None:
+            return response
+        return list_cache.store(request, key, build_response())
+
+    :param table_versions: Versions of the tables.
+    :param cache: Storage of the encoded responses.
+    """
+
+    def __init__(
+        self, table_versions: TableVersions | AsyncTableVersions, cache: Cache
+    ):
+        self.table_versions = table_versions
+        self.cache = cache
+
+    def key(self, request: Request, *tables: str) -> Hashable:
+        """
+        Cache key of the response to the request.
+        :param tables: Tables the response is read from.
+        """
+        return _key(request, self.table_versions.get(*tables))
+
+    def lookup(self, request: Request, key: Hashable) -> Response | None:
+        """
+        The cached response, 304 Not Modified when the client has it already.
+        :return: None when the response is not cached.
+        """
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        body, headers = entry
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return Response(body, headers=headers)
+
+    def store(self, request: Request, key: Hashable, response: Response) -> Response:
+        """
+        Cache the response and tag it with the ETag of its body.
+        :return: The response, 304 Not Modified when the client has it already.
+        """
+        digest = hashlib.blake2b(response.body, digest_size=16).hexdigest()
+        response.headers["ETag"] = f'"{digest}"'
+        headers = {
+            name: response.headers[name]
+            for name in CACHED_HEADERS
+            if name in response.headers
+        }
+        self.cache.set(key, (response.body, headers))
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return response
+
+
+class AsyncListResponseCache(ListResponseCache):
+    """
+    `ListResponseCache` of the async routes, the versions are read by the
+    async session:
+
+        key = await list_cache.key(request, "book")
+    """
+
+    async def key(self, request: Request, *tables: str) -> Hashable:
+        """
+        Cache key of the response to the request.
+        :param tables: Tables the response is read from.
+        """
+        return _key(request, await self.table_versions.get(*tables))
+
+
+def _key(request: Request, versions: tuple[int, ...]) -> Hashable:
+    return (
+        request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+        negotiate_media_type(request),
+        versions,
+    )
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and etag_matches(if_none_match, etag)
@@ -0,0 +1,42 @@
+"""
+Start-up of a serving worker. Every worker builds its own engine and pool
+after the fork, nothing connected is created before the app starts.
+"""
+
+from contextlib import AsyncExitStack, ExitStack
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ct_library.container import Container
+
+
+async def warm_up(container: Container) -> None:
+    """
+    Create the engines of the worker and fill their pools before the worker
+    takes requests, so the first requests do not pay for the connections and their
+    pragmas.
+    """
+    connections = container.config.db.pool_size()
+    if container.config.mode() == "async":
+        engines = (container.async_db_engine(), container.async_db_read_engine())
+        for engine in filter(None, engines):
+            await _fill_async_pool(engine, connections)
+    else:
+        engines = (container.db_engine(), container.db_read_engine())
+        for engine in filter(None, engines):
+            await run_in_threadpool(_fill_pool, engine, connections)
+
+
+def _fill_pool(engine: Engine, connections: int) -> None:
+    with ExitStack() as stack:
+        for _ in range(connections):
+            stack.enter_context(engine.connect()).execute(text("SELECT 1"))
+
+
+async def _fill_async_pool(engine: AsyncEngine, connections: int) -> None:
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            connection = await stack.enter_async_context(engine.connect())
+            await connection.execute(text("SELECT 1"))
@@ -4,11 +4,16 @@ from alembic import context
 from sqlalchemy import engine_from_config, pool
 
 from ct_library.models import Author, Base, Book, BookLeaseLog  # noqa: F401
+from ct_library.settings import load_settings
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
+# Migrate the database of the settings profile (CT_LIBRARY_PROFILE), the URL in
+# alembic.ini is the one of the dev profile
+config.set_main_option("sqlalchemy.url", load_settings().db.url)
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -25,6 +30,12 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names) -> bool:
+    """The full-text index (book_search and its FTS5 shadow tables) is not
+    described by the models, leave it out of autogenerate."""
+    return not (type_ == "table" and name.startswith("book_search"))
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -41,6 +52,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         render_as_batch=True,
         dialect_opts={"paramstyle": "named"},
@@ -65,7 +77,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, render_as_batch=True
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            render_as_batch=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,38 @@
+"""hot query indexes
+
+Revision ID: 13bf2f651d62
+Revises: 40984158b176
+Create Date: 2026-10-17 18:07:38.213952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '13bf2f651d62'
+down_revision: Union[str, None] = '40984158b176'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_author_name', 'author', ['name'], unique=False)
+    op.create_index('ix_book_title', 'book', ['title'], unique=False)
+    op.create_index('ix_book_author_id', 'book', ['author_id'], unique=False)
+    op.create_index('ix_book_current_lease_id_title', 'book', ['current_lease_id', 'title'], unique=False)
+    op.create_index('ix_book_lease_log_book_id_created_at', 'book_lease_log', ['book_id', 'created_at'], unique=False)
+    op.create_index('ix_book_lease_log_open', 'book_lease_log', ['book_id'], unique=False, sqlite_where=sa.text('returned_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_lease_log_open', table_name='book_lease_log', sqlite_where=sa.text('returned_at IS NULL'))
+    op.drop_index('ix_book_lease_log_book_id_created_at', table_name='book_lease_log')
+    op.drop_index('ix_book_current_lease_id_title', table_name='book')
+    op.drop_index('ix_book_author_id', table_name='book')
+    op.drop_index('ix_book_title', table_name='book')
+    op.drop_index('ix_author_name', table_name='author')
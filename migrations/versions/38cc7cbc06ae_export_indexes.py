@@ -0,0 +1,34 @@
+"""export indexes
+
+Revision ID: 38cc7cbc06ae
+Revises: 9ae6160f1024
+Create Date: 2026-10-17 19:20:11.402816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '38cc7cbc06ae'
+down_revision: Union[str, None] = '9ae6160f1024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_book_created_at', 'book', ['created_at'], unique=False)
+    op.create_index('ix_book_updated_at', 'book', ['updated_at'], unique=False)
+    op.create_index('ix_book_lease_log_created_at', 'book_lease_log', ['created_at'], unique=False)
+    op.create_index('ix_book_lease_log_returned_at', 'book_lease_log', ['returned_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_lease_log_returned_at', table_name='book_lease_log')
+    op.drop_index('ix_book_lease_log_created_at', table_name='book_lease_log')
+    op.drop_index('ix_book_updated_at', table_name='book')
+    op.drop_index('ix_book_created_at', table_name='book')
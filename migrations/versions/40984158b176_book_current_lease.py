@@ -0,0 +1,45 @@
+"""book current lease
+
+Revision ID: 40984158b176
+Revises: fc4313e602f6
+Create Date: 2026-10-17 17:50:10.914657
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '40984158b176'
+down_revision: Union[str, None] = 'fc4313e602f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('current_lease_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_book_current_lease_id', 'book_lease_log', ['current_lease_id'], ['id'], ondelete='SET NULL')
+
+    # Backfill: the current lease is the latest lease log when it is still open
+    op.execute(
+        """
+        UPDATE book SET current_lease_id = (
+            SELECT CASE WHEN l.returned_at IS NULL THEN l.id END
+            FROM book_lease_log AS l
+            WHERE l.book_id = book.id
+            ORDER BY l.created_at DESC, l.id DESC
+            LIMIT 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_book_current_lease_id', type_='foreignkey')
+        batch_op.drop_column('current_lease_id')
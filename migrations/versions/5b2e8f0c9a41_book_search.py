@@ -0,0 +1,62 @@
+"""book search
+
+Revision ID: 5b2e8f0c9a41
+Revises: 13bf2f651d62
+Create Date: 2026-10-17 18:40:12.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e8f0c9a41'
+down_revision: Union[str, None] = '13bf2f651d62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "CREATE VIRTUAL TABLE book_search USING fts5("
+        "title, author_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    op.execute(
+        'INSERT INTO book_search (rowid, title, author_name) '
+        'SELECT book.id, book.title, author.name FROM book JOIN author ON author.id = book.author_id'
+    )
+    op.execute(
+        'CREATE TRIGGER book_search_insert AFTER INSERT ON book BEGIN '
+        'INSERT INTO book_search (rowid, title, author_name) '
+        'SELECT new.id, new.title, author.name FROM author WHERE author.id = new.author_id; '
+        'END'
+    )
+    op.execute(
+        'CREATE TRIGGER book_search_update AFTER UPDATE OF title, author_id ON book BEGIN '
+        'DELETE FROM book_search WHERE rowid = old.id; '
+        'INSERT INTO book_search (rowid, title, author_name) '
+        'SELECT new.id, new.title, author.name FROM author WHERE author.id = new.author_id; '
+        'END'
+    )
+    op.execute(
+        'CREATE TRIGGER book_search_delete AFTER DELETE ON book BEGIN '
+        'DELETE FROM book_search WHERE rowid = old.id; '
+        'END'
+    )
+    op.execute(
+        'CREATE TRIGGER book_search_author_update AFTER UPDATE OF name ON author BEGIN '
+        'UPDATE book_search SET author_name = new.name '
+        'WHERE rowid IN (SELECT id FROM book WHERE author_id = new.id); '
+        'END'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER book_search_author_update')
+    op.execute('DROP TRIGGER book_search_delete')
+    op.execute('DROP TRIGGER book_search_update')
+    op.execute('DROP TRIGGER book_search_insert')
+    op.execute('DROP TABLE book_search')
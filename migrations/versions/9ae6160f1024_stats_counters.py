@@ -0,0 +1,62 @@
+"""stats counters
+
+Revision ID: 9ae6160f1024
+Revises: 5ea179097579
+Create Date: 2026-10-17 18:42:39.060057
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9ae6160f1024'
+down_revision: Union[str, None] = '5ea179097579'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('author_stats',
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('book_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], onupdate='CASCADE', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('author_id')
+    )
+    op.create_table('book_stats',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('lease_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['book.id'], onupdate='CASCADE', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+    op.create_index('ix_book_stats_lease_count', 'book_stats', ['lease_count', 'book_id'], unique=False)
+
+    # Backfill: the books of every author and the leases of every book,
+    # archived leases included
+    op.execute(
+        """
+        INSERT INTO author_stats (author_id, book_count)
+        SELECT author_id, COUNT(*) FROM book GROUP BY author_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO book_stats (book_id, lease_count)
+        SELECT book_id, COUNT(*) FROM (
+            SELECT book_id FROM book_lease_log
+            UNION ALL
+            SELECT book_id FROM book_lease_log_archive
+        )
+        GROUP BY book_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_stats_lease_count', table_name='book_stats')
+    op.drop_table('book_stats')
+    op.drop_table('author_stats')
@@ -0,0 +1,37 @@
+"""table versions
+
+Revision ID: b7d3e91f4c2a
+Revises: 38cc7cbc06ae
+Create Date: 2026-10-17 21:05:43.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e91f4c2a'
+down_revision: Union[str, None] = '38cc7cbc06ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    table_version = op.create_table('table_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # One row per table the list responses are cached by
+    op.bulk_insert(
+        table_version,
+        [{'name': name, 'version': 0} for name in ('author', 'book', 'book_lease_log')],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('table_version')
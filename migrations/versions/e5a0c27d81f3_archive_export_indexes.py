@@ -0,0 +1,30 @@
+"""archive export indexes
+
+Revision ID: e5a0c27d81f3
+Revises: b7d3e91f4c2a
+Create Date: 2026-10-17 21:48:17.530962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a0c27d81f3'
+down_revision: Union[str, None] = 'b7d3e91f4c2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_book_lease_log_archive_created_at', 'book_lease_log_archive', ['created_at'], unique=False)
+    op.create_index('ix_book_lease_log_archive_returned_at', 'book_lease_log_archive', ['returned_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_lease_log_archive_returned_at', table_name='book_lease_log_archive')
+    op.drop_index('ix_book_lease_log_archive_created_at', table_name='book_lease_log_archive')
@@ -43,7 +43,7 @@ def upgrade() -> None:
     sa.Column('user_id', sa.Integer(), nullable=False),
     sa.Column('created_at', sa.DateTime(), nullable=False),
     sa.Column('returned_at', sa.DateTime(), nullable=True),
-    sa.ForeignKeyConstraint(['book_id'], ['book.id'], onupdate='', ondelete='RESTRICT'),
+    sa.ForeignKeyConstraint(['book_id'], ['book.id'], onupdate='CASCADE', ondelete='RESTRICT'),
     sa.PrimaryKeyConstraint('id'),
     sa.UniqueConstraint('book_id', 'returned_at', name='_uq_book_lease_log')
     )
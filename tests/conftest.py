@@ -0,0 +1,163 @@
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from ct_library.container import Container
+from ct_library.main import app_factory
+from ct_library.settings import load_settings
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Transaction control, not counted against the query budgets
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+# Statements whose query plan is checked for full table scans
+EXPLAINED_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# Tables which must never be read by a full table scan
+GUARDED_TABLES = ("author", "book", "book_lease_log", "book_lease_log_archive")
+
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(?P<table>\w+)(?: AS \w+)?$")
+
+
+@contextmanager
+def capture_executions() -> Iterator[list[tuple[str, object, bool]]]:
+    """
+    Collect the SQL statements executed inside the block, on any engine: the
+    writer, the read-only engine and the engines of the async stack.
+    Transaction control statements are left out.
+    :return: List of (statement, parameters, executemany) tuples.
+    """
+    executions: list[tuple[str, object, bool]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if not statement.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            executions.append((statement, parameters, many))
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield executions
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[None]:
+    """
+    Fail when the block executes more than `max_queries` SQL statements, guards
+    the endpoints against N+1 regressions:
+
+        with assert_max_queries(1):
+            client.get("/books/")
+
+    :param max_queries: Maximal number of statements allowed.
+    """
+    with capture_executions() as executions:
+        yield
+    if len(executions) > max_queries:
+        executed = "\n".join(f"  {statement}" for statement, _, _ in executions)
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, {len(executions)} were "
+            f"executed:\n{executed}"
+        )
+
+
+def explain_query_plan(
+    connection: Connection, statement: str, parameters: object = ()
+) -> list[str]:
+    """
+    Run `EXPLAIN QUERY PLAN` (SQLite) for the statement.
+    :return: The `detail` column of every step of the plan.
+    """
+    result = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return [row.detail for row in result]
+
+
+def full_table_scans(plan: Sequence[str], tables: Sequence[str]) -> list[str]:
+    """
+    Steps of the plan which scan one of the tables without using an index.
+    """
+    return [
+        step
+        for step in plan
+        if (match := FULL_SCAN_RE.match(step)) and match["table"] in tables
+    ]
+
+
+@contextmanager
+def assert_no_full_scan(
+    engine: Engine, tables: Sequence[str] = GUARDED_TABLES
+) -> Iterator[None]:
+    """
+    Fail when any query executed inside the block, DML with a WHERE included,
+    reads one of the tables by a full table scan. The plans are explained
+    after the block, so every repository query can be checked by just running
+    it:
+
+        with assert_no_full_scan(engine):
+            book_repository.get_all(limit=10)
+
+    :param engine: The (SQLite) database engine the plans are explained on.
+    :param tables: Tables which must be read through an index.
+    """
+    with capture_executions() as executions:
+        yield
+
+    failures = []
+    with engine.connect() as connection:
+        for statement, parameters, many in executions:
+            if many or not statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                continue
+            plan = explain_query_plan(connection, statement, parameters)
+            if scans := full_table_scans(plan, tables):
+                failures.append(f"  {statement}\n    -> {', '.join(scans)}")
+    if failures:
+        raise AssertionError("Full table scan in:\n" + "\n".join(failures))
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch) -> str:
+    """
+    URL of a temporary database migrated to the head revision.
+    """
+    url = f"sqlite:///{tmp_path / 'test_database.db'}"
+    monkeypatch.setenv("CT_LIBRARY_PROFILE", "test")
+    monkeypatch.setenv("CT_LIBRARY_DB__URL", url)
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    command.upgrade(config, "head")
+    return url
+
+
+@pytest.fixture(params=["sync", "async"])
+def app(request, database_url, monkeypatch):
+    """
+    The app of the test profile on the temporary database, in both modes.
+    """
+    monkeypatch.setenv("CT_LIBRARY_MODE", request.param)
+    return app_factory(load_settings())
+
+
+@pytest.fixture
+def client(app) -> Iterator[TestClient]:
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def container(database_url) -> Iterator[Container]:
+    """
+    Container of the sync stack on the temporary database.
+    """
+    container = Container()
+    container.config.from_dict(load_settings().model_dump(mode="json"))
+    yield container
+    container.db_engine().dispose()
+    container.db_read_engine().dispose()
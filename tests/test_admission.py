@@ -0,0 +1,150 @@
+"""
+Admission control: a request beyond the budget of its kind and its queue is
+rejected with 503, the reads and the writes do not share their budgets.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+RETRY_AFTER = 7
+
+
+@pytest.fixture(autouse=True)
+def admission(monkeypatch):
+    """
+    The test profile turns admission control off, these tests turn it on with
+    one running and one waiting request per budget.
+    """
+    for name, value in {
+        "ENABLED": "true",
+        "READ_LIMIT": "1",
+        "WRITE_LIMIT": "1",
+        "READ_QUEUE_SIZE": "1",
+        "WRITE_QUEUE_SIZE": "1",
+        "QUEUE_TIMEOUT": "30",
+        "RETRY_AFTER": str(RETRY_AFTER),
+    }.items():
+        monkeypatch.setenv(f"CT_LIBRARY_ADMISSION__{name}", value)
+
+
+class HeldRequest:
+    """
+    A request sent to the app in its event loop, its response is held back
+    until `release`, so the request keeps its place in the budget.
+    """
+
+    def __init__(self, client, method: str, path: str, body: bytes = b""):
+        self.client = client
+        self.started = threading.Event()
+        self.status_code: int | None = None
+        self._release = asyncio.Event()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        self.done: Future = client.portal.start_task_soon(
+            client.app, scope, self._receive(body), self._send
+        )
+
+    @staticmethod
+    def _receive(body: bytes):
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait()
+
+        return receive
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            self.status_code = message["status"]
+            self.started.set()
+            await self._release.wait()
+
+    def release(self) -> int:
+        self.client.portal.call(self._release.set)
+        self.done.result(timeout=5)
+        return self.status_code
+
+
+def metric(client, name: str, **labels) -> float:
+    selector = ",".join(f'{label}="{value}"' for label, value in labels.items())
+    prefix = f"{name}{{{selector}}} "
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(prefix):
+            return float(line.removeprefix(prefix))
+    raise AssertionError(f"{prefix} not found in the metrics")
+
+
+def wait_for_queue(client, budget: str, depth: int) -> None:
+    deadline = time.monotonic() + 5
+    while metric(client, "admission_queue_depth", budget=budget) != depth:
+        assert time.monotonic() < deadline, "The request did not reach the queue"
+        time.sleep(0.01)
+
+
+def send(client, method: str):
+    if method == "GET":
+        return client.get("/authors/")
+    return client.post("/authors/", json={"name": "Karel Čapek"})
+
+
+@pytest.mark.parametrize(
+    "budget, method, other_method",
+    [("read", "GET", "POST"), ("write", "POST", "GET")],
+)
+def test_full_budget_rejects(client, budget, method, other_method):
+    body = b'{"name": "Jaroslav Ha\xc5\xa1ek"}' if method == "POST" else b""
+    running = HeldRequest(client, method, "/authors/", body)
+    assert running.started.wait(timeout=5)
+    waiting = HeldRequest(client, method, "/authors/", body)
+    wait_for_queue(client, budget, 1)
+
+    # The budget runs one request and queues one, the next one is rejected
+    response = send(client, method)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(RETRY_AFTER)
+    assert (
+        response.json()["detail"]
+        == f"Server overloaded ({budget} queue_full), retry later"
+    )
+    # The other budget is not affected
+    assert send(client, other_method).status_code in (200, 201)
+    assert metric(client, "admission_active_requests", budget=budget) == 1
+    assert (
+        metric(client, "admission_rejected_total", budget=budget, reason="queue_full")
+        == 1
+    )
+    other = "write" if budget == "read" else "read"
+    assert (
+        metric(client, "admission_rejected_total", budget=other, reason="queue_full")
+        == 0
+    )
+
+    # The queued request runs once the running one is done
+    assert running.release() in (200, 201)
+    assert waiting.started.wait(timeout=5)
+    assert waiting.release() in (200, 201)
+    assert metric(client, "admission_queue_depth", budget=budget) == 0
+    assert metric(client, "admission_active_requests", budget=budget) == 0
@@ -0,0 +1,136 @@
+"""
+Batch lease and return: every book gets the status code of the single book
+endpoint, and the batch is written in one transaction.
+"""
+
+import pytest
+
+USER = {"user-id": "1"}
+OTHER_USER = {"user-id": "2"}
+
+
+@pytest.fixture
+def book_ids(client) -> list[int]:
+    author = client.post("/authors/", json={"name": "Karel Čapek"}).json()
+    path = f"/authors/{author['id']}/books/"
+    return [
+        client.post(path, json={"title": title}).json()["id"]
+        for title in ("R.U.R.", "Krakatit", "Válka s mloky")
+    ]
+
+
+def batch(client, book_ids, action: str, headers=USER, **body) -> list[dict]:
+    response = client.post(
+        "/leases/batch",
+        json={"book_ids": book_ids, "action": action, **body},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def statuses(results: list[dict]) -> list[tuple[int, int]]:
+    return [(result["book_id"], result["status_code"]) for result in results]
+
+
+def availability(client, book_ids) -> list[bool]:
+    return [client.get(f"/books/{book_id}").json()["available"] for book_id in book_ids]
+
+
+def test_lease_and_return(client, book_ids):
+    leased = batch(client, book_ids, "lease")
+
+    assert statuses(leased) == [(book_id, 201) for book_id in book_ids]
+    assert all(result["lease"]["returned_at"] is None for result in leased)
+    assert availability(client, book_ids) == [False] * 3
+
+    returned = batch(client, book_ids, "return")
+
+    assert statuses(returned) == [(book_id, 200) for book_id in book_ids]
+    assert [result["lease"]["id"] for result in returned] == [
+        result["lease"]["id"] for result in leased
+    ]
+    assert availability(client, book_ids) == [True] * 3
+
+
+def test_another_users_book(client, book_ids):
+    batch(client, book_ids[:1], "lease", headers=OTHER_USER)
+
+    for action in ("lease", "return"):
+        (result,) = batch(client, book_ids[:1], action)
+        assert result["status_code"] == 403
+        assert result["lease"] is None
+
+    assert availability(client, book_ids[:1]) == [False]
+
+
+def test_leased_book(client, book_ids):
+    batch(client, book_ids[:1], "lease")
+
+    (result,) = batch(client, book_ids[:1], "lease")
+
+    assert result["status_code"] == 409
+    assert "already leased" in result["detail"]
+
+
+def test_returned_book(client, book_ids):
+    (result,) = batch(client, book_ids[:1], "return")
+
+    assert result["status_code"] == 409
+    assert "not leased" in result["detail"]
+
+
+def test_unknown_book(client, book_ids):
+    (result,) = batch(client, [max(book_ids) + 1], "lease")
+
+    assert result == {
+        "book_id": max(book_ids) + 1,
+        "status_code": 404,
+        "lease": None,
+        "detail": "Book not found",
+    }
+
+
+def test_mixed_batch(client, book_ids):
+    leased, other, available = book_ids
+    batch(client, [leased], "lease")
+    batch(client, [other], "lease", headers=OTHER_USER)
+    unknown = max(book_ids) + 1
+
+    # Duplicates are leased once, the results keep the requested order
+    results = batch(client, [unknown, leased, other, available, available], "lease")
+
+    assert statuses(results) == [
+        (unknown, 404),
+        (leased, 409),
+        (other, 403),
+        (available, 201),
+    ]
+    # The failures do not stop the available book
+    assert availability(client, book_ids) == [False, False, False]
+
+
+def test_failed_write_rolls_the_batch_back(client, book_ids):
+    first, second, _ = book_ids
+    returned_at = "2020-01-01T00:00:00"
+    batch(client, [first], "lease")
+    batch(client, [first], "return", returned_at=returned_at)
+    batch(client, [first, second], "lease")
+
+    # The lease of the first book can not be closed at the time of its
+    # previous one (unique book_id, returned_at), the save of the batch fails
+    response = client.post(
+        "/leases/batch",
+        json={
+            "book_ids": [second, first],
+            "action": "return",
+            "returned_at": returned_at,
+        },
+        headers=USER,
+    )
+
+    assert response.status_code == 409
+    # Neither book is returned, the lease of the second one is still open
+    assert availability(client, [first, second]) == [False, False]
+    (lease,) = client.get(f"/books/{second}/leases/").json()
+    assert lease["returned_at"] is None
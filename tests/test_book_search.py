@@ -0,0 +1,157 @@
+"""
+Full-text book search: prefix matching of every word, ranking, the `available`
+filter and the triggers keeping the FTS5 index in sync with the books.
+"""
+
+import pytest
+from sqlalchemy import update
+
+from ct_library.models import Author, Book
+from ct_library.pagination import NEXT_CURSOR_HEADER
+from ct_library.serializers import (
+    AuthorInSerializer,
+    BookInSerializer,
+    BookSearchParams,
+)
+
+USER = {"user-id": "1"}
+
+
+@pytest.fixture
+def books(client) -> dict[str, int]:
+    """
+    IDs of the books by title.
+    """
+    capek = client.post("/authors/", json={"name": "Karel Čapek"}).json()["id"]
+    other = client.post("/authors/", json={"name": "Jan Novák"}).json()["id"]
+    titles = {
+        "Krakatit": capek,
+        "Válka s mloky": capek,
+        "Čapek a jeho mloci": other,
+        "Krakonoš": other,
+    }
+    return {
+        title: client.post(
+            f"/authors/{author_id}/books/", json={"title": title}
+        ).json()["id"]
+        for title, author_id in titles.items()
+    }
+
+
+def search(client, q: str, **params) -> list[str]:
+    response = client.get("/books/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [book["title"] for book in response.json()]
+
+
+def test_every_word_matches_as_prefix(client, books):
+    assert set(search(client, "krak")) == {"Krakatit", "Krakonoš"}
+    assert search(client, "krakat") == ["Krakatit"]
+    # Prefixes only, and every word has to match
+    assert search(client, "akatit") == []
+    assert search(client, "krak capek") == ["Krakatit"]
+
+
+def test_diacritics_and_operators_are_ignored(client, books):
+    assert search(client, "valka") == ["Válka s mloky"]
+    # Unbalanced quotes and FTS5 operators would be syntax errors
+    assert search(client, '"mloky') == ["Válka s mloky"]
+    assert search(client, "NOT mloky") == []
+    assert search(client, "--") == []
+
+
+def test_title_matches_rank_first(client, books):
+    # A match in the title outranks the matches in the author's name
+    assert search(client, "capek")[0] == "Čapek a jeho mloci"
+    assert set(search(client, "capek")) == {
+        "Čapek a jeho mloci",
+        "Krakatit",
+        "Válka s mloky",
+    }
+
+
+def test_available_filter(client, books):
+    client.put(f"/books/{books['Krakatit']}/leases/", json={}, headers=USER)
+
+    assert "Krakatit" not in search(client, "capek", available=True)
+    assert search(client, "capek", available=False) == ["Krakatit"]
+    assert search(client, "krak", available=False) == ["Krakatit"]
+
+
+def test_pages_of_available_books(client, books):
+    client.put(f"/books/{books['Krakatit']}/leases/", json={}, headers=USER)
+    expected = search(client, "capek", available=True)
+
+    titles, cursor = [], None
+    while True:
+        params = {"q": "capek", "available": True, "limit": 1}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get("/books/search", params=params)
+        titles += [book["title"] for book in response.json()]
+        if (cursor := response.headers.get(NEXT_CURSOR_HEADER)) is None:
+            break
+
+    assert titles == expected
+    assert len(titles) == 2
+
+
+def service_search(container, q: str) -> list[str]:
+    page = container.book_service().search(BookSearchParams(q=q))
+    return [book.title for book in page.items]
+
+
+@pytest.fixture
+def karel(container) -> tuple[int, int]:
+    """
+    IDs of an author and of a book of the author.
+    """
+    author = container.author_service().create(AuthorInSerializer(name="Karel Čapek"))
+    book = container.book_service().create(
+        BookInSerializer(title="Továrna na absolutno"), author.id
+    )
+    return author.id, book.id
+
+
+def test_title_update_is_indexed(container, karel):
+    _, book_id = karel
+    with container.db_engine().begin() as connection:
+        connection.execute(
+            update(Book).where(Book.id == book_id).values(title="Krakatit")
+        )
+
+    assert service_search(container, "krakatit") == ["Krakatit"]
+    assert service_search(container, "tovarna") == []
+
+
+def test_author_update_is_indexed(container, karel):
+    author_id, _ = karel
+    with container.db_engine().begin() as connection:
+        connection.execute(
+            update(Author).where(Author.id == author_id).values(name="Josef Čapek")
+        )
+
+    assert service_search(container, "josef") == ["Továrna na absolutno"]
+    assert service_search(container, "karel") == []
+
+
+def test_new_author_of_book_is_indexed(container, karel):
+    _, book_id = karel
+    author = container.author_service().create(AuthorInSerializer(name="Josef Čapek"))
+    with container.db_engine().begin() as connection:
+        connection.execute(
+            update(Book).where(Book.id == book_id).values(author_id=author.id)
+        )
+
+    assert service_search(container, "josef") == ["Továrna na absolutno"]
+    assert service_search(container, "karel") == []
+
+
+def test_deleted_book_is_removed(container, karel):
+    _, book_id = karel
+    container.book_service().delete_by_id(book_id)
+
+    assert service_search(container, "capek") == []
+    with container.db_engine().connect() as connection:
+        rows = connection.exec_driver_sql("SELECT count(*) FROM book_search")
+        assert rows.scalar() == 0
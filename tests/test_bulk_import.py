@@ -0,0 +1,107 @@
+"""
+NDJSON bulk import: invalid lines are reported with their line numbers and do
+not stop the valid ones, batches are inserted one by one.
+"""
+
+import json
+from typing import Iterator
+
+from conftest import capture_executions
+
+
+def inserts(executions, table: str) -> int:
+    return sum(
+        statement.startswith(f"INSERT INTO {table} ") for statement, _, _ in executions
+    )
+
+
+def test_invalid_lines_are_reported(client):
+    body = b"\n".join(
+        [
+            b'{"name": "Karel \xc4\x8capek"}',
+            b'{"name": "Jaroslav Ha',
+            b"",
+            b'{"title": "R.U.R."}',
+            b'{"name": ["Bo\xc5\xbeena N\xc4\x9bmcov\xc3\xa1"]}',
+            b'{"name": "Jaroslav Ha\xc5\xa1ek"}',
+        ]
+    )
+
+    result = client.post("/authors/bulk", content=body).json()
+
+    assert (result["created"], result["failed"]) == (2, 3)
+    # The empty third line is skipped but counted
+    assert [error["line"] for error in result["errors"]] == [2, 4, 5]
+    assert result["errors"][0]["error"].startswith("Invalid JSON")
+    assert result["errors"][1]["error"] == "name: Field required"
+    assert result["errors"][2]["error"] == "name: Input should be a valid string"
+    names = [author["name"] for author in client.get("/authors/").json()]
+    assert names == ["Jaroslav Hašek", "Karel Čapek"]
+
+
+def test_books_of_missing_authors_are_reported(client):
+    author_id = client.post("/authors/", json={"name": "Karel Čapek"}).json()["id"]
+    lines = [
+        {"title": "R.U.R.", "author_id": author_id},
+        {"title": "Osudy dobrého vojáka Švejka", "author_id": author_id + 1},
+        {"title": "Krakatit", "author_id": author_id},
+    ]
+    body = "\n".join(map(json.dumps, lines)).encode()
+
+    with capture_executions() as executions:
+        result = client.post("/books/bulk", content=body).json()
+
+    assert (result["created"], result["failed"]) == (2, 1)
+    assert result["errors"] == [
+        {"line": 2, "error": f"Author {author_id + 1} does not exist"}
+    ]
+    # The authors of the batch are checked with one query
+    author_checks = [
+        statement
+        for statement, _, _ in executions
+        if statement.startswith("SELECT author.id")
+    ]
+    assert len(author_checks) == 1
+    titles = {book["title"] for book in client.get("/books/").json()}
+    assert titles == {"R.U.R.", "Krakatit"}
+    # The counters only count the created books
+    (stats,) = client.get("/stats/authors").json()
+    assert stats["book_count"] == 2
+
+
+def test_batches(client):
+    lines = [{"name": f"Author {i}"} for i in range(5)]
+    lines[3] = {"name": None}
+    body = "\n".join(map(json.dumps, lines)).encode()
+
+    with capture_executions() as executions:
+        result = client.post("/authors/bulk?batch_size=2", content=body).json()
+
+    assert (result["created"], result["failed"]) == (4, 1)
+    # Line numbers count across the batches
+    assert [error["line"] for error in result["errors"]] == [4]
+    # Batches [1, 2], [3, 4] and the partial [5], one insert each
+    assert inserts(executions, "author") == 3
+    assert len(client.get("/authors/").json()) == 4
+
+
+def test_batch_of_invalid_lines_inserts_nothing(client):
+    body = b'{"name": "Karel \xc4\x8capek"}\n{}\n{}\n'
+
+    with capture_executions() as executions:
+        result = client.post("/authors/bulk?batch_size=1", content=body).json()
+
+    assert (result["created"], result["failed"]) == (1, 2)
+    assert inserts(executions, "author") == 1
+
+
+def test_lines_split_across_chunks(client):
+    def chunks() -> Iterator[bytes]:
+        # Lines split within and between the chunks, no trailing newline
+        yield b'{"name": "Karel'
+        yield b' \xc4\x8capek"}\n{"na'
+        yield b'me": "Jaroslav Ha\xc5\xa1ek"}'
+
+    result = client.post("/authors/bulk?batch_size=1", content=chunks()).json()
+
+    assert (result["created"], result["failed"]) == (2, 0)
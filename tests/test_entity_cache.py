@@ -0,0 +1,86 @@
+"""
+The in-process entity cache serves the Book and Author details until a
+committed write changes them.
+"""
+
+import pytest
+
+from ct_library.cache import entity_key
+from ct_library.models import Author, Book
+from ct_library.serializers import (
+    AuthorInSerializer,
+    BookInSerializer,
+    BookLeaseLogInSerializer,
+)
+
+USER = {"user-id": "1"}
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    """
+    The test profile turns the entity cache off, these tests turn it on.
+    """
+    monkeypatch.setenv("CT_LIBRARY_CACHE__BACKEND", "memory")
+
+
+@pytest.fixture
+def book_id(client) -> int:
+    author = client.post("/authors/", json={"name": "Karel Čapek"}).json()
+    book = client.post(f"/authors/{author['id']}/books/", json={"title": "R.U.R."})
+    return book.json()["id"]
+
+
+def is_cached(client, model: type, entity_id: int) -> bool:
+    cache = client.app.container.entity_cache()
+    return cache.get(entity_key(model, entity_id)) is not None
+
+
+def test_lease_and_return_evict_the_book(client, book_id):
+    assert client.get(f"/books/{book_id}").json()["available"] is True
+    assert is_cached(client, Book, book_id)
+
+    for status_code, available in ((201, False), (200, True)):
+        response = client.put(f"/books/{book_id}/leases/", json={}, headers=USER)
+        assert response.status_code == status_code
+        assert not is_cached(client, Book, book_id)
+        assert client.get(f"/books/{book_id}").json()["available"] is available
+
+
+def test_batch_lease_evicts_the_books(client, book_id):
+    assert client.get(f"/books/{book_id}").json()["available"] is True
+
+    response = client.post(
+        "/leases/batch", json={"book_ids": [book_id], "action": "lease"}, headers=USER
+    )
+
+    assert response.json()[0]["status_code"] == 201
+    assert client.get(f"/books/{book_id}").json()["available"] is False
+
+
+def test_delete_evicts_the_author(client):
+    author_id = client.post("/authors/", json={"name": "Jaroslav Hašek"}).json()["id"]
+    assert client.get(f"/authors/{author_id}").status_code == 200
+    assert is_cached(client, Author, author_id)
+
+    assert client.delete(f"/authors/{author_id}").status_code == 204
+
+    assert not is_cached(client, Author, author_id)
+    assert client.get(f"/authors/{author_id}").status_code == 404
+
+
+def test_rolled_back_write_leaves_the_cache_alone(container):
+    author = container.author_service().create(AuthorInSerializer(name="Karel Čapek"))
+    book_service = container.book_service()
+    book_id = book_service.create(BookInSerializer(title="R.U.R."), author.id).id
+    assert book_service.get_by_id(book_id).available is True
+
+    with pytest.raises(RuntimeError), container.unit_of_work().scope(write=True):
+        container.book_lease_log_service().lease_or_return_book(
+            book_id, 1, BookLeaseLogInSerializer()
+        )
+        # Read in the transaction of the lease, which is never committed
+        assert book_service.get_by_id(book_id).available is False
+        raise RuntimeError
+
+    assert book_service.get_by_id(book_id).available is True
@@ -0,0 +1,31 @@
+"""
+Incremental exports hold the rows created or changed after `since`.
+"""
+
+import json
+from datetime import datetime, timezone
+
+USER = {"user-id": "1"}
+
+
+def exported(client, path: str, since: datetime) -> list[dict]:
+    response = client.get(path, params={"since": since.isoformat()})
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_leased_books_are_exported_again(client):
+    author = client.post("/authors/", json={"name": "Karel Čapek"}).json()
+    books = [
+        client.post(f"/authors/{author['id']}/books/", json={"title": title}).json()
+        for title in ("R.U.R.", "Krakatit")
+    ]
+    since = datetime.now(timezone.utc)
+    assert exported(client, "/books/export", since) == []
+
+    # The lease and the return change the availability of the book
+    path = f"/books/{books[0]['id']}/leases/"
+    for available in (False, True):
+        client.put(path, json={}, headers=USER)
+        (book,) = exported(client, "/books/export", since)
+        assert (book["id"], book["available"]) == (books[0]["id"], available)
+        assert book["updated_at"] > since.replace(tzinfo=None).isoformat()
@@ -0,0 +1,77 @@
+"""
+The Accept and Accept-Encoding headers are parsed by `quality_values`, the
+media type and the compression of the responses follow them.
+"""
+
+import pytest
+
+from ct_library.compression import accepted_encodings
+from ct_library.negotiation import quality_values
+from ct_library.serializers import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+
+
+def test_quality_values():
+    assert quality_values("Zstd, gzip;q=0.8 , br; q=0, deflate;q=x,, gzip") == {
+        "zstd": 1.0,
+        "gzip": 1.0,
+        "br": 0.0,
+        "deflate": 0.0,
+    }
+    assert quality_values("") == {}
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("zstd;q=0, gzip;q=0.5, identity") == {"gzip", "identity"}
+
+
+@pytest.mark.parametrize(
+    "accept, media_type",
+    [
+        ("application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/json, application/msgpack;q=0.9", JSON_MEDIA_TYPE),
+        ("application/x-msgpack, */*;q=0.1", MSGPACK_MEDIA_TYPE),
+        ("application/msgpack;q=0.5, application/*", JSON_MEDIA_TYPE),
+        ("text/html", JSON_MEDIA_TYPE),
+    ],
+)
+def test_negotiated_media_type(client, accept, media_type):
+    response = client.get("/authors/", headers={"Accept": accept})
+    assert response.headers["content-type"].startswith(media_type)
+
+
+@pytest.fixture
+def authors(client) -> None:
+    # Enough authors for a list above the minimum size of the compression
+    response = client.post(
+        "/authors/bulk",
+        content=b"\n".join(b'{"name": "Author %d"}' % i for i in range(50)),
+    )
+    assert response.json()["created"] == 50
+
+
+@pytest.mark.parametrize(
+    "encoding, path, content_encoding, weak",
+    [
+        ("gzip", "/authors/", "gzip", True),
+        ("zstd", "/authors/", "zstd", True),
+        # Below the minimum size the negotiated encoding still weakens the tag
+        ("gzip", "/authors/?limit=1", None, True),
+        ("identity", "/authors/", None, False),
+    ],
+)
+def test_conditional_request(client, authors, encoding, path, content_encoding, weak):
+    headers = {"Accept-Encoding": encoding}
+    response = client.get(path, headers=headers)
+    etag = response.headers["etag"]
+
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == content_encoding
+    assert etag.startswith("W/") is weak
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    # The 304 carries the tag and the Vary header of the 200
+    response = client.get(path, headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert "Accept-Encoding" in response.headers["vary"]
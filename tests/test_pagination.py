@@ -0,0 +1,117 @@
+"""
+Keyset pagination of the lists, the pages are walked through `X-Next-Cursor`.
+"""
+
+import pytest
+
+from ct_library.pagination import MAX_PAGE_LIMIT, NEXT_CURSOR_HEADER, encode_cursor
+
+USER = {"user-id": "1"}
+
+
+def walk(client, path: str, **params) -> list[list[dict]]:
+    """
+    Read every page of the list.
+    :return: The items of the pages, in order.
+    """
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(
+            path, params=params | ({"cursor": cursor} if cursor else {})
+        )
+        assert response.status_code == 200
+        pages.append(response.json())
+        if (cursor := response.headers.get(NEXT_CURSOR_HEADER)) is None:
+            return pages
+
+
+@pytest.fixture
+def author_id(client) -> int:
+    """
+    An author with books of repeated titles, every third one leased.
+    """
+    author = client.post("/authors/", json={"name": "Karel Čapek"}).json()
+    for i in range(7):
+        title = ("R.U.R.", "Krakatit", "Válka s mloky")[i % 3]
+        book = client.post(f"/authors/{author['id']}/books/", json={"title": title})
+        if i % 3 == 0:
+            client.put(f"/books/{book.json()['id']}/leases/", json={}, headers=USER)
+    return author["id"]
+
+
+def test_book_pages_follow_title_and_id(client, author_id):
+    pages = walk(client, "/books/", limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    books = [book for page in pages for book in page]
+    # Ties on the title are ordered by the id, no book is skipped or repeated
+    assert [(book["title"], book["id"]) for book in books] == sorted(
+        (book["title"], book["id"]) for book in books
+    )
+    assert len({book["id"] for book in books}) == 7
+
+
+@pytest.mark.parametrize("available, count", [(True, 4), (False, 3)])
+def test_available_filter_holds_across_pages(client, author_id, available, count):
+    pages = walk(client, "/books/", limit=2, available=available)
+
+    books = [book for page in pages for book in page]
+    assert all(book["available"] is available for book in books)
+    assert len({book["id"] for book in books}) == count
+    assert books == sorted(books, key=lambda book: (book["title"], book["id"]))
+
+
+def test_author_pages(client, author_id):
+    for name in ("Jaroslav Hašek", "Božena Němcová", "Jaroslav Hašek"):
+        client.post("/authors/", json={"name": name})
+
+    pages = walk(client, "/authors/", limit=3)
+
+    assert [len(page) for page in pages] == [3, 1]
+    authors = [author for page in pages for author in page]
+    assert [(author["name"], author["id"]) for author in authors] == sorted(
+        (author["name"], author["id"]) for author in authors
+    )
+    assert len({author["id"] for author in authors}) == 4
+
+
+def test_lease_history_pages(client, author_id):
+    book_id = client.get("/books/", params={"limit": 1}).json()[0]["id"]
+    # Leased and returned twice, one log per lease
+    for _ in range(4):
+        client.put(f"/books/{book_id}/leases/", json={}, headers=USER)
+    (history,) = walk(client, f"/books/{book_id}/leases/")
+
+    pages = walk(client, f"/books/{book_id}/leases/", limit=1)
+
+    assert [len(page) for page in pages] == [1] * len(history)
+    assert [lease for page in pages for lease in page] == history
+
+
+def test_last_full_page_has_no_cursor(client, author_id):
+    response = client.get("/books/", params={"limit": 7})
+
+    assert len(response.json()) == 7
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.parametrize("limit", [0, -1, MAX_PAGE_LIMIT + 1])
+def test_limit_out_of_bounds(client, limit):
+    assert client.get("/books/", params={"limit": limit}).status_code == 422
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not-a-cursor",
+        encode_cursor("R.U.R."),
+        encode_cursor("R.U.R.", "one"),
+        encode_cursor("R.U.R.", 1)[:-2],
+    ],
+)
+def test_tampered_cursor(client, author_id, cursor):
+    response = client.get("/books/", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid pagination cursor"}
@@ -0,0 +1,165 @@
+"""
+Statement budgets of the endpoints, run in the sync and the async mode.
+Transaction control (BEGIN, COMMIT) is not counted. Every write bumps the table
+versions and every list reads them (`versioning.TableVersions`).
+"""
+
+import pytest
+from conftest import assert_max_queries
+
+USER = {"user-id": "1"}
+
+
+@pytest.fixture
+def library(client) -> dict[str, int]:
+    """
+    An author with two books, the first one leased and returned once.
+    """
+    author = client.post("/authors/", json={"name": "Frank Herbert"}).json()
+    books = [
+        client.post(f"/authors/{author['id']}/books/", json={"title": title}).json()
+        for title in ("Dune", "Dune Messiah")
+    ]
+    for _ in range(2):
+        client.put(f"/books/{books[0]['id']}/leases/", json={}, headers=USER)
+    return {"author_id": author["id"], "book_id": books[0]["id"]}
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/books/",
+        "/books/?available=true&fields=id,title",
+        "/books/search?q=dun",
+        "/authors/",
+        "/stats/authors",
+        "/stats/books/top",
+    ],
+)
+def test_list_reads_once(client, library, path):
+    # Table versions and the list
+    with assert_max_queries(2):
+        response = client.get(path)
+    assert response.status_code == 200
+
+    # Served from the list response cache, only the versions are read
+    with assert_max_queries(1):
+        assert client.get(path).status_code == 200
+
+
+def test_lease_analytics_is_not_cached(client, library):
+    # The ages of the open leases depend on the time of the request, every
+    # request computes them and gets no ETag to revalidate
+    for _ in range(2):
+        with assert_max_queries(1):
+            response = client.get("/analytics/leases")
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+
+
+@pytest.mark.parametrize("query", ["", "?full_history=true"])
+def test_lease_history_reads_once(client, library, query):
+    with assert_max_queries(1):
+        response = client.get(f"/books/{library['book_id']}/leases/{query}")
+    assert len(response.json()) == 1
+
+
+def test_book_detail_reads_once(client, library):
+    with assert_max_queries(1):
+        response = client.get(f"/books/{library['book_id']}?fields=id,available")
+    assert response.json() == {"id": library["book_id"], "available": True}
+
+
+def test_author_detail_reads_once(client, library):
+    with assert_max_queries(1):
+        response = client.get(f"/authors/{library['author_id']}")
+    assert response.json()["name"] == "Frank Herbert"
+
+
+def test_books_by_author_reads_once(client, library):
+    with assert_max_queries(1):
+        response = client.get(f"/authors/{library['author_id']}/books/")
+    assert len(response.json()) == 2
+
+
+@pytest.mark.parametrize("path", ["/books/export", "/leases/export"])
+def test_export_reads_once(client, library, path):
+    with assert_max_queries(1):
+        response = client.get(path)
+    assert response.status_code == 200
+
+
+def test_create_author(client):
+    # The insert and the version bump, the response is built from the flushed
+    # author
+    with assert_max_queries(2):
+        response = client.post("/authors/", json={"name": "Ursula K. Le Guin"})
+    assert response.status_code == 201
+
+
+def test_create_book(client, library):
+    # Author lookup, insert, the author's book counter and the version bump
+    with assert_max_queries(4):
+        response = client.post(
+            f"/authors/{library['author_id']}/books/", json={"title": "Children"}
+        )
+    assert response.status_code == 200
+
+
+def test_delete_author(client, library):
+    author = client.post("/authors/", json={"name": "Anonymous"}).json()
+    with assert_max_queries(3):
+        response = client.delete(f"/authors/{author['id']}")
+    assert response.status_code == 204
+
+
+def test_lease_and_return(client, library):
+    path = f"/books/{library['book_id']}/leases/"
+    # Book with its current lease, insert, current lease of the book, the
+    # book's lease counter and the version bump; no refresh of the written rows
+    with assert_max_queries(5):
+        response = client.put(path, json={}, headers=USER)
+    assert response.status_code == 201
+
+    # Book with its current lease, update of the lease and of the book, the
+    # version bump
+    with assert_max_queries(4):
+        response = client.put(path, json={}, headers=USER)
+    assert response.status_code == 200
+
+
+def test_batch_lease(client, library):
+    books = [library["book_id"], library["book_id"] + 1]
+    # Books with their current leases, an insert per lease, one update of the
+    # books, one of the lease counters and the version bump
+    with assert_max_queries(4 + len(books)):
+        response = client.post(
+            "/leases/batch", json={"book_ids": books, "action": "lease"}, headers=USER
+        )
+    assert [result["status_code"] for result in response.json()] == [201, 201]
+
+
+def test_bulk_import_authors(client):
+    body = b'{"name": "Isaac Asimov"}\n{"name": "Arthur C. Clarke"}\n'
+    # One insert per batch and the version bump
+    with assert_max_queries(2):
+        response = client.post("/authors/bulk", content=body)
+    assert response.json()["created"] == 2
+
+
+def test_bulk_import_books(client, library):
+    body = b"".join(
+        b'{"title": "%s", "author_id": %d}\n' % (title, library["author_id"])
+        for title in (b"Heretics", b"Chapterhouse")
+    )
+    # Author check, insert and the book counters, once per batch, and the
+    # version bump
+    with assert_max_queries(4):
+        response = client.post("/books/bulk", content=body)
+    assert response.json()["created"] == 2
+
+
+@pytest.mark.parametrize("path", ["/", "/metrics"])
+def test_no_queries(client, path):
+    with assert_max_queries(0):
+        assert client.get(path).status_code == 200
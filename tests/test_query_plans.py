@@ -0,0 +1,141 @@
+"""
+Every repository query runs through `assert_no_full_scan` on a database
+migrated to the head revision, so a missing or unusable index fails here.
+
+The full exports and the analytics of the whole history read every row by
+design, only their filtered variants are guarded.
+"""
+
+import datetime
+
+import pytest
+from conftest import assert_no_full_scan
+from sqlalchemy import insert
+
+from ct_library.models import Author, Book, BookLeaseLog
+
+SINCE = datetime.datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def engine(container):
+    """
+    The writer engine, seeded with two authors, their books and a lease
+    history partly older than `SINCE`.
+    """
+    engine = container.db_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Author), [{"name": "Karel Čapek"}, {"name": "Jaroslav Hašek"}]
+        )
+        connection.execute(
+            insert(Book),
+            [{"title": f"Book {i}", "author_id": i % 2 + 1} for i in range(20)],
+        )
+        connection.execute(
+            insert(BookLeaseLog),
+            [
+                {
+                    "book_id": i % 20 + 1,
+                    "user_id": 1,
+                    "created_at": SINCE + datetime.timedelta(days=i - 20),
+                    "returned_at": SINCE + datetime.timedelta(days=i - 19),
+                }
+                for i in range(40)
+            ],
+        )
+    return engine
+
+
+@pytest.mark.parametrize("after", [None, ("Book 3", 4)])
+def test_book_list(container, engine, after):
+    with assert_no_full_scan(engine):
+        container.book_repository().get_all(after=after, limit=10)
+
+
+@pytest.mark.parametrize("available", [True, False])
+@pytest.mark.parametrize("after", [None, ("Book 3", 4)])
+def test_book_filter_by_availability(container, engine, available, after):
+    with assert_no_full_scan(engine):
+        container.book_repository().filter_by_availability(
+            available, after=after, limit=10
+        )
+
+
+@pytest.mark.parametrize("available", [None, True, False])
+def test_book_search(container, engine, available):
+    with assert_no_full_scan(engine):
+        container.book_repository().search('"book"*', available=available)
+
+
+def test_book_detail(container, engine):
+    repository = container.book_repository()
+    with assert_no_full_scan(engine):
+        repository.get_by_id(1)
+        repository.get_by_id(2, fields=["id", "available"])
+        repository.get_with_current_lease(1)
+        repository.get_with_current_leases([1, 2, 3])
+        repository.get_by_author_id(1)
+
+
+@pytest.mark.parametrize("after", [None, ("Jaroslav Hašek", 2)])
+def test_author_list(container, engine, after):
+    with assert_no_full_scan(engine):
+        container.author_repository().get_all(after=after, limit=10)
+
+
+@pytest.mark.parametrize("full_history", [False, True])
+@pytest.mark.parametrize("after", [None, (SINCE, 30)])
+def test_lease_history(container, engine, full_history, after):
+    with assert_no_full_scan(engine):
+        container.book_lease_log_repository().get_by_book_id(
+            1, after=after, full_history=full_history
+        )
+
+
+def test_stats(container, engine):
+    repository = container.stats_repository()
+    with assert_no_full_scan(engine):
+        repository.get_author_stats(limit=10)
+        repository.get_author_stats(after=("Jaroslav Hašek", 2), limit=10)
+        repository.get_top_books(limit=10)
+
+
+def test_analytics_of_a_range(container, engine):
+    repository = container.book_lease_log_repository()
+    with assert_no_full_scan(engine):
+        list(repository.stream_lease_times(since=SINCE))
+        list(repository.stream_lease_times(SINCE, SINCE + datetime.timedelta(days=7)))
+        list(repository.stream_lease_times(author_id=1))
+
+
+def test_archive(container, engine):
+    repository = container.book_lease_log_repository()
+    with assert_no_full_scan(engine):
+        archived, _ = repository.archive(SINCE, batch_size=10)
+    assert archived == 10
+
+
+def test_incremental_exports(container, engine):
+    with assert_no_full_scan(engine):
+        list(container.book_repository().stream_all(since=SINCE))
+        leases = [
+            row
+            for rows in container.book_lease_log_repository().stream_all(since=SINCE)
+            for row in rows
+        ]
+    assert [lease.id for lease in leases] == list(range(20, 41))
+
+
+def test_incremental_exports_of_the_archive(container, engine):
+    assert container.book_lease_log_service().archive(SINCE) == 19
+
+    since = SINCE - datetime.timedelta(days=5)
+    with assert_no_full_scan(engine):
+        leases = [
+            row
+            for rows in container.book_lease_log_repository().stream_all(since=since)
+            for row in rows
+        ]
+    # 15 to 19 from the archive
+    assert [lease.id for lease in leases] == list(range(15, 41))
@@ -0,0 +1,45 @@
+from ct_library.container import Container
+from ct_library.settings import load_settings
+
+
+def test_entity_cache_in_a_single_worker():
+    settings = load_settings("dev", {})
+    assert settings.server.workers == 1
+    assert settings.cache.backend == "memory"
+
+
+def test_entity_cache_disabled_with_several_workers():
+    settings = load_settings("dev", {"CT_LIBRARY_SERVER__WORKERS": "4"})
+    assert settings.cache.backend == "none"
+
+    settings = load_settings(
+        "prod",
+        {"CT_LIBRARY_SERVER__WORKERS": "2", "CT_LIBRARY_CACHE__BACKEND": "memory"},
+    )
+    assert settings.cache.backend == "none"
+
+
+def configured(environ: dict[str, str]) -> Container:
+    container = Container()
+    container.config.from_dict(load_settings("test", environ).model_dump(mode="json"))
+    return container
+
+
+def test_async_urls_derived_from_the_sync_ones():
+    container = configured({"CT_LIBRARY_DB__URL": "sqlite:////srv/library.db"})
+    assert container.async_db_url() == "sqlite+aiosqlite:////srv/library.db"
+    assert container.async_db_read_url() is None
+
+    container = configured({"CT_LIBRARY_DB__READ_URL": "sqlite:////srv/replica.db"})
+    assert container.async_db_read_url() == "sqlite+aiosqlite:////srv/replica.db"
+
+
+def test_async_urls_set_explicitly():
+    container = configured(
+        {
+            "CT_LIBRARY_DB__ASYNC_URL": "sqlite+aiosqlite:////srv/async.db",
+            "CT_LIBRARY_DB__ASYNC_READ_URL": "sqlite+aiosqlite:////srv/replica.db",
+        }
+    )
+    assert container.async_db_url() == "sqlite+aiosqlite:////srv/async.db"
+    assert container.async_db_read_url() == "sqlite+aiosqlite:////srv/replica.db"
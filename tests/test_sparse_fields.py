@@ -0,0 +1,80 @@
+"""
+Sparse fieldsets: `fields` limits the keys of the responses and the columns
+read, `available` is only derived from the current lease when requested.
+"""
+
+import pytest
+from conftest import capture_executions
+
+USER = {"user-id": "1"}
+
+
+@pytest.fixture
+def library(client) -> dict[str, int]:
+    """
+    An author with a leased book.
+    """
+    author = client.post("/authors/", json={"name": "Karel Čapek"}).json()
+    book = client.post(f"/authors/{author['id']}/books/", json={"title": "R.U.R."})
+    book_id = book.json()["id"]
+    client.put(f"/books/{book_id}/leases/", json={}, headers=USER)
+    return {"author_id": author["id"], "book_id": book_id}
+
+
+def book_paths(library) -> list[str]:
+    return [
+        "/books/?fields={}",
+        "/books/search?q=rur&fields={}",
+        f"/books/{library['book_id']}?fields={{}}",
+    ]
+
+
+def book_statements(client, path: str) -> list[str]:
+    with capture_executions() as executions:
+        assert client.get(path).status_code == 200
+    return [
+        statement
+        for statement, _, _ in executions
+        if "FROM table_version" not in statement
+    ]
+
+
+def test_lease_is_read_for_available_only(client, library):
+    for path in book_paths(library):
+        for statement in book_statements(client, path.format("id,title")):
+            assert "current_lease_id" not in statement
+            assert "book_lease_log" not in statement
+
+        statements = book_statements(client, path.format("id,available"))
+        assert any("current_lease_id" in statement for statement in statements)
+
+
+@pytest.mark.parametrize("fields", ["id,isbn", "", " , "])
+def test_invalid_fields(client, library, fields):
+    paths = book_paths(library) + [
+        "/authors/?fields={}",
+        f"/authors/{library['author_id']}?fields={{}}",
+        f"/books/{library['book_id']}/leases/?fields={{}}",
+    ]
+    for path in paths:
+        response = client.get(path.format(fields))
+
+        assert response.status_code == 400
+        detail = "Unknown fields isbn" if fields == "id,isbn" else "No fields"
+        assert response.json() == {"detail": detail}
+
+
+def test_author_fields(client, library):
+    (author,) = client.get("/authors/", params={"fields": "id,name"}).json()
+    assert author == {"id": library["author_id"], "name": "Karel Čapek"}
+
+    response = client.get(f"/authors/{library['author_id']}?fields=name")
+    assert response.json() == {"name": "Karel Čapek"}
+
+
+def test_lease_fields(client, library):
+    path = f"/books/{library['book_id']}/leases/"
+
+    (lease,) = client.get(path, params={"fields": "book_id,status"}).json()
+
+    assert lease == {"book_id": library["book_id"], "status": "leased"}
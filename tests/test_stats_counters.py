@@ -0,0 +1,84 @@
+"""
+The counter tables behind `/stats` are maintained by the writes, they have to
+agree with counting the books and the lease history, archive included.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, union_all
+
+from ct_library.concurrency import call
+from ct_library.models import Author, Book, BookLeaseLog, BookLeaseLogArchive
+
+USER = {"user-id": "1"}
+
+
+def counted_books(client) -> dict[int, int]:
+    query = (
+        select(Author.id, func.count(Book.id))
+        .outerjoin(Book, Book.author_id == Author.id)
+        .group_by(Author.id)
+    )
+    with client.app.container.db_engine().connect() as connection:
+        return dict(connection.execute(query).tuples().all())
+
+
+def counted_leases(client) -> dict[int, int]:
+    leases = union_all(
+        select(BookLeaseLog.book_id), select(BookLeaseLogArchive.book_id)
+    ).subquery()
+    query = select(leases.c.book_id, func.count()).group_by(leases.c.book_id)
+    with client.app.container.db_engine().connect() as connection:
+        return dict(connection.execute(query).tuples().all())
+
+
+def test_counters_match_the_counts(client):
+    authors = [
+        client.post("/authors/", json={"name": name}).json()["id"]
+        for name in ("Karel Čapek", "Jaroslav Hašek", "Božena Němcová")
+    ]
+    # Created one by one and in bulk, the author of the last line is missing
+    books = [
+        client.post(f"/authors/{author_id}/books/", json={"title": title}).json()["id"]
+        for author_id, title in [
+            (authors[0], "R.U.R."),
+            (authors[0], "Krakatit"),
+            (authors[1], "Osudy dobrého vojáka Švejka"),
+        ]
+    ]
+    lines = [
+        {"title": "Válka s mloky", "author_id": authors[0]},
+        {"title": "Babička", "author_id": authors[2]},
+        {"title": "Divá Bára", "author_id": authors[2]},
+        {"title": "Lost", "author_id": max(authors) + 1},
+    ]
+    body = "\n".join(map(json.dumps, lines)).encode()
+    assert client.post("/books/bulk?batch_size=2", content=body).json()["created"] == 3
+    # Deleted books are discounted
+    book_service = client.app.container.book_service()
+    client.portal.call(call, book_service.delete_by_id, books[1])
+
+    # Leased and returned one by one and in batches
+    for _ in range(4):
+        client.put(f"/books/{books[0]}/leases/", json={}, headers=USER)
+    for action in ("lease", "return", "lease"):
+        client.post(
+            "/leases/batch",
+            json={"book_ids": books[::2], "action": action},
+            headers=USER,
+        )
+    # Archived leases still count
+    archived, _ = client.app.container.book_lease_log_repository().archive(
+        datetime.now() + timedelta(days=1)
+    )
+    assert archived > 0
+
+    stats = client.get("/stats/authors").json()
+    assert {row["author_id"]: row["book_count"] for row in stats} == counted_books(
+        client
+    )
+    assert counted_books(client) == {authors[0]: 2, authors[1]: 1, authors[2]: 2}
+    top = client.get("/stats/books/top", params={"limit": 100}).json()
+    assert {row["book_id"]: row["lease_count"] for row in top} == counted_leases(client)
+    assert counted_leases(client) == {books[0]: 4, books[2]: 2}
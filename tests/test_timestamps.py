@@ -0,0 +1,35 @@
+"""
+Timestamps are naive UTC in every response, whether the row was just written
+or read back from the database.
+"""
+
+USER = {"user-id": "1"}
+
+
+def test_write_and_read_responses_match(client):
+    author = client.post("/authors/", json={"name": "Stanisław Lem"}).json()
+    book = client.post(f"/authors/{author['id']}/books/", json={"title": "Solaris"})
+    book = book.json()
+    lease = client.put(f"/books/{book['id']}/leases/", json={}, headers=USER).json()
+
+    assert client.get(f"/authors/{author['id']}").json() == author
+    leased = client.get(f"/books/{book['id']}").json()
+    assert leased == {**book, "available": False, "updated_at": leased["updated_at"]}
+    assert client.get(f"/books/{book['id']}/leases/").json() == [lease]
+    for timestamp in (lease["created_at"], leased["updated_at"]):
+        assert not timestamp.endswith("Z")
+        assert "+" not in timestamp
+
+
+def test_offset_converted_to_utc(client):
+    author = client.post("/authors/", json={"name": "Stanisław Lem"}).json()
+    book = client.post(f"/authors/{author['id']}/books/", json={"title": "Eden"})
+    path = f"/books/{book.json()['id']}/leases/"
+    client.put(path, json={}, headers=USER)
+
+    returned = client.put(
+        path, json={"returned_at": "2030-01-01T12:00:00+02:00"}, headers=USER
+    ).json()
+
+    assert returned["returned_at"] == "2030-01-01T10:00:00"
+    assert client.get(path).json() == [returned]
@@ -0,0 +1,65 @@
+"""
+Table versions are kept in the database, a write of one worker invalidates the
+cached lists of every other worker. Each container stands for a worker process.
+"""
+
+from datetime import datetime
+from typing import Iterator
+
+import pytest
+from sqlalchemy import insert
+
+from ct_library.container import Container
+from ct_library.models import Author, Book, BookLeaseLog
+from ct_library.serializers import AuthorInSerializer
+from ct_library.settings import load_settings
+
+
+@pytest.fixture
+def other_container(database_url) -> Iterator[Container]:
+    """
+    Container of a second worker on the same database.
+    """
+    container = Container()
+    container.config.from_dict(load_settings().model_dump(mode="json"))
+    yield container
+    container.db_engine().dispose()
+    container.db_read_engine().dispose()
+
+
+def test_writes_bump_versions_of_other_workers(container, other_container):
+    (version,) = container.table_versions().get("author")
+
+    other_container.author_service().create(AuthorInSerializer(name="Karel Čapek"))
+
+    assert container.table_versions().get("author") == (version + 1,)
+
+
+def test_rolled_back_writes_keep_versions(container):
+    unit_of_work, table_versions = container.unit_of_work(), container.table_versions()
+    versions = table_versions.get("author", "book")
+
+    with pytest.raises(RuntimeError), unit_of_work.scope(write=True):
+        table_versions.bump("author", "book")
+        raise RuntimeError
+
+    assert table_versions.get("author", "book") == versions
+
+
+def test_archive_bumps_lease_log_version(container):
+    with container.db_engine().begin() as connection:
+        connection.execute(insert(Author), [{"name": "Karel Čapek"}])
+        connection.execute(insert(Book), [{"title": "R.U.R.", "author_id": 1}])
+        connection.execute(
+            insert(BookLeaseLog),
+            [
+                {"book_id": 1, "user_id": 1, "created_at": day, "returned_at": day}
+                for day in (datetime(2020, 1, 1), datetime(2020, 1, 2))
+            ],
+        )
+    (version,) = container.table_versions().get("book_lease_log")
+
+    # One batch per lease
+    assert container.book_lease_log_service().archive(datetime(2021, 1, 1), 1) == 2
+
+    assert container.table_versions().get("book_lease_log") == (version + 2,)